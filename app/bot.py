@@ -1,16 +1,95 @@
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.config import settings
+from app.config import Settings, settings
+from app.fsm_storage import DatabaseStorage, FsmBatchMiddleware
+from app.middlewares.db import CommitBeforeRequestMiddleware
+from app.outbound import OutboundLimiter
+from app.scheduler import ScheduledDispatcher, UpdateScheduler
 
 
-def create_bot() -> Bot:
-    return Bot(
-        token=settings.bot_token,
+def create_bot(config: Settings = settings) -> Bot:
+    bot = Bot(
+        token=config.bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
+    if config.database_unit_of_work:
+        bot.session.middleware(CommitBeforeRequestMiddleware())
+    if config.outbound_rate_limit:
+        bot.session.middleware(
+            OutboundLimiter(
+                global_rate=config.outbound_global_rate,
+                chat_rate=config.outbound_chat_rate,
+                chat_burst=config.outbound_chat_burst,
+                max_retries=config.outbound_max_retries,
+            )
+        )
+    return bot
 
 
-def create_dispatcher() -> Dispatcher:
-    return Dispatcher()
+def create_fsm_storage(
+    session_factory: async_sessionmaker[AsyncSession], config: Settings = settings
+) -> BaseStorage:
+    if config.fsm_storage == "memory":
+        return MemoryStorage()
+    return DatabaseStorage(
+        session_factory, ttl=config.fsm_ttl or None, cache_size=config.fsm_cache_size
+    )
+
+
+def create_dispatcher(
+    config: Settings = settings, storage: BaseStorage | None = None
+) -> Dispatcher:
+    if config.update_concurrency:
+        scheduler = UpdateScheduler(config.update_concurrency)
+        dp = ScheduledDispatcher(scheduler=scheduler, storage=storage)
+    else:
+        dp = Dispatcher(storage=storage)
+    if isinstance(storage, DatabaseStorage):
+        # Ahead of aiogram's FSM middleware, so its state read joins the batch
+        # and an update costs at most one load and one write.
+        dp.update.outer_middleware.unregister(dp.fsm)
+        dp.update.outer_middleware(FsmBatchMiddleware(storage))
+        dp.update.outer_middleware(dp.fsm)
+    return dp
+
+
+def webhook_url(config: Settings = settings) -> str:
+    base_url = config.webhook_base_url or config.webapp_base_url
+    return base_url.rstrip("/") + config.webhook_path
+
+
+def setup_webhook(
+    app: web.Application, dp: Dispatcher, bot: Bot, config: Settings = settings
+) -> None:
+    """Serve ``dp`` at ``config.webhook_path`` on the WebApp's aiohttp application.
+
+    Requests without the ``X-Telegram-Bot-Api-Secret-Token`` header matching
+    ``webhook_secret`` are rejected. Accepted updates are acknowledged at once
+    and processed in a background task. The webhook is registered with
+    Telegram when ``app`` starts.
+    """
+    if not config.webhook_secret:
+        raise ValueError("BOT_WEBHOOK_SECRET must be set in webhook mode")
+
+    async def register_webhook(bot: Bot) -> None:
+        await bot.set_webhook(
+            webhook_url(config),
+            secret_token=config.webhook_secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+
+    dp.startup.register(register_webhook)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=config.webhook_secret,
+    ).register(app, path=config.webhook_path)
+    setup_application(app, dp, bot=bot)
@@ -7,12 +7,69 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     bot_token: str = ""
     database_url: str = "sqlite+aiosqlite:///data/food_delivery.db"
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_recycle: int = 1800  # seconds; -1 disables
+    database_pool_pre_ping: bool = True
+    database_statement_cache_size: int = 100  # asyncpg prepared statements per connection
+    database_compiled_cache_size: int = 500  # SQLAlchemy compiled statements per engine
+    database_cache_stats: bool = True
+    database_unit_of_work: bool = True  # one commit per update or request
+    database_query_budget: int = 20  # queries per handler or route before a warning; 0 disables
+    database_read_url: str = ""
+    database_read_pool_size: int = 5
+    database_read_max_overflow: int = 10
     webapp_base_url: str = "https://example.com"
     webapp_host: str = "0.0.0.0"
     webapp_port: int = 8080
     admin_ids: list[int] = []
+    bot_mode: str = "polling"  # or "webhook"
+    webhook_base_url: str = ""  # public origin for the webhook; defaults to webapp_base_url
     webhook_path: str = "/webhook"
     webhook_secret: str = ""
+    # Updates processed at once; each chat's updates run in order (0 = unbounded)
+    update_concurrency: int = 10
+    # Outbound Telegram API pacing (messages per second); see app.outbound
+    outbound_rate_limit: bool = True
+    outbound_global_rate: float = 30
+    outbound_chat_rate: float = 1
+    outbound_chat_burst: int = 3
+    outbound_max_retries: int = 3
+    # Customer notifications for order status changes; see app.notifications
+    order_notifications: bool = True
+    order_notifications_batch_size: int = 50
+    order_notifications_poll_interval: float = 1.0
+    order_notifications_max_attempts: int = 5
+    order_notifications_retention: int = 604800  # seconds given-up events are kept
+    fsm_storage: str = "database"  # or "memory"
+    fsm_ttl: int = 86400  # seconds a conversation's state lives after its last change
+    fsm_cache_size: int = 0  # in-process read cache; single-instance deployments only
+    webapp_auth_max_age: int = 86400
+    webapp_auth_cache_size: int = 1024
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_cache_size: int = -64000  # negative values are KiB
+    sqlite_mmap_size: int = 268435456
+    sqlite_temp_store: str = "MEMORY"
+    sqlite_busy_timeout: int = 5000  # milliseconds
+    sqlite_foreign_keys: bool = True
+    sqlite_group_commit: bool = False
+    sqlite_group_commit_max_batch: int = 64
+    sqlite_group_commit_delay_ms: float = 1.0
+
+    @field_validator("bot_mode")
+    @classmethod
+    def check_bot_mode(cls, v: str) -> str:
+        if v not in ("polling", "webhook"):
+            raise ValueError("bot_mode must be 'polling' or 'webhook'")
+        return v
+
+    @field_validator("fsm_storage")
+    @classmethod
+    def check_fsm_storage(cls, v: str) -> str:
+        if v not in ("database", "memory"):
+            raise ValueError("fsm_storage must be 'database' or 'memory'")
+        return v
 
     @field_validator("admin_ids", mode="before")
     @classmethod
@@ -0,0 +1,251 @@
+"""aiogram FSM storage in the bot's own database.
+
+``DatabaseStorage`` keeps each storage key's state and data in one
+``fsm_states`` row, so a restart or a second instance picks up users in the
+middle of ``CheckoutState``. Every write moves the row's ``expires_at``
+``ttl`` seconds ahead. Expired rows read as empty and are deleted from time
+to time.
+
+Inside ``storage.batch()``, which ``FsmBatchMiddleware`` opens around each
+update, writes are buffered and reads see the buffer. The buffered keys are
+persisted together in one transaction when the update's handler returns.
+``set_state`` plus a few ``update_data`` calls in a handler then cost one
+upsert, not one per call. If the handler raises, its FSM writes are
+dropped, like its database writes. Outside a batch each write reads the
+row and persists it straight away.
+
+With ``cache_size`` set, recently used rows are also kept in process. Only
+enable it when a single instance serves the bot: the cache does not see
+writes made by other processes.
+"""
+import time
+from collections import OrderedDict
+from collections.abc import AsyncIterator, Awaitable, Callable, Mapping
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.types import TelegramObject
+from sqlalchemy import bindparam, delete, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.base import utcnow
+from app.models.fsm import FsmState
+from database.engine import upsert_insert
+from database.writer import run_write
+
+# How often, in seconds, a write also deletes expired rows.
+PURGE_INTERVAL = 600
+
+_LOAD = select(FsmState.state, FsmState.data, FsmState.expires_at).where(
+    FsmState.key == bindparam("key"),
+    or_(FsmState.expires_at.is_(None), FsmState.expires_at > bindparam("now")),
+)
+
+
+@dataclass(slots=True)
+class _Record:
+    state: str | None = None
+    data: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class _Batch:
+    loaded: dict[str, _Record] = field(default_factory=dict)
+    changes: dict[str, dict[str, Any]] = field(default_factory=dict)
+
+
+_current_batch: ContextVar[_Batch | None] = ContextVar("fsm_batch", default=None)
+
+
+class DatabaseStorage(BaseStorage):
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        ttl: float | None = None,
+        cache_size: int = 0,
+        key_builder: DefaultKeyBuilder | None = None,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(
+            with_bot_id=True, with_business_connection_id=True, with_destiny=True
+        )
+        self._cache: OrderedDict[str, tuple[_Record, datetime | None]] = OrderedDict()
+        self._last_purge = time.monotonic()
+
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator[None]:
+        """Buffer FSM writes made in this context and persist them together on exit.
+
+        Nothing is written if the block raises. Nested batches join the outer one.
+        """
+        if _current_batch.get() is not None:
+            yield
+            return
+        batch = _Batch()
+        token = _current_batch.set(batch)
+        try:
+            yield
+        finally:
+            _current_batch.reset(token)
+        if batch.changes:
+            await self._write(batch.changes, batch.loaded)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._change(self.key_builder.build(key), {"state": value})
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        return (await self._load(self.key_builder.build(key))).state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._change(self.key_builder.build(key), {"data": dict(data)})
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        return dict((await self._load(self.key_builder.build(key))).data)
+
+    async def close(self) -> None:
+        self._cache.clear()
+
+    async def purge_expired(self) -> int:
+        """Delete expired rows now; returns how many were removed."""
+
+        async def unit(session: AsyncSession) -> int:
+            result = await session.execute(
+                delete(FsmState).where(FsmState.expires_at <= utcnow())
+            )
+            return result.rowcount
+
+        async with self.session_factory() as session:
+            return await run_write(session, unit)
+
+    async def _load(self, key: str) -> _Record:
+        batch = _current_batch.get()
+        if batch is not None and key in batch.loaded:
+            return batch.loaded[key]
+
+        record = self._cached(key)
+        if record is None:
+            async with self.session_factory() as session:
+                row = (await session.execute(_LOAD, {"key": key, "now": utcnow()})).first()
+            if row is None:
+                record = _Record()
+                self._remember(key, record, None)
+            else:
+                record = _Record(row.state, dict(row.data))
+                self._remember(key, record, row.expires_at)
+
+        if batch is not None:
+            record = batch.loaded[key] = _Record(record.state, dict(record.data))
+            for column, value in batch.changes.get(key, {}).items():
+                setattr(record, column, value)
+        return record
+
+    async def _change(self, key: str, values: dict[str, Any]) -> None:
+        batch = _current_batch.get()
+        if batch is None:
+            loaded = await self._load(key)
+            record = _Record(loaded.state, dict(loaded.data))
+            for column, value in values.items():
+                setattr(record, column, value)
+            await self._write({key: values}, {key: record})
+            return
+        batch.changes.setdefault(key, {}).update(values)
+        record = batch.loaded.get(key)
+        if record is not None:
+            for column, value in values.items():
+                setattr(record, column, value)
+
+    async def _write(
+        self, changes: dict[str, dict[str, Any]], known: dict[str, _Record]
+    ) -> None:
+        now = utcnow()
+        expires_at = now + timedelta(seconds=self.ttl) if self.ttl else None
+        purge = time.monotonic() - self._last_purge >= PURGE_INTERVAL
+
+        # A key whose state and data are both empty afterwards is deleted.
+        results: dict[str, _Record | None] = {}
+        for key, values in changes.items():
+            record = known.get(key)
+            if record is None and values.keys() == {"state", "data"}:
+                record = _Record(values["state"], values["data"])
+            results[key] = record
+        empty = {
+            key
+            for key, record in results.items()
+            if record is not None and record.state is None and not record.data
+        }
+
+        async def unit(session: AsyncSession) -> None:
+            insert = upsert_insert(session)
+            for key, values in changes.items():
+                if key in empty:
+                    continue
+                stmt = insert(FsmState).values(key=key, expires_at=expires_at, **values)
+                await session.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[FsmState.key],
+                        set_={**values, "expires_at": expires_at},
+                    )
+                )
+            if empty:
+                await session.execute(delete(FsmState).where(FsmState.key.in_(sorted(empty))))
+            if purge:
+                await session.execute(delete(FsmState).where(FsmState.expires_at <= now))
+
+        async with self.session_factory() as session:
+            await run_write(session, unit)
+        if purge:
+            self._last_purge = time.monotonic()
+
+        for key, record in results.items():
+            if record is None:
+                self._cache.pop(key, None)
+            else:
+                self._remember(key, _Record(record.state, dict(record.data)), expires_at)
+
+    def _cached(self, key: str) -> _Record | None:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        record, expires_at = entry
+        if expires_at is not None and expires_at <= utcnow():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return _Record(record.state, dict(record.data))
+
+    def _remember(self, key: str, record: _Record, expires_at: datetime | None) -> None:
+        if not self.cache_size:
+            return
+        self._cache[key] = (record, expires_at)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+class FsmBatchMiddleware(BaseMiddleware):
+    """Coalesces each update's FSM reads and writes.
+
+    Register it on ``dp.update.outer_middleware`` ahead of ``dp.fsm``, as
+    ``create_dispatcher`` does, so the FSM middleware's state read is batched too.
+    """
+
+    def __init__(self, storage: DatabaseStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async with self.storage.batch():
+            return await handler(event, data)
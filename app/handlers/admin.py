@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.config import settings
 from app.keyboards.inline import OrderActionCB, admin_order_keyboard
 from app.models.order import OrderStatus
+from app.outbound import Priority, outbound_priority
 from app.services.order import OrderService
 from app.services.restaurant import RestaurantService
 
@@ -42,19 +43,21 @@ async def cmd_pending(message: Message, session: AsyncSession) -> None:
         await message.answer("No pending orders.")
         return
 
-    for order in orders:
-        text = (
-            f"<b>Order #{order.id}</b>\n"
-            f"User: {order.user.first_name} ({order.user.telegram_id})\n"
-            f"Address: {order.delivery_address}\n"
-            f"Phone: {order.phone}\n"
-            f"Total: {order.total_display} $\n\n"
-            f"Items:\n"
-        )
-        for item in order.items:
-            text += f"  {item.product.name} x{item.quantity}\n"
-
-        await message.answer(text, reply_markup=admin_order_keyboard(order))
+    # One message per order: let replies to other users go first.
+    with outbound_priority(Priority.BULK):
+        for order in orders:
+            text = (
+                f"<b>Order #{order.id}</b>\n"
+                f"User: {order.user.first_name} ({order.user.telegram_id})\n"
+                f"Address: {order.delivery_address}\n"
+                f"Phone: {order.phone}\n"
+                f"Total: {order.total_display} $\n\n"
+                f"Items:\n"
+            )
+            for item in order.items:
+                text += f"  {item.product.name} x{item.quantity}\n"
+
+            await message.answer(text, reply_markup=admin_order_keyboard(order))
 
 
 @router.callback_query(OrderActionCB.filter())
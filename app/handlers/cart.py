@@ -7,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.keyboards.inline import CartActionCB, cart_keyboard
 from app.services.cart import CartService
-from app.services.order import OrderService
+from app.services.checkout import CheckoutService
 from app.services.user import UserService
 
 router = Router()
@@ -28,7 +28,7 @@ async def cmd_cart(message: Message, session: AsyncSession) -> None:
         return
 
     cart_service = CartService(session)
-    items = await cart_service.get_items(user.id)
+    items = await cart_service.get_lines(user.id)
 
     if not items:
         await message.answer("Your cart is empty. Use /menu to browse restaurants.")
@@ -37,7 +37,7 @@ async def cmd_cart(message: Message, session: AsyncSession) -> None:
     total = sum(item.subtotal for item in items)
     text = "<b>Your Cart:</b>\n\n"
     for item in items:
-        text += f"  {item.product.name} x{item.quantity} - {item.subtotal / 100:.2f} $\n"
+        text += f"  {item.name} x{item.quantity} - {item.subtotal / 100:.2f} $\n"
     text += f"\n<b>Total: {total / 100:.2f} $</b>"
 
     await message.answer(text, reply_markup=cart_keyboard(items))
@@ -60,14 +60,14 @@ async def cart_action(
 
     if callback_data.action == "remove":
         await cart_service.remove_item(callback_data.item_id)
-        items = await cart_service.get_items(user.id)
+        items = await cart_service.get_lines(user.id)
         if not items:
             await callback.message.edit_text("Your cart is now empty.")
         else:
             total = sum(item.subtotal for item in items)
             text = "<b>Your Cart:</b>\n\n"
             for item in items:
-                text += f"  {item.product.name} x{item.quantity} - {item.subtotal / 100:.2f} $\n"
+                text += f"  {item.name} x{item.quantity} - {item.subtotal / 100:.2f} $\n"
             text += f"\n<b>Total: {total / 100:.2f} $</b>"
             await callback.message.edit_text(text, reply_markup=cart_keyboard(items))
         await callback.answer("Removed")
@@ -78,7 +78,7 @@ async def cart_action(
         await callback.answer()
 
     elif callback_data.action == "checkout":
-        items = await cart_service.get_items(user.id)
+        items = await cart_service.get_lines(user.id)
         if not items:
             await callback.answer("Cart is empty", show_alert=True)
             return
@@ -107,7 +107,7 @@ async def process_address(message: Message, state: FSMContext, session: AsyncSes
     if user and user.phone:
         await state.update_data(phone=user.phone)
         cart_service = CartService(session)
-        items = await cart_service.get_items(user.id)
+        items = await cart_service.get_lines(user.id)
         await _show_order_confirmation(message, items, user, state)
         return
 
@@ -127,18 +127,18 @@ async def process_phone(message: Message, state: FSMContext, session: AsyncSessi
         return
 
     cart_service = CartService(session)
-    items = await cart_service.get_items(user.id)
+    items = await cart_service.get_lines(user.id)
     await _show_order_confirmation(message, items, user, state)
 
 
 async def _show_order_confirmation(message, items, user, state: FSMContext) -> None:
     data = await state.get_data()
-    total = sum(item.product.price * item.quantity for item in items)
+    total = sum(item.price * item.quantity for item in items)
 
     text = "<b>Order Summary:</b>\n\n"
     for item in items:
-        subtotal = item.product.price * item.quantity
-        text += f"  {item.product.name} x{item.quantity} - {subtotal / 100:.2f} $\n"
+        subtotal = item.price * item.quantity
+        text += f"  {item.name} x{item.quantity} - {subtotal / 100:.2f} $\n"
     text += f"\n<b>Total: {total / 100:.2f} $</b>"
     text += f"\nAddress: {data['address']}"
     text += f"\nPhone: {data['phone']}"
@@ -159,29 +159,17 @@ async def process_confirm(message: Message, state: FSMContext, session: AsyncSes
             await state.clear()
             return
 
-        await user_service.update_contact(
-            message.from_user.id, data["phone"], data["address"]
-        )
-
-        cart_service = CartService(session)
-        items = await cart_service.get_items(user.id)
-        if not items:
-            await message.answer("Cart is empty.")
-            await state.clear()
-            return
-
-        restaurant_id = items[0].product.category.restaurant_id
-
-        order_service = OrderService(session)
-        order = await order_service.create_from_cart(
+        checkout_service = CheckoutService(session)
+        order = await checkout_service.checkout(
             user_id=user.id,
-            restaurant_id=restaurant_id,
-            cart_items=items,
             delivery_address=data["address"],
             phone=data["phone"],
         )
+        if not order:
+            await message.answer("Cart is empty.")
+            await state.clear()
+            return
 
-        await cart_service.clear(user.id)
         await state.clear()
 
         await message.answer(
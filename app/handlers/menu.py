@@ -6,59 +6,100 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.keyboards.inline import (
     AddToCartCB,
     CategoryCB,
+    CategoryPageCB,
     ProductCB,
+    ProductPageCB,
     RestaurantCB,
+    RestaurantPageCB,
     categories_keyboard,
     product_detail_keyboard,
     products_keyboard,
     restaurants_keyboard,
 )
-from app.services.cart import CartService
+from app.middlewares import READ_ONLY
+from app.services.cart import CartProductError, CartService
 from app.services.restaurant import RestaurantService
 from app.services.user import UserService
 
 router = Router()
 
 
-@router.message(Command("menu"))
+@router.message(Command("menu"), flags=READ_ONLY)
 async def cmd_menu(message: Message, session: AsyncSession) -> None:
     service = RestaurantService(session)
-    restaurants = await service.get_all_active()
-    if not restaurants:
+    page = await service.get_active_page()
+    if not page.items:
         await message.answer("No restaurants available at the moment.")
         return
     await message.answer(
         "Choose a restaurant:",
-        reply_markup=restaurants_keyboard(restaurants),
+        reply_markup=restaurants_keyboard(page.items, page.has_prev, page.has_next),
     )
 
 
-@router.callback_query(F.data == "back_restaurants")
+@router.callback_query(F.data == "back_restaurants", flags=READ_ONLY)
 async def back_to_restaurants(callback: CallbackQuery, session: AsyncSession) -> None:
+    await _show_restaurants(callback, session)
+
+
+@router.callback_query(RestaurantPageCB.filter(), flags=READ_ONLY)
+async def restaurants_page(
+    callback: CallbackQuery, callback_data: RestaurantPageCB, session: AsyncSession
+) -> None:
+    await _show_restaurants(callback, session, callback_data.after, callback_data.before)
+
+
+async def _show_restaurants(
+    callback: CallbackQuery, session: AsyncSession, after: int = 0, before: int = 0
+) -> None:
     service = RestaurantService(session)
-    restaurants = await service.get_all_active()
-    if not restaurants:
+    page = await service.get_active_page(after=after, before=before)
+    if not page.items:
         await callback.message.edit_text("No restaurants available at the moment.")
         return
     await callback.message.edit_text(
         "Choose a restaurant:",
-        reply_markup=restaurants_keyboard(restaurants),
+        reply_markup=restaurants_keyboard(page.items, page.has_prev, page.has_next),
     )
     await callback.answer()
 
 
-@router.callback_query(RestaurantCB.filter())
+@router.callback_query(RestaurantCB.filter(), flags=READ_ONLY)
 async def show_categories(
     callback: CallbackQuery, callback_data: RestaurantCB, session: AsyncSession
 ) -> None:
-    service = RestaurantService(session)
-    restaurant = await service.get_by_id(callback_data.id)
-    if not restaurant:
+    await _show_categories(callback, session, callback_data.id)
+
+
+@router.callback_query(CategoryPageCB.filter(), flags=READ_ONLY)
+async def categories_page(
+    callback: CallbackQuery, callback_data: CategoryPageCB, session: AsyncSession
+) -> None:
+    await _show_categories(
+        callback,
+        session,
+        callback_data.restaurant_id,
+        callback_data.after,
+        callback_data.before,
+    )
+
+
+async def _show_categories(
+    callback: CallbackQuery,
+    session: AsyncSession,
+    restaurant_id: int,
+    after: int = 0,
+    before: int = 0,
+) -> None:
+    found = await RestaurantService(session).get_restaurant_with_categories(
+        restaurant_id, after=after, before=before
+    )
+    if not found:
         await callback.answer("Restaurant not found", show_alert=True)
         return
 
-    categories = await service.get_menu(callback_data.id)
-    if not categories:
+    restaurant, page = found
+    if not page.items:
         await callback.answer("Menu is empty", show_alert=True)
         return
 
@@ -69,47 +110,70 @@ async def show_categories(
 
     await callback.message.edit_text(
         text,
-        reply_markup=categories_keyboard(categories, restaurant.id),
+        reply_markup=categories_keyboard(
+            page.items, restaurant.id, page.has_prev, page.has_next
+        ),
     )
     await callback.answer()
 
 
-@router.callback_query(CategoryCB.filter())
+@router.callback_query(CategoryCB.filter(), flags=READ_ONLY)
 async def show_products(
     callback: CallbackQuery, callback_data: CategoryCB, session: AsyncSession
+) -> None:
+    await _show_products(callback, session, callback_data.restaurant_id, callback_data.id)
+
+
+@router.callback_query(ProductPageCB.filter(), flags=READ_ONLY)
+async def products_page(
+    callback: CallbackQuery, callback_data: ProductPageCB, session: AsyncSession
+) -> None:
+    await _show_products(
+        callback,
+        session,
+        callback_data.restaurant_id,
+        callback_data.category_id,
+        callback_data.after,
+        callback_data.before,
+    )
+
+
+async def _show_products(
+    callback: CallbackQuery,
+    session: AsyncSession,
+    restaurant_id: int,
+    category_id: int,
+    after: int = 0,
+    before: int = 0,
 ) -> None:
     service = RestaurantService(session)
-    category_list = await service.get_menu(callback_data.restaurant_id)
-    category = None
-    for c in category_list:
-        if c.id == callback_data.id:
-            category = c
-            break
-
-    if not category:
+    result = await service.get_category_with_available_products(
+        category_id, restaurant_id, after=after, before=before
+    )
+    if not result:
         await callback.answer("Category not found", show_alert=True)
         return
 
-    available_products = [p for p in category.products if p.is_available]
-    if not available_products:
+    category, page = result
+    if not page.items:
         await callback.answer("No products available in this category", show_alert=True)
         return
 
     await callback.message.edit_text(
         f"<b>{category.name}</b>\n\nSelect a dish:",
         reply_markup=products_keyboard(
-            available_products, callback_data.restaurant_id, callback_data.id
+            page.items, restaurant_id, category_id, page.has_prev, page.has_next
         ),
     )
     await callback.answer()
 
 
-@router.callback_query(ProductCB.filter())
+@router.callback_query(ProductCB.filter(), flags=READ_ONLY)
 async def show_product_detail(
     callback: CallbackQuery, callback_data: ProductCB, session: AsyncSession
 ) -> None:
     service = RestaurantService(session)
-    product = await service.get_product(callback_data.id)
+    product = await service.get_product_detail(callback_data.id)
     if not product:
         await callback.answer("Product not found", show_alert=True)
         return
@@ -137,7 +201,11 @@ async def add_to_cart(
         return
 
     cart_service = CartService(session)
-    await cart_service.add_item(user.id, callback_data.product_id)
+    try:
+        await cart_service.add_item(user.id, callback_data.product_id)
+    except CartProductError:
+        await callback.answer("This product is no longer available", show_alert=True)
+        return
     await callback.answer("Added to cart!", show_alert=False)
 
 
@@ -4,20 +4,13 @@ from aiogram.types import CallbackQuery, Message
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.keyboards.inline import OrderActionCB, OrderCB, order_detail_keyboard
-from app.models.order import OrderStatus
+from app.models.order import STATUS_LABELS
 from app.services.order import OrderService
 from app.services.user import UserService
 
 router = Router()
 
-STATUS_LABELS = {
-    OrderStatus.PENDING: "Pending",
-    OrderStatus.CONFIRMED: "Confirmed",
-    OrderStatus.PREPARING: "Preparing",
-    OrderStatus.DELIVERING: "Delivering",
-    OrderStatus.DELIVERED: "Delivered",
-    OrderStatus.CANCELLED: "Cancelled",
-}
+ORDERS_LIST_LIMIT = 10
 
 
 @router.message(Command("orders"))
@@ -29,7 +22,7 @@ async def cmd_orders(message: Message, session: AsyncSession) -> None:
         return
 
     order_service = OrderService(session)
-    orders = await order_service.get_user_orders(user.id)
+    orders, _ = await order_service.get_order_summaries(user.id, limit=ORDERS_LIST_LIMIT)
 
     if not orders:
         await message.answer("You have no orders yet. Use /menu to browse restaurants.")
@@ -39,7 +32,7 @@ async def cmd_orders(message: Message, session: AsyncSession) -> None:
     from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
     buttons = []
-    for order in orders[:10]:
+    for order in orders:
         label = STATUS_LABELS.get(order.status, order.status.value)
         text += (
             f"Order #{order.id} - {label}\n"
@@ -66,7 +59,7 @@ async def show_orders_callback(callback: CallbackQuery, session: AsyncSession) -
         return
 
     order_service = OrderService(session)
-    orders = await order_service.get_user_orders(user.id)
+    orders, _ = await order_service.get_order_summaries(user.id, limit=ORDERS_LIST_LIMIT)
 
     if not orders:
         await callback.message.edit_text("You have no orders yet.")
@@ -77,7 +70,7 @@ async def show_orders_callback(callback: CallbackQuery, session: AsyncSession) -
     from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
     buttons = []
-    for order in orders[:10]:
+    for order in orders:
         label = STATUS_LABELS.get(order.status, order.status.value)
         text += (
             f"Order #{order.id} - {label}\n"
@@ -100,7 +93,7 @@ async def show_order_detail(
     callback: CallbackQuery, callback_data: OrderCB, session: AsyncSession
 ) -> None:
     order_service = OrderService(session)
-    order = await order_service.get_by_id(callback_data.id)
+    order = await order_service.get_order_detail(callback_data.id)
     if not order:
         await callback.answer("Order not found", show_alert=True)
         return
@@ -113,8 +106,8 @@ async def show_order_detail(
         f"Phone: {order.phone}\n\n"
         f"<b>Items:</b>\n"
     )
-    for item in order.items:
-        text += f"  {item.product.name} x{item.quantity} - {item.subtotal / 100:.2f} $\n"
+    for line in order.lines:
+        text += f"  {line.name} x{line.quantity} - {line.subtotal / 100:.2f} $\n"
     text += f"\n<b>Total: {order.total_display} $</b>"
     if order.comment:
         text += f"\nComment: {order.comment}"
@@ -1,3 +1,6 @@
+from functools import partial
+from typing import Callable
+
 from aiogram.filters.callback_data import CallbackData
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
@@ -15,6 +18,24 @@ class ProductCB(CallbackData, prefix="prod"):
     id: int
 
 
+class RestaurantPageCB(CallbackData, prefix="rpage"):
+    after: int = 0
+    before: int = 0
+
+
+class CategoryPageCB(CallbackData, prefix="cpage"):
+    restaurant_id: int
+    after: int = 0
+    before: int = 0
+
+
+class ProductPageCB(CallbackData, prefix="ppage"):
+    restaurant_id: int
+    category_id: int
+    after: int = 0
+    before: int = 0
+
+
 class AddToCartCB(CallbackData, prefix="add"):
     product_id: int
 
@@ -33,7 +54,24 @@ class OrderActionCB(CallbackData, prefix="oa"):
     order_id: int
 
 
-def restaurants_keyboard(restaurants) -> InlineKeyboardMarkup:
+def _page_nav_row(
+    items, has_prev: bool, has_next: bool, page_cb: Callable[..., CallbackData]
+) -> list[InlineKeyboardButton]:
+    row = []
+    if has_prev and items:
+        row.append(
+            InlineKeyboardButton(text="< Prev", callback_data=page_cb(before=items[0].id).pack())
+        )
+    if has_next and items:
+        row.append(
+            InlineKeyboardButton(text="Next >", callback_data=page_cb(after=items[-1].id).pack())
+        )
+    return row
+
+
+def restaurants_keyboard(
+    restaurants, has_prev: bool = False, has_next: bool = False
+) -> InlineKeyboardMarkup:
     buttons = []
     for r in restaurants:
         buttons.append([
@@ -42,10 +80,15 @@ def restaurants_keyboard(restaurants) -> InlineKeyboardMarkup:
                 callback_data=RestaurantCB(id=r.id).pack(),
             )
         ])
+    nav = _page_nav_row(restaurants, has_prev, has_next, RestaurantPageCB)
+    if nav:
+        buttons.append(nav)
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def categories_keyboard(categories, restaurant_id: int) -> InlineKeyboardMarkup:
+def categories_keyboard(
+    categories, restaurant_id: int, has_prev: bool = False, has_next: bool = False
+) -> InlineKeyboardMarkup:
     buttons = []
     for cat in categories:
         buttons.append([
@@ -54,13 +97,24 @@ def categories_keyboard(categories, restaurant_id: int) -> InlineKeyboardMarkup:
                 callback_data=CategoryCB(id=cat.id, restaurant_id=restaurant_id).pack(),
             )
         ])
+    nav = _page_nav_row(
+        categories, has_prev, has_next, partial(CategoryPageCB, restaurant_id=restaurant_id)
+    )
+    if nav:
+        buttons.append(nav)
     buttons.append([
         InlineKeyboardButton(text="< Back to restaurants", callback_data="back_restaurants")
     ])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def products_keyboard(products, restaurant_id: int, category_id: int) -> InlineKeyboardMarkup:
+def products_keyboard(
+    products,
+    restaurant_id: int,
+    category_id: int,
+    has_prev: bool = False,
+    has_next: bool = False,
+) -> InlineKeyboardMarkup:
     buttons = []
     for p in products:
         if p.is_available:
@@ -70,6 +124,14 @@ def products_keyboard(products, restaurant_id: int, category_id: int) -> InlineK
                     callback_data=ProductCB(id=p.id).pack(),
                 )
             ])
+    nav = _page_nav_row(
+        products,
+        has_prev,
+        has_next,
+        partial(ProductPageCB, restaurant_id=restaurant_id, category_id=category_id),
+    )
+    if nav:
+        buttons.append(nav)
     buttons.append([
         InlineKeyboardButton(
             text="< Back to categories",
@@ -92,7 +154,7 @@ def product_detail_keyboard(product) -> InlineKeyboardMarkup:
                 text="< Back",
                 callback_data=CategoryCB(
                     id=product.category_id,
-                    restaurant_id=product.category.restaurant_id,
+                    restaurant_id=product.restaurant_id,
                 ).pack(),
             )
         ],
@@ -104,7 +166,7 @@ def cart_keyboard(cart_items) -> InlineKeyboardMarkup:
     for item in cart_items:
         buttons.append([
             InlineKeyboardButton(
-                text=f"- {item.product.name} x{item.quantity} ({item.product.price_display}$)",
+                text=f"- {item.name} x{item.quantity} ({item.price_display}$)",
                 callback_data="noop",
             ),
             InlineKeyboardButton(
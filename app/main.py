@@ -4,12 +4,26 @@ import os
 
 from aiohttp import web
 
-from app.bot import create_bot, create_dispatcher
+from app.bot import (
+    create_bot,
+    create_dispatcher,
+    create_fsm_storage,
+    setup_webhook,
+    webhook_url,
+)
 from app.config import settings
 from app.handlers import setup_routers
 from app.middlewares import DbSessionMiddleware
-from app.webapp.routes import create_webapp_routes
-from database.engine import close_db, create_engine, create_session_factory, init_db
+from app.notifications import start_order_notifier
+from app.webapp.routes import setup_webapp
+from database.engine import (
+    close_db,
+    create_engine,
+    create_read_engine,
+    create_session_factory,
+    init_db,
+    start_write_coordinator,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -17,15 +31,17 @@ logger = logging.getLogger(__name__)
 async def on_startup(app: web.Application) -> None:
     engine = create_engine()
     await init_db(engine)
+    write_coordinator = start_write_coordinator(engine)
     app["db_engine"] = engine
-    app["session_factory"] = create_session_factory(engine)
+    app["write_coordinator"] = write_coordinator
+    app["session_factory"] = create_session_factory(engine, write_coordinator)
     logger.info("Database initialized")
 
 
 async def on_shutdown(app: web.Application) -> None:
     engine = app.get("db_engine")
     if engine:
-        await close_db(engine)
+        await close_db(engine, app.get("write_coordinator"))
     logger.info("Database connection closed")
 
 
@@ -40,22 +56,27 @@ def create_webapp_app() -> web.Application:
 async def main() -> None:
     logging.basicConfig(level=logging.INFO)
 
-    bot = create_bot()
-    dp = create_dispatcher()
-
     engine = create_engine()
     await init_db(engine)
-    session_factory = create_session_factory(engine)
+    write_coordinator = start_write_coordinator(engine)
+    session_factory = create_session_factory(engine, write_coordinator)
+    read_engine = create_read_engine(engine)
+    read_session_factory = create_session_factory(read_engine) if read_engine else None
 
-    dp.update.middleware(DbSessionMiddleware(session_factory))
+    bot = create_bot()
+    dp = create_dispatcher(storage=create_fsm_storage(session_factory))
+    db_middleware = DbSessionMiddleware(session_factory, read_session_factory)
+    dp.message.middleware(db_middleware)
+    dp.callback_query.middleware(db_middleware)
 
     router = setup_routers()
     dp.include_router(router)
 
     # Setup aiohttp for WebApp
     webapp_app = web.Application()
-    webapp_routes = create_webapp_routes(session_factory, settings.bot_token)
-    webapp_app.router.add_routes(webapp_routes)
+    setup_webapp(webapp_app, session_factory, settings.bot_token, read_session_factory)
+    if settings.bot_mode == "webhook":
+        setup_webhook(webapp_app, dp, bot)
 
     runner = web.AppRunner(webapp_app)
     await runner.setup()
@@ -64,11 +85,20 @@ async def main() -> None:
     await site.start()
     logger.info("WebApp server started on %s:%s", settings.webapp_host, port)
 
+    notifier = start_order_notifier(bot, session_factory)
     try:
-        await dp.start_polling(bot)
+        if settings.bot_mode == "webhook":
+            logger.info("Receiving updates via webhook at %s", webhook_url())
+            await asyncio.Event().wait()
+        else:
+            await dp.start_polling(bot)
     finally:
+        if notifier is not None:
+            await notifier.stop()
         await runner.cleanup()
-        await close_db(engine)
+        await close_db(engine, write_coordinator)
+        if read_engine is not None:
+            await close_db(read_engine)
         await bot.session.close()
 
 
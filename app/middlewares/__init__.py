@@ -1,3 +1,3 @@
-from app.middlewares.db import DbSessionMiddleware
+from app.middlewares.db import READ_ONLY, CommitBeforeRequestMiddleware, DbSessionMiddleware
 
-__all__ = ["DbSessionMiddleware"]
+__all__ = ["READ_ONLY", "CommitBeforeRequestMiddleware", "DbSessionMiddleware"]
@@ -1,13 +1,60 @@
-from typing import Any, Awaitable, Callable
+from typing import TYPE_CHECKING, Any, Awaitable, Callable
 
 from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.dispatcher.flags import get_flag
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
 from aiogram.types import TelegramObject
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from app.config import settings
+from database.instrumentation import track_queries
+from database.writer import commit_unit_of_work, unit_of_work
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+# Handler flags for handlers that never write; see DbSessionMiddleware.
+READ_ONLY = {"read_only": True}
+
 
 class DbSessionMiddleware(BaseMiddleware):
-    def __init__(self, session_factory: async_sessionmaker[AsyncSession]):
+    """Opens a session for each event.
+
+    Handlers flagged with ``READ_ONLY`` get their session from
+    ``read_session_factory`` when one is configured. Handler flags are only
+    visible to middlewares on the message and callback_query observers, so
+    register it there rather than on ``dp.update``.
+
+    With ``use_unit_of_work`` (``BOT_DATABASE_UNIT_OF_WORK``) the middleware
+    owns the transaction: service writes only flush, and the update commits
+    once after the handler returns or rolls back if it raises. Writes made
+    before a Telegram API call are committed ahead of it by
+    ``CommitBeforeRequestMiddleware``.
+
+    Queries are counted per handler and a warning is logged when a handler
+    issues more than ``query_budget``.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        read_session_factory: async_sessionmaker[AsyncSession] | None = None,
+        query_budget: int | None = None,
+        use_unit_of_work: bool | None = None,
+    ):
         self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+        self.use_unit_of_work = (
+            settings.database_unit_of_work if use_unit_of_work is None else use_unit_of_work
+        )
+        self.query_budget = (
+            settings.database_query_budget if query_budget is None else query_budget
+        )
 
     async def __call__(
         self,
@@ -15,6 +62,35 @@ class DbSessionMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: dict[str, Any],
     ) -> Any:
-        async with self.session_factory() as session:
-            data["session"] = session
-            return await handler(event, data)
+        factory = self.session_factory
+        if self.read_session_factory is not None and get_flag(data, "read_only"):
+            factory = self.read_session_factory
+        handler_object = data.get("handler")
+        if handler_object is not None:
+            name = handler_object.callback.__name__
+        else:
+            name = type(event).__name__
+        scope = unit_of_work(factory) if self.use_unit_of_work else factory()
+        with track_queries(name, self.query_budget):
+            async with scope as session:
+                data["session"] = session
+                return await handler(event, data)
+
+
+class CommitBeforeRequestMiddleware(BaseRequestMiddleware):
+    """Commits the current update's unit of work before each Telegram API call.
+
+    The outbound limiter can hold a call back for seconds. Committing first
+    keeps the SQLite write lock from being held across that wait, so other
+    writers do not run into ``database is locked``. Register it on the bot
+    session ahead of ``OutboundLimiter``.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        await commit_unit_of_work()
+        return await make_request(bot, method)
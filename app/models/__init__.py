@@ -1,7 +1,8 @@
 from app.models.base import Base
 from app.models.cart import CartItem
 from app.models.category import Category
-from app.models.order import Order, OrderItem, OrderStatus
+from app.models.fsm import FsmState
+from app.models.order import Order, OrderEvent, OrderItem, OrderStatus
 from app.models.product import Product
 from app.models.restaurant import Restaurant
 from app.models.user import User
@@ -16,4 +17,6 @@ __all__ = [
     "Order",
     "OrderItem",
     "OrderStatus",
+    "OrderEvent",
+    "FsmState",
 ]
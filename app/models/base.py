@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 from sqlalchemy import DateTime, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
@@ -8,6 +8,11 @@ class Base(DeclarativeBase):
     pass
 
 
+def utcnow() -> datetime:
+    """Naive UTC now, for timestamps the app compares itself (expiries, retry times)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class TimestampMixin:
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now(), nullable=False
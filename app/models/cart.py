@@ -1,6 +1,6 @@
 from typing import TYPE_CHECKING
 
-from sqlalchemy import ForeignKey, Integer
+from sqlalchemy import ForeignKey, Index, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models.base import Base
@@ -12,14 +12,18 @@ if TYPE_CHECKING:
 
 class CartItem(Base):
     __tablename__ = "cart_items"
+    __table_args__ = (
+        # Also serves every user_id lookup as the leading column.
+        Index("uq_cart_items_user_product", "user_id", "product_id", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
     quantity: Mapped[int] = mapped_column(Integer, default=1)
 
-    user: Mapped["User"] = relationship(back_populates="cart_items")
-    product: Mapped["Product"] = relationship(lazy="selectin")
+    user: Mapped["User"] = relationship(back_populates="cart_items", lazy="raise")
+    product: Mapped["Product"] = relationship(lazy="raise")
 
     @property
     def subtotal(self) -> int:
@@ -15,10 +15,10 @@ class Category(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(255))
-    restaurant_id: Mapped[int] = mapped_column(ForeignKey("restaurants.id"))
+    restaurant_id: Mapped[int] = mapped_column(ForeignKey("restaurants.id"), index=True)
 
-    restaurant: Mapped["Restaurant"] = relationship(back_populates="categories")
-    products: Mapped[list["Product"]] = relationship(back_populates="category", lazy="selectin")
+    restaurant: Mapped["Restaurant"] = relationship(back_populates="categories", lazy="raise")
+    products: Mapped[list["Product"]] = relationship(back_populates="category", lazy="raise")
 
     def __repr__(self) -> str:
         return f"<Category(id={self.id}, name={self.name})>"
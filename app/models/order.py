@@ -1,7 +1,8 @@
 import enum
+from datetime import datetime
 from typing import TYPE_CHECKING
 
-from sqlalchemy import Enum, ForeignKey, Integer, String, Text
+from sqlalchemy import DateTime, Enum, ForeignKey, Index, Integer, String, Text, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.models.base import Base, TimestampMixin
@@ -20,8 +21,31 @@ class OrderStatus(str, enum.Enum):
     CANCELLED = "cancelled"
 
 
+STATUS_LABELS = {
+    OrderStatus.PENDING: "Pending",
+    OrderStatus.CONFIRMED: "Confirmed",
+    OrderStatus.PREPARING: "Preparing",
+    OrderStatus.DELIVERING: "Delivering",
+    OrderStatus.DELIVERED: "Delivered",
+    OrderStatus.CANCELLED: "Cancelled",
+}
+
+STATUS_EMOJIS = {
+    OrderStatus.PENDING: "",
+    OrderStatus.CONFIRMED: "",
+    OrderStatus.PREPARING: "",
+    OrderStatus.DELIVERING: "",
+    OrderStatus.DELIVERED: "",
+    OrderStatus.CANCELLED: "",
+}
+
+
 class Order(TimestampMixin, Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        Index("ix_orders_user_id_created_at", "user_id", "created_at"),
+        Index("ix_orders_status_created_at", "status", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -34,8 +58,8 @@ class Order(TimestampMixin, Base):
     phone: Mapped[str] = mapped_column(String(20))
     comment: Mapped[str | None] = mapped_column(Text, nullable=True)
 
-    user: Mapped["User"] = relationship(back_populates="orders")
-    items: Mapped[list["OrderItem"]] = relationship(back_populates="order", lazy="selectin")
+    user: Mapped["User"] = relationship(back_populates="orders", lazy="raise")
+    items: Mapped[list["OrderItem"]] = relationship(back_populates="order", lazy="raise")
 
     @property
     def total_display(self) -> str:
@@ -43,15 +67,7 @@ class Order(TimestampMixin, Base):
 
     @property
     def status_emoji(self) -> str:
-        emojis = {
-            OrderStatus.PENDING: "",
-            OrderStatus.CONFIRMED: "",
-            OrderStatus.PREPARING: "",
-            OrderStatus.DELIVERING: "",
-            OrderStatus.DELIVERED: "",
-            OrderStatus.CANCELLED: "",
-        }
-        return emojis.get(self.status, "")
+        return STATUS_EMOJIS.get(self.status, "")
 
     def __repr__(self) -> str:
         return f"<Order(id={self.id}, status={self.status}, total={self.total})>"
@@ -61,13 +77,13 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"))
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"), index=True)
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"))
     quantity: Mapped[int] = mapped_column(Integer)
     price: Mapped[int] = mapped_column(Integer)  # price at time of order
 
-    order: Mapped["Order"] = relationship(back_populates="items")
-    product: Mapped["Product"] = relationship(lazy="selectin")
+    order: Mapped["Order"] = relationship(back_populates="items", lazy="raise")
+    product: Mapped["Product"] = relationship(lazy="raise")
 
     @property
     def subtotal(self) -> int:
@@ -75,3 +91,29 @@ class OrderItem(Base):
 
     def __repr__(self) -> str:
         return f"<OrderItem(order={self.order_id}, product={self.product_id}, qty={self.quantity})>"
+
+
+class OrderEvent(Base):
+    """Outbox row for a status change the customer has not been notified about.
+
+    Written in the same transaction as the change and deleted once the
+    notification is sent. ``available_at`` is when the next delivery attempt
+    may start; it is cleared when delivery is given up, and the notifier
+    purges such rows after a retention period. Not written at all while
+    notifications are turned off.
+    """
+
+    __tablename__ = "order_events"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.id"))
+    status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, server_default=func.now(), nullable=False
+    )
+    available_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True, index=True)
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    last_error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+    def __repr__(self) -> str:
+        return f"<OrderEvent(order_id={self.order_id}, status={self.status})>"
@@ -18,9 +18,9 @@ class Product(Base):
     price: Mapped[int] = mapped_column(Integer)  # price in cents
     image_url: Mapped[str | None] = mapped_column(String(500), nullable=True)
     is_available: Mapped[bool] = mapped_column(Boolean, default=True)
-    category_id: Mapped[int] = mapped_column(ForeignKey("categories.id"))
+    category_id: Mapped[int] = mapped_column(ForeignKey("categories.id"), index=True)
 
-    category: Mapped["Category"] = relationship(back_populates="products")
+    category: Mapped["Category"] = relationship(back_populates="products", lazy="raise")
 
     @property
     def price_display(self) -> str:
@@ -20,7 +20,7 @@ class Restaurant(TimestampMixin, Base):
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
 
     categories: Mapped[list["Category"]] = relationship(
-        back_populates="restaurant", lazy="selectin"
+        back_populates="restaurant", lazy="raise"
     )
 
     def __repr__(self) -> str:
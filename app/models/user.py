@@ -21,8 +21,8 @@ class User(TimestampMixin, Base):
     phone: Mapped[str | None] = mapped_column(String(20), nullable=True)
     delivery_address: Mapped[str | None] = mapped_column(String(500), nullable=True)
 
-    cart_items: Mapped[list["CartItem"]] = relationship(back_populates="user", lazy="selectin")
-    orders: Mapped[list["Order"]] = relationship(back_populates="user", lazy="selectin")
+    cart_items: Mapped[list["CartItem"]] = relationship(back_populates="user", lazy="raise")
+    orders: Mapped[list["Order"]] = relationship(back_populates="user", lazy="raise")
 
     def __repr__(self) -> str:
         return f"<User(id={self.id}, telegram_id={self.telegram_id}, name={self.first_name})>"
@@ -0,0 +1,124 @@
+"""Read-only row objects for list and detail views.
+
+These are filled straight from column-only queries and never enter the
+session identity map.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+from app.models.order import STATUS_EMOJIS, OrderStatus
+
+
+@dataclass(frozen=True, slots=True)
+class Page:
+    """One keyset page of ``items`` and whether neighbouring pages exist."""
+
+    items: list
+    has_prev: bool = False
+    has_next: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class RestaurantView:
+    id: int
+    name: str
+    description: str | None
+    address: str | None
+    image_url: str | None
+
+
+@dataclass(frozen=True, slots=True)
+class CategoryView:
+    id: int
+    name: str
+    restaurant_id: int
+
+
+@dataclass(frozen=True, slots=True)
+class ProductView:
+    id: int
+    name: str
+    description: str | None
+    price: int
+    image_url: str | None
+    is_available: bool
+    category_id: int
+
+    @property
+    def price_display(self) -> str:
+        return f"{self.price / 100:.2f}"
+
+
+@dataclass(frozen=True, slots=True)
+class ProductDetail(ProductView):
+    restaurant_id: int
+
+
+@dataclass(frozen=True, slots=True)
+class MenuCategory:
+    id: int
+    name: str
+    products: list[ProductView]
+
+
+@dataclass(frozen=True, slots=True)
+class CartLine:
+    id: int
+    product_id: int
+    name: str
+    price: int
+    quantity: int
+
+    @property
+    def price_display(self) -> str:
+        return f"{self.price / 100:.2f}"
+
+    @property
+    def subtotal(self) -> int:
+        return self.price * self.quantity
+
+
+@dataclass(frozen=True, slots=True)
+class OrderSummary:
+    id: int
+    status: OrderStatus
+    total: int
+    delivery_address: str
+    created_at: datetime
+
+    @property
+    def total_display(self) -> str:
+        return f"{self.total / 100:.2f}"
+
+
+@dataclass(frozen=True, slots=True)
+class OrderLine:
+    order_id: int
+    name: str
+    quantity: int
+    price: int
+
+    @property
+    def subtotal(self) -> int:
+        return self.price * self.quantity
+
+
+@dataclass(frozen=True, slots=True)
+class OrderDetail:
+    id: int
+    user_id: int
+    status: OrderStatus
+    total: int
+    delivery_address: str
+    phone: str
+    comment: str | None
+    created_at: datetime
+    lines: list[OrderLine]
+
+    @property
+    def total_display(self) -> str:
+        return f"{self.total / 100:.2f}"
+
+    @property
+    def status_emoji(self) -> str:
+        return STATUS_EMOJIS.get(self.status, "")
@@ -0,0 +1,273 @@
+"""Customer notifications for order status changes, delivered from an outbox.
+
+Unless notifications are turned off, ``OrderService.update_status`` writes
+an ``OrderEvent`` row in the same transaction as the status change, so the
+admin's click never waits on Telegram. ``OrderNotifier`` runs in the
+background and works through the outbox in batches:
+
+1. It claims up to ``batch_size`` due events in one transaction by moving
+   their ``available_at`` ``lease`` seconds ahead. A notifier that dies
+   mid-batch leaves them to be picked up again after the lease. On
+   PostgreSQL, concurrent notifiers skip each other's locked rows.
+2. It sends each customer's notifications in event order. Different
+   customers are sent concurrently in the ``Priority.BULK`` lane of the
+   outbound limiter, which paces each chat and absorbs ``RetryAfter``.
+3. It deletes the delivered events. A failed event is retried with
+   exponential backoff, and that customer's later events wait behind it.
+   After ``max_attempts``, or at once if the customer blocked the bot or
+   the chat is gone, the event is given up and kept with its error.
+4. Every ``PURGE_INTERVAL`` seconds it deletes given-up events older than
+   ``retention`` seconds.
+
+A notification is only deleted after Telegram accepted it, so a crash
+between the two can send it twice: delivery is at least once.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from sqlalchemy import bindparam, delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import Settings, settings
+from app.models.base import utcnow
+from app.models.order import STATUS_LABELS, Order, OrderEvent, OrderStatus
+from app.models.user import User
+from app.outbound import Priority, outbound_priority
+from database.writer import run_write
+
+logger = logging.getLogger(__name__)
+
+# Longest wait between two attempts at one event, in seconds.
+MAX_RETRY_DELAY = 3600
+
+# How often, in seconds, the notifier deletes old given-up events.
+PURGE_INTERVAL = 600
+
+_DUE = (
+    select(
+        OrderEvent.id,
+        OrderEvent.order_id,
+        OrderEvent.status,
+        OrderEvent.attempts,
+        User.telegram_id,
+    )
+    .join(Order, Order.id == OrderEvent.order_id)
+    .join(User, User.id == Order.user_id)
+    .where(OrderEvent.available_at <= bindparam("now"))
+    .order_by(OrderEvent.id)
+    .limit(bindparam("limit"))
+    .with_for_update(of=OrderEvent, skip_locked=True)
+)
+
+
+@dataclass(frozen=True, slots=True)
+class _Due:
+    id: int
+    order_id: int
+    status: OrderStatus
+    attempts: int
+    telegram_id: int
+
+
+@dataclass(frozen=True, slots=True)
+class _Failure:
+    event_id: int
+    attempts: int
+    error: str
+    retry_at: datetime | None
+
+
+def notification_text(order_id: int, status: OrderStatus) -> str:
+    label = STATUS_LABELS.get(status, status.value)
+    return f"Order #{order_id} is now <b>{label}</b>.\nTrack it with /orders"
+
+
+class OrderNotifier:
+    def __init__(
+        self,
+        bot: Bot,
+        session_factory: async_sessionmaker[AsyncSession],
+        batch_size: int = 50,
+        poll_interval: float = 1.0,
+        max_attempts: int = 5,
+        retry_delay: float = 30.0,
+        lease: float = 60.0,
+        retention: float = 604800.0,
+    ):
+        self.bot = bot
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.retention = retention
+        self.delivered = 0
+        self.failed = 0
+        self._stopping = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._last_purge: float | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._run(), name="order-notifier")
+
+    async def stop(self) -> None:
+        """Finish the batch in progress, then stop."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+        logger.info("Order notifier: %s delivered, %s failed attempts", self.delivered, self.failed)
+
+    async def run_once(self) -> int:
+        """Deliver one batch of due events; returns how many were claimed."""
+        due = await self._claim()
+        if not due:
+            return 0
+        chats: dict[int, list[_Due]] = {}
+        for event in due:
+            chats.setdefault(event.telegram_id, []).append(event)
+        with outbound_priority(Priority.BULK):
+            results = await asyncio.gather(
+                *(self._send_chat(events) for events in chats.values())
+            )
+        delivered = [event_id for sent, _ in results for event_id in sent]
+        failures = [failure for _, chat_failures in results for failure in chat_failures]
+        await self._finish(delivered, failures)
+        self.delivered += len(delivered)
+        self.failed += sum(1 for failure in failures if failure.attempts)
+        return len(due)
+
+    async def purge(self) -> int:
+        """Delete events given up more than ``retention`` seconds ago; returns how many."""
+        cutoff = utcnow() - timedelta(seconds=self.retention)
+
+        async def unit(session: AsyncSession) -> int:
+            result = await session.execute(
+                delete(OrderEvent).where(
+                    OrderEvent.available_at.is_(None), OrderEvent.created_at <= cutoff
+                )
+            )
+            return result.rowcount
+
+        async with self.session_factory() as session:
+            return await run_write(session, unit)
+
+    async def _run(self) -> None:
+        while not self._stopping.is_set():
+            if self._last_purge is None or time.monotonic() - self._last_purge >= PURGE_INTERVAL:
+                try:
+                    await self.purge()
+                except Exception:
+                    logger.exception("Purging given-up order notifications failed")
+                self._last_purge = time.monotonic()
+            try:
+                claimed = await self.run_once()
+            except Exception:
+                logger.exception("Order notification batch failed")
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _claim(self) -> list[_Due]:
+        now = utcnow()
+
+        async def unit(session: AsyncSession) -> list[_Due]:
+            result = await session.execute(_DUE, {"now": now, "limit": self.batch_size})
+            due = [_Due(*row) for row in result]
+            if due:
+                await session.execute(
+                    update(OrderEvent)
+                    .where(OrderEvent.id.in_([event.id for event in due]))
+                    .values(available_at=now + timedelta(seconds=self.lease))
+                )
+            return due
+
+        async with self.session_factory() as session:
+            return await run_write(session, unit)
+
+    async def _send_chat(self, events: list[_Due]) -> tuple[list[int], list[_Failure]]:
+        """Send one customer's events in order, stopping at the first one to retry."""
+        sent: list[int] = []
+        failures: list[_Failure] = []
+        for index, event in enumerate(events):
+            try:
+                await self.bot.send_message(
+                    event.telegram_id, notification_text(event.order_id, event.status)
+                )
+            except Exception as exc:
+                failure = self._failure(event, exc)
+                failures.append(failure)
+                if failure.retry_at is None:
+                    continue
+                # Later events for this customer wait until the failed one is retried.
+                failures.extend(
+                    _Failure(later.id, 0, "", failure.retry_at) for later in events[index + 1:]
+                )
+                break
+            else:
+                sent.append(event.id)
+        return sent, failures
+
+    def _failure(self, event: _Due, exc: Exception) -> _Failure:
+        attempts = event.attempts + 1
+        error = f"{type(exc).__name__}: {exc}"[:255]
+        permanent = isinstance(exc, (TelegramForbiddenError, TelegramBadRequest))
+        if permanent or attempts >= self.max_attempts:
+            logger.warning(
+                "Giving up on notification %s for order %s: %s", event.id, event.order_id, error
+            )
+            return _Failure(event.id, attempts, error, None)
+        delay = min(self.retry_delay * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+        logger.info(
+            "Notification %s for order %s failed, retrying in %ss: %s",
+            event.id,
+            event.order_id,
+            delay,
+            error,
+        )
+        return _Failure(event.id, attempts, error, utcnow() + timedelta(seconds=delay))
+
+    async def _finish(self, delivered: list[int], failures: list[_Failure]) -> None:
+        async def unit(session: AsyncSession) -> None:
+            if delivered:
+                await session.execute(delete(OrderEvent).where(OrderEvent.id.in_(delivered)))
+            for failure in failures:
+                values = {"available_at": failure.retry_at}
+                if failure.attempts:
+                    values.update(attempts=failure.attempts, last_error=failure.error)
+                await session.execute(
+                    update(OrderEvent).where(OrderEvent.id == failure.event_id).values(**values)
+                )
+
+        async with self.session_factory() as session:
+            await run_write(session, unit)
+
+
+def start_order_notifier(
+    bot: Bot, session_factory: async_sessionmaker[AsyncSession], config: Settings = settings
+) -> OrderNotifier | None:
+    """Start delivering order status notifications, unless disabled in settings."""
+    if not config.order_notifications:
+        return None
+    notifier = OrderNotifier(
+        bot,
+        session_factory,
+        batch_size=config.order_notifications_batch_size,
+        poll_interval=config.order_notifications_poll_interval,
+        max_attempts=config.order_notifications_max_attempts,
+        retention=config.order_notifications_retention,
+    )
+    notifier.start()
+    return notifier
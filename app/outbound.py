@@ -0,0 +1,246 @@
+"""Pacing of outbound Telegram API calls.
+
+Telegram allows a bot about 30 messages per second overall and about one
+per second in a single chat. Going over the limit returns
+``TelegramRetryAfter``. ``OutboundLimiter`` is an aiogram session middleware
+that paces every API call addressed to a chat (``chat_id``), such as
+``sendMessage`` and ``editMessageText``. Other calls (``answerCallbackQuery``,
+``getMe``, ``setWebhook``) are not paced.
+
+- Each chat has a token bucket. A chat's calls are sent one at a time in
+  the order they were made.
+- A global bucket is shared by all chats. When it runs dry, waiting calls
+  are granted by priority lane, then in arrival order. User replies are
+  ``Priority.INTERACTIVE``, the default. Code that sends in bulk wraps its
+  loop in ``outbound_priority(Priority.BULK)``.
+- On ``TelegramRetryAfter`` the call is retried after ``retry_after``
+  seconds, up to ``max_retries`` times. Flood control on a chat call pauses
+  only that chat; other chats keep sending. On a call without a chat it
+  pauses the global bucket, and with it every chat.
+"""
+import asyncio
+import enum
+import heapq
+import itertools
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+if TYPE_CHECKING:
+    from aiogram import Bot
+
+# Chats kept with an idle bucket before they are pruned.
+MAX_IDLE_CHATS = 10_000
+
+
+class Priority(enum.IntEnum):
+    INTERACTIVE = 0
+    BULK = 1
+
+
+_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def outbound_priority(priority: Priority) -> Iterator[None]:
+    """Send the API calls made in this block in the given lane."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass(slots=True)
+class TokenBucket:
+    rate: float
+    capacity: float
+    tokens: float = field(init=False)
+    updated: float = 0.0
+    paused_until: float = 0.0
+
+    def __post_init__(self) -> None:
+        self.tokens = self.capacity
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until a token is available."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float) -> None:
+        self.paused_until = max(self.paused_until, until)
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+@dataclass(slots=True)
+class OutboundStats:
+    sent: int = 0
+    retried: int = 0
+    interactive_queued: int = 0
+    bulk_queued: int = 0
+    wait_time: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """Average time a call waited for its chat and global tokens, in seconds."""
+        return self.wait_time / self.sent if self.sent else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.sent} sent, {self.retried} retried after flood control, queued "
+            f"{self.interactive_queued} interactive / {self.bulk_queued} bulk, "
+            f"wait mean {self.mean_wait * 1000:.1f} ms max {self.max_wait * 1000:.1f} ms"
+        )
+
+
+@dataclass(slots=True)
+class _Chat:
+    bucket: TokenBucket
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class OutboundLimiter(BaseRequestMiddleware):
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: int = 3,
+        max_retries: int = 3,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.stats = OutboundStats()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int | str, _Chat] = {}
+        self._waiting: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._granter: asyncio.Task | None = None
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await self._call_unpaced(make_request, bot, method)
+
+        priority = _priority.get()
+        chat = self._chat(chat_id)
+        async with chat.lock:
+            attempt = 0
+            waited = 0.0
+            while True:
+                waited += await self._wait_for_tokens(chat.bucket, priority)
+                try:
+                    response = await make_request(bot, method)
+                except TelegramRetryAfter as exc:
+                    if attempt >= self.max_retries:
+                        raise
+                    attempt += 1
+                    self.stats.retried += 1
+                    chat.bucket.pause(asyncio.get_running_loop().time() + exc.retry_after)
+                    continue
+                stats = self.stats
+                stats.sent += 1
+                stats.wait_time += waited
+                stats.max_wait = max(stats.max_wait, waited)
+                return response
+
+    async def _call_unpaced(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: "Bot",
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        """Send a call without a chat; only a global flood-control pause holds it back."""
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            if (delay := self._global.paused_until - loop.time()) > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exc:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.stats.retried += 1
+                self._global.pause(loop.time() + exc.retry_after)
+
+    def _chat(self, chat_id: int | str) -> _Chat:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= MAX_IDLE_CHATS:
+                self._prune()
+            chat = self._chats[chat_id] = _Chat(TokenBucket(self.chat_rate, self.chat_burst))
+        return chat
+
+    def _prune(self) -> None:
+        now = asyncio.get_running_loop().time()
+        for chat_id, chat in list(self._chats.items()):
+            if not chat.lock.locked() and chat.bucket.idle(now):
+                del self._chats[chat_id]
+
+    async def _wait_for_tokens(self, bucket: TokenBucket, priority: Priority) -> float:
+        """Take a token from ``bucket``, then from the global bucket; returns the wait."""
+        loop = asyncio.get_running_loop()
+        stats = self.stats
+        lane = "interactive_queued" if priority is Priority.INTERACTIVE else "bulk_queued"
+        setattr(stats, lane, getattr(stats, lane) + 1)
+        started = time.perf_counter()
+        try:
+            while (delay := bucket.delay(loop.time())) > 0:
+                await asyncio.sleep(delay)
+            bucket.take(loop.time())
+
+            future = loop.create_future()
+            heapq.heappush(self._waiting, (priority, next(self._sequence), future))
+            if self._granter is None or self._granter.done():
+                self._granter = asyncio.create_task(self._grant(), name="outbound-limiter")
+            await future
+        finally:
+            setattr(stats, lane, getattr(stats, lane) - 1)
+        return time.perf_counter() - started
+
+    async def _grant(self) -> None:
+        """Hand out global tokens to waiting calls, best lane first."""
+        loop = asyncio.get_running_loop()
+        while self._waiting:
+            delay = self._global.delay(loop.time())
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            self._global.take(loop.time())
+            future.set_result(None)
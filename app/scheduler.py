@@ -0,0 +1,132 @@
+"""Bounded, per-chat ordered update processing.
+
+aiogram hands every polled or webhook update to ``Dispatcher.feed_update``
+in its own task, so a burst from one chat runs concurrently with itself and
+the number of updates touching the database at once is unbounded.
+``ScheduledDispatcher`` makes each update take a slot from an
+``UpdateScheduler`` before it is fed: at most ``concurrency`` updates run at
+once, and updates from the same chat run one after another in arrival
+order. This happens before aiogram's FSM middleware reads the chat's state,
+so a checkout step always sees the state left by the previous one.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.middlewares.user_context import UserContextMiddleware
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class SchedulerStats:
+    processed: int = 0
+    queued: int = 0
+    running: int = 0
+    peak_queued: int = 0
+    wait_time: float = 0.0
+    max_wait: float = 0.0
+
+    @property
+    def mean_wait(self) -> float:
+        """Average time an update waited for its slot, in seconds."""
+        return self.wait_time / self.processed if self.processed else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.processed} updates, {self.queued} queued (peak {self.peak_queued}), "
+            f"{self.running} running, wait mean {self.mean_wait * 1000:.1f} ms "
+            f"max {self.max_wait * 1000:.1f} ms"
+        )
+
+
+@dataclass(slots=True)
+class _ChatQueue:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    pending: int = 0
+
+
+class UpdateScheduler:
+    def __init__(self, concurrency: int):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.stats = SchedulerStats()
+        self._slots = asyncio.Semaphore(concurrency)
+        self._chats: dict[int, _ChatQueue] = {}
+
+    @staticmethod
+    def key_for(update: Update) -> int | None:
+        """The chat an update belongs to, or its sender when it has no chat."""
+        context = UserContextMiddleware.resolve_event_context(update)
+        return context.chat_id if context.chat_id is not None else context.user_id
+
+    @asynccontextmanager
+    async def slot(self, key: int | None) -> AsyncIterator[None]:
+        """Wait for a free slot, after every earlier update with the same ``key``.
+
+        Updates without a key are only bounded, not ordered.
+        """
+        chat = None
+        if key is not None:
+            chat = self._chats.get(key)
+            if chat is None:
+                chat = self._chats[key] = _ChatQueue()
+            chat.pending += 1
+        stats = self.stats
+        stats.queued += 1
+        stats.peak_queued = max(stats.peak_queued, stats.queued)
+        started = time.perf_counter()
+        waiting = True
+        try:
+            if chat is not None:
+                await chat.lock.acquire()
+            try:
+                await self._slots.acquire()
+                waiting = False
+                stats.queued -= 1
+                waited = time.perf_counter() - started
+                stats.wait_time += waited
+                stats.max_wait = max(stats.max_wait, waited)
+                stats.running += 1
+                try:
+                    yield
+                finally:
+                    stats.running -= 1
+                    stats.processed += 1
+                    self._slots.release()
+            finally:
+                if chat is not None:
+                    chat.lock.release()
+        finally:
+            if waiting:
+                stats.queued -= 1
+            if chat is not None:
+                chat.pending -= 1
+                if not chat.pending:
+                    del self._chats[key]
+
+
+class ScheduledDispatcher(Dispatcher):
+    """A ``Dispatcher`` that feeds each update through an ``UpdateScheduler``.
+
+    The scheduler's counters are logged when the dispatcher shuts down.
+    """
+
+    def __init__(self, *, scheduler: UpdateScheduler, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.scheduler = scheduler
+        self.shutdown.register(self._log_stats)
+
+    async def _log_stats(self) -> None:
+        logger.info("Update scheduler: %s", self.scheduler.stats)
+
+    async def feed_update(self, bot: Bot, update: Update, **kwargs: Any) -> Any:
+        async with self.scheduler.slot(self.scheduler.key_for(update)):
+            return await super().feed_update(bot, update, **kwargs)
@@ -1,6 +1,23 @@
-from app.services.cart import CartService
+"""Domain services; each wraps the handler's ``AsyncSession``.
+
+Hot lookups are module-level statements (``_BY_ID``, ``_LINES`` and so on)
+built once at import and executed with bound parameters, so every call
+reuses the same compiled statement from SQLAlchemy's cache.
+"""
+from app.services.cart import CartOperation, CartService
+from app.services.catalog_cache import CatalogCache, catalog_cache
+from app.services.checkout import CheckoutService
 from app.services.order import OrderService
 from app.services.restaurant import RestaurantService
 from app.services.user import UserService
 
-__all__ = ["UserService", "RestaurantService", "CartService", "OrderService"]
+__all__ = [
+    "UserService",
+    "RestaurantService",
+    "CartService",
+    "CartOperation",
+    "OrderService",
+    "CheckoutService",
+    "CatalogCache",
+    "catalog_cache",
+]
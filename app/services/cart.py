@@ -1,8 +1,89 @@
-from sqlalchemy import delete, select
+from dataclasses import dataclass
+
+from sqlalchemy import bindparam, delete, literal, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.cart import CartItem
+from app.models.product import Product
 from app.models.user import User
+from app.models.views import CartLine
+from app.services.loaders import DETAIL, SUMMARY, loader_options
+from app.services.user import UserService
+from database.engine import upsert_insert
+from database.writer import in_unit_of_work, run_write
+
+_ITEMS = (
+    select(CartItem)
+    .where(CartItem.user_id == bindparam("user_id"))
+    .options(*loader_options(CartItem, DETAIL))
+)
+_LINES = (
+    select(CartItem.id, CartItem.product_id, Product.name, Product.price, CartItem.quantity)
+    .join(Product, Product.id == CartItem.product_id)
+    .where(CartItem.user_id == bindparam("user_id"))
+    .order_by(CartItem.id)
+)
+_ITEM_BY_ID = (
+    select(CartItem)
+    .where(CartItem.id == bindparam("item_id"))
+    .options(*loader_options(CartItem, SUMMARY))
+)
+_PRODUCTS = select(Product.id, Product.is_available).where(
+    Product.id.in_(bindparam("product_ids", expanding=True))
+)
+_BATCH_ITEMS = (
+    select(CartItem)
+    .where(CartItem.user_id == bindparam("user_id"))
+    .options(*loader_options(CartItem, SUMMARY))
+    .execution_options(populate_existing=True)
+)
+
+
+@dataclass(frozen=True, slots=True)
+class CartOperation:
+    """One cart mutation in a batch.
+
+    ``add`` increases a product's quantity, ``set`` replaces it (zero or less
+    removes the line) and ``remove`` drops the line. Lines are addressed by
+    ``product_id`` or, for ``set``/``remove``, by ``item_id``.
+    """
+
+    op: str
+    product_id: int | None = None
+    item_id: int | None = None
+    quantity: int = 1
+
+
+class CartProductError(ValueError):
+    """Products put in the cart do not exist or cannot be ordered."""
+
+    def __init__(self, missing: list[int], unavailable: list[int]):
+        self.missing = missing
+        self.unavailable = unavailable
+        super().__init__(f"Missing products {missing}, unavailable products {unavailable}")
+
+
+def _is_cart_line_conflict(exc: IntegrityError) -> bool:
+    """Whether ``exc`` is a violation of the one-line-per-product rule.
+
+    PostgreSQL names the constraint, SQLite lists its columns.
+    """
+    message = str(exc.orig)
+    return (
+        "uq_cart_items_user_product" in message
+        or "cart_items.user_id, cart_items.product_id" in message
+    )
+
+
+async def _check_products(session: AsyncSession, product_ids: list[int]) -> None:
+    """Raise ``CartProductError`` unless every product exists and is available."""
+    result = await session.execute(_PRODUCTS, {"product_ids": product_ids})
+    available = {product_id: is_available for product_id, is_available in result}
+    missing = [pid for pid in product_ids if pid not in available]
+    unavailable = [pid for pid in product_ids if pid in available and not available[pid]]
+    if missing or unavailable:
+        raise CartProductError(missing, unavailable)
 
 
 class CartService:
@@ -10,65 +91,158 @@ class CartService:
         self.session = session
 
     async def get_items(self, user_id: int) -> list[CartItem]:
-        stmt = select(CartItem).where(CartItem.user_id == user_id)
-        result = await self.session.execute(stmt)
+        result = await self.session.execute(_ITEMS, {"user_id": user_id})
         return list(result.scalars().all())
 
+    async def get_lines(self, user_id: int) -> list[CartLine]:
+        """The user's cart as read models, with each product's name and price."""
+        result = await self.session.execute(_LINES, {"user_id": user_id})
+        return [CartLine(*row) for row in result]
+
     async def add_item(self, user_id: int, product_id: int, quantity: int = 1) -> CartItem:
-        stmt = select(CartItem).where(
-            CartItem.user_id == user_id, CartItem.product_id == product_id
-        )
-        result = await self.session.execute(stmt)
-        item = result.scalar_one_or_none()
-
-        if item:
-            item.quantity += quantity
-        else:
-            item = CartItem(user_id=user_id, product_id=product_id, quantity=quantity)
-            self.session.add(item)
-
-        await self.session.commit()
-        await self.session.refresh(item)
-        return item
+        """Add ``quantity`` of a product; raises ``CartProductError`` if it cannot be ordered.
 
-    async def update_quantity(self, item_id: int, quantity: int) -> CartItem | None:
-        stmt = select(CartItem).where(CartItem.id == item_id)
-        result = await self.session.execute(stmt)
-        item = result.scalar_one_or_none()
+        One ``INSERT ... SELECT ... ON CONFLICT DO UPDATE ... RETURNING``: the
+        line is only written if the product exists and is available, so no
+        row back means it is not. The returned item has no product loaded.
+        """
+
+        async def unit(session: AsyncSession) -> CartItem:
+            insert = upsert_insert(session)
+            stmt = insert(CartItem).from_select(
+                ["user_id", "product_id", "quantity"],
+                select(literal(user_id), Product.id, literal(quantity)).where(
+                    Product.id == product_id, Product.is_available.is_(True)
+                ),
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[CartItem.user_id, CartItem.product_id],
+                set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+            ).returning(CartItem)
+            result = await session.execute(stmt, execution_options={"populate_existing": True})
+            item = result.scalar_one_or_none()
+            if item is None:
+                # Only on this error path: tell a missing product from an unavailable one.
+                await _check_products(session, [product_id])
+                raise CartProductError([], [product_id])
+            return item
 
-        if item is None:
-            return None
+        return await run_write(self.session, unit)
 
-        if quantity <= 0:
-            await self.session.delete(item)
-            await self.session.commit()
-            return None
+    async def update_quantity(self, item_id: int, quantity: int) -> CartItem | None:
+        async def unit(session: AsyncSession) -> CartItem | None:
+            if quantity <= 0:
+                await session.execute(delete(CartItem).where(CartItem.id == item_id))
+                return None
+
+            stmt = (
+                update(CartItem)
+                .where(CartItem.id == item_id)
+                .values(quantity=quantity)
+                .returning(CartItem)
+            )
+            result = await session.execute(stmt, execution_options={"populate_existing": True})
+            return result.scalar_one_or_none()
 
-        item.quantity = quantity
-        await self.session.commit()
-        await self.session.refresh(item)
-        return item
+        return await run_write(self.session, unit)
 
     async def remove_item(self, item_id: int) -> bool:
-        stmt = select(CartItem).where(CartItem.id == item_id)
-        result = await self.session.execute(stmt)
-        item = result.scalar_one_or_none()
-        if item:
-            await self.session.delete(item)
-            await self.session.commit()
+        async def unit(session: AsyncSession) -> bool:
+            result = await session.execute(_ITEM_BY_ID, {"item_id": item_id})
+            item = result.scalar_one_or_none()
+            if item is None:
+                return False
+            await session.delete(item)
             return True
-        return False
+
+        return await run_write(self.session, unit)
+
+    async def apply_batch(self, user_id: int, operations: list[CartOperation]) -> list[CartLine]:
+        """Apply cart operations in one transaction and return the resulting cart.
+
+        Raises ``CartProductError``, before anything is written, if an
+        operation would add a product that does not exist or is unavailable.
+
+        A concurrent insert of the same product trips the
+        ``(user_id, product_id)`` unique constraint; the batch is then
+        replayed once against the fresh cart. Inside a unit of work the
+        error propagates and the whole update is rolled back instead.
+        """
+
+        async def unit(session: AsyncSession) -> list[CartLine]:
+            return await self._apply_batch(session, user_id, operations)
+
+        try:
+            return await run_write(self.session, unit)
+        except IntegrityError as exc:
+            if in_unit_of_work(self.session) or not _is_cart_line_conflict(exc):
+                raise
+            return await run_write(self.session, unit)
+
+    @staticmethod
+    async def _apply_batch(
+        session: AsyncSession, user_id: int, operations: list[CartOperation]
+    ) -> list[CartLine]:
+        # Products an operation may put in the cart, checked in one query. An
+        # item_id that matches no line falls back to product_id, so ops that
+        # carry both are checked too.
+        product_ids = sorted({
+            operation.product_id
+            for operation in operations
+            if operation.product_id is not None
+            and (operation.op == "add" or (operation.op == "set" and operation.quantity > 0))
+        })
+        if product_ids:
+            await _check_products(session, product_ids)
+
+        result = await session.execute(_BATCH_ITEMS, {"user_id": user_id})
+        items = list(result.scalars().all())
+        by_product = {item.product_id: item for item in items}
+        by_id = {item.id: item for item in items}
+
+        for operation in operations:
+            if operation.item_id is not None:
+                item = by_id.get(operation.item_id)
+            else:
+                item = by_product.get(operation.product_id)
+
+            if operation.op == "remove" or (operation.op == "set" and operation.quantity <= 0):
+                if item is None:
+                    continue
+                by_id.pop(item.id, None)
+                by_product.pop(item.product_id, None)
+                if item in session.new:
+                    session.expunge(item)
+                else:
+                    await session.delete(item)
+                continue
+
+            if item is None:
+                if operation.product_id is None:
+                    continue
+                item = CartItem(user_id=user_id, product_id=operation.product_id, quantity=0)
+                session.add(item)
+                by_product[operation.product_id] = item
+
+            if operation.op == "add":
+                item.quantity += operation.quantity
+            else:
+                item.quantity = operation.quantity
+
+        await session.flush()
+
+        result = await session.execute(_LINES, {"user_id": user_id})
+        return [CartLine(*row) for row in result]
 
     async def clear(self, user_id: int) -> None:
-        stmt = delete(CartItem).where(CartItem.user_id == user_id)
-        await self.session.execute(stmt)
-        await self.session.commit()
+        async def unit(session: AsyncSession) -> None:
+            await session.execute(delete(CartItem).where(CartItem.user_id == user_id))
+
+        await run_write(self.session, unit)
 
     async def get_total(self, user_id: int) -> int:
-        items = await self.get_items(user_id)
-        return sum(item.subtotal for item in items)
+        lines = await self.get_lines(user_id)
+        return sum(line.subtotal for line in lines)
 
     async def get_user_by_telegram_id(self, telegram_id: int) -> User | None:
-        stmt = select(User).where(User.telegram_id == telegram_id)
-        result = await self.session.execute(stmt)
-        return result.scalar_one_or_none()
+        return await UserService(self.session).get_by_telegram_id(telegram_id)
@@ -0,0 +1,65 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response body."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+@dataclass(frozen=True, slots=True)
+class CachedBody:
+    body: bytes
+    etag: str
+
+
+class CatalogCache:
+    """In-process cache of encoded catalog responses.
+
+    Entries are stored as ready-to-send JSON bytes with their ETag, tagged
+    with the catalog version they were built from. Any catalog write bumps
+    the version and drops every entry; a response built while a write
+    happened is discarded instead of being stored. The cache is per
+    process, so each instance only sees invalidations made through its
+    own services.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.version = 0
+        self._restaurants: CachedBody | None = None
+        self._menus: OrderedDict[int, CachedBody] = OrderedDict()
+
+    def get_restaurants(self) -> CachedBody | None:
+        return self._restaurants
+
+    def set_restaurants(self, body: bytes, version: int) -> CachedBody:
+        cached = CachedBody(body, make_etag(body))
+        if version == self.version:
+            self._restaurants = cached
+        return cached
+
+    def get_menu(self, restaurant_id: int) -> CachedBody | None:
+        cached = self._menus.get(restaurant_id)
+        if cached is not None:
+            self._menus.move_to_end(restaurant_id)
+        return cached
+
+    def set_menu(self, restaurant_id: int, body: bytes, version: int) -> CachedBody:
+        cached = CachedBody(body, make_etag(body))
+        if version != self.version:
+            return cached
+        self._menus[restaurant_id] = cached
+        self._menus.move_to_end(restaurant_id)
+        if len(self._menus) > self.max_entries:
+            self._menus.popitem(last=False)
+        return cached
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self._restaurants = None
+        self._menus.clear()
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,80 @@
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.cart import CartItem
+from app.models.category import Category
+from app.models.order import Order, OrderItem, OrderStatus
+from app.models.product import Product
+from app.models.user import User
+from database.writer import run_write
+
+
+class CheckoutService:
+    """Turns a user's cart into an order in a single transaction.
+
+    Prices are snapshotted with one query, order items are written with one
+    executemany, and the cart is cleared and the contact details saved
+    before the single commit, which the write coordinator may share
+    with other writes. Used by both the bot and the WebApp.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def checkout(
+        self,
+        user_id: int,
+        delivery_address: str,
+        phone: str,
+        comment: str | None = None,
+    ) -> Order | None:
+        async def unit(session: AsyncSession) -> Order | None:
+            stmt = (
+                select(
+                    CartItem.product_id,
+                    CartItem.quantity,
+                    Product.price,
+                    Category.restaurant_id,
+                )
+                .join(Product, Product.id == CartItem.product_id)
+                .join(Category, Category.id == Product.category_id)
+                .where(CartItem.user_id == user_id)
+                .order_by(CartItem.id)
+            )
+            lines = (await session.execute(stmt)).all()
+            if not lines:
+                return None
+
+            order = Order(
+                user_id=user_id,
+                restaurant_id=lines[0].restaurant_id,
+                status=OrderStatus.PENDING,
+                total=sum(line.price * line.quantity for line in lines),
+                delivery_address=delivery_address,
+                phone=phone,
+                comment=comment,
+            )
+            session.add(order)
+            await session.flush()
+
+            await session.execute(
+                insert(OrderItem),
+                [
+                    {
+                        "order_id": order.id,
+                        "product_id": line.product_id,
+                        "quantity": line.quantity,
+                        "price": line.price,
+                    }
+                    for line in lines
+                ],
+            )
+            await session.execute(delete(CartItem).where(CartItem.user_id == user_id))
+            await session.execute(
+                update(User)
+                .where(User.id == user_id)
+                .values(phone=phone, delivery_address=delivery_address)
+            )
+            return order
+
+        return await run_write(self.session, unit)
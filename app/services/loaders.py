@@ -0,0 +1,61 @@
+"""Named eager-loading profiles.
+
+Every relationship is declared ``lazy="raise"``, so touching one that a
+query did not load fails loudly instead of issuing a hidden query. Each
+service method picks what it loads with one of these profiles:
+
+- ``summary``: the entity's own columns only.
+- ``menu``: a restaurant's or category's products, for catalog views.
+- ``detail``: what a single-object screen renders, such as a cart line's
+  product or an order's customer and items.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import ORMOption
+
+from app.models.cart import CartItem
+from app.models.category import Category
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.restaurant import Restaurant
+from app.models.user import User
+
+SUMMARY = "summary"
+MENU = "menu"
+DETAIL = "detail"
+
+_PROFILES: dict[type, dict[str, tuple[ORMOption, ...]]] = {
+    Restaurant: {
+        SUMMARY: (),
+        MENU: (selectinload(Restaurant.categories).selectinload(Category.products),),
+    },
+    Category: {
+        SUMMARY: (),
+        MENU: (selectinload(Category.products),),
+    },
+    Product: {
+        SUMMARY: (),
+        DETAIL: (joinedload(Product.category),),
+    },
+    CartItem: {
+        SUMMARY: (),
+        DETAIL: (selectinload(CartItem.product),),
+    },
+    Order: {
+        SUMMARY: (),
+        DETAIL: (
+            joinedload(Order.user),
+            selectinload(Order.items).joinedload(OrderItem.product),
+        ),
+    },
+    User: {
+        SUMMARY: (),
+    },
+}
+
+
+def loader_options(entity: type, profile: str) -> tuple[ORMOption, ...]:
+    """Loader options for ``entity`` under ``profile``."""
+    try:
+        return _PROFILES[entity][profile]
+    except KeyError:
+        raise ValueError(f"No {profile!r} loader profile for {entity.__name__}") from None
@@ -1,13 +1,99 @@
-from sqlalchemy import select
+from sqlalchemy import and_, bindparam, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
+from app.models.base import utcnow
 from app.models.cart import CartItem
-from app.models.order import Order, OrderItem, OrderStatus
+from app.models.order import Order, OrderEvent, OrderItem, OrderStatus
+from app.models.product import Product
+from app.models.views import OrderDetail, OrderLine, OrderSummary
+from app.services.loaders import DETAIL, SUMMARY, loader_options
+from database.writer import run_write
+
+# Largest id a BIGINT primary key holds; bigger cursors cannot bind.
+MAX_ORDER_ID = 2**63 - 1
+
+ACTIVE_STATUSES = (
+    OrderStatus.PENDING,
+    OrderStatus.CONFIRMED,
+    OrderStatus.PREPARING,
+    OrderStatus.DELIVERING,
+)
+
+_SUMMARY_COLUMNS = (
+    Order.id,
+    Order.status,
+    Order.total,
+    Order.delivery_address,
+    Order.created_at,
+)
+
+_BY_ID = (
+    select(Order)
+    .where(Order.id == bindparam("order_id"))
+    .options(*loader_options(Order, DETAIL))
+)
+_SUMMARIES = (
+    select(*_SUMMARY_COLUMNS)
+    .where(Order.user_id == bindparam("user_id"))
+    .order_by(Order.created_at.desc(), Order.id.desc())
+    .limit(bindparam("limit"))
+)
+# The (created_at, id) anchor is read from the row itself, so the
+# comparison uses the column's own storage format on every backend.
+_CURSOR_CREATED_AT = (
+    select(Order.created_at).where(Order.id == bindparam("cursor_id")).scalar_subquery()
+)
+_SUMMARIES_AFTER = _SUMMARIES.where(
+    or_(
+        Order.created_at < _CURSOR_CREATED_AT,
+        and_(Order.created_at == _CURSOR_CREATED_AT, Order.id < bindparam("cursor_id")),
+    )
+)
+_ACTIVE_SUMMARIES = (
+    select(*_SUMMARY_COLUMNS)
+    .where(Order.user_id == bindparam("user_id"), Order.status.in_(ACTIVE_STATUSES))
+    .order_by(Order.created_at.desc(), Order.id.desc())
+)
+_LINES = (
+    select(OrderItem.order_id, Product.name, OrderItem.quantity, OrderItem.price)
+    .join(Product, Product.id == OrderItem.product_id)
+    .where(OrderItem.order_id.in_(bindparam("order_ids", expanding=True)))
+    .order_by(OrderItem.id)
+)
+_DETAIL = select(
+    Order.id,
+    Order.user_id,
+    Order.status,
+    Order.total,
+    Order.delivery_address,
+    Order.phone,
+    Order.comment,
+    Order.created_at,
+).where(Order.id == bindparam("order_id"))
+
+
+def encode_order_cursor(summary: OrderSummary) -> str:
+    """Opaque keyset cursor pointing just past ``summary``."""
+    return str(summary.id)
+
+
+def decode_order_cursor(cursor: str) -> int:
+    """Inverse of :func:`encode_order_cursor`; raises ``ValueError`` if malformed."""
+    if not (cursor.isascii() and cursor.isdigit()):
+        raise ValueError(f"Invalid order cursor: {cursor!r}")
+    order_id = int(cursor)
+    if not 1 <= order_id <= MAX_ORDER_ID:
+        raise ValueError(f"Order cursor out of range: {cursor!r}")
+    return order_id
 
 
 class OrderService:
-    def __init__(self, session: AsyncSession):
+    def __init__(self, session: AsyncSession, notify_customers: bool | None = None):
         self.session = session
+        self.notify_customers = (
+            settings.order_notifications if notify_customers is None else notify_customers
+        )
 
     async def create_from_cart(
         self,
@@ -18,36 +104,38 @@ class OrderService:
         phone: str,
         comment: str | None = None,
     ) -> Order:
-        total = sum(item.product.price * item.quantity for item in cart_items)
-
-        order = Order(
-            user_id=user_id,
-            restaurant_id=restaurant_id,
-            status=OrderStatus.PENDING,
-            total=total,
-            delivery_address=delivery_address,
-            phone=phone,
-            comment=comment,
-        )
-        self.session.add(order)
-        await self.session.flush()
-
-        for cart_item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price,
+        async def unit(session: AsyncSession) -> Order:
+            order = Order(
+                user_id=user_id,
+                restaurant_id=restaurant_id,
+                status=OrderStatus.PENDING,
+                total=sum(item.product.price * item.quantity for item in cart_items),
+                delivery_address=delivery_address,
+                phone=phone,
+                comment=comment,
+            )
+            session.add(order)
+            await session.flush()
+
+            for cart_item in cart_items:
+                order_item = OrderItem(
+                    order_id=order.id,
+                    product_id=cart_item.product_id,
+                    quantity=cart_item.quantity,
+                    price=cart_item.product.price,
+                )
+                session.add(order_item)
+
+            await session.flush()
+            result = await session.execute(
+                _BY_ID, {"order_id": order.id}, execution_options={"populate_existing": True}
             )
-            self.session.add(order_item)
+            return result.scalar_one()
 
-        await self.session.commit()
-        await self.session.refresh(order)
-        return order
+        return await run_write(self.session, unit)
 
     async def get_by_id(self, order_id: int) -> Order | None:
-        stmt = select(Order).where(Order.id == order_id)
-        result = await self.session.execute(stmt)
+        result = await self.session.execute(_BY_ID, {"order_id": order_id})
         return result.scalar_one_or_none()
 
     async def get_user_orders(self, user_id: int) -> list[Order]:
@@ -55,47 +143,94 @@ class OrderService:
             select(Order)
             .where(Order.user_id == user_id)
             .order_by(Order.created_at.desc())
+            .options(*loader_options(Order, SUMMARY))
         )
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
+    async def get_order_summaries(
+        self, user_id: int, limit: int = 10, cursor: str | None = None
+    ) -> tuple[list[OrderSummary], str | None]:
+        """One page of a user's orders, newest first, and the cursor for the next page."""
+        params = {"user_id": user_id, "limit": limit + 1}
+        if cursor is None:
+            result = await self.session.execute(_SUMMARIES, params)
+        else:
+            params["cursor_id"] = decode_order_cursor(cursor)
+            result = await self.session.execute(_SUMMARIES_AFTER, params)
+        summaries = [OrderSummary(*row) for row in result]
+        if len(summaries) > limit:
+            del summaries[limit:]
+            return summaries, encode_order_cursor(summaries[-1])
+        return summaries, None
+
+    async def get_order_lines(self, order_ids: list[int]) -> dict[int, list[OrderLine]]:
+        lines: dict[int, list[OrderLine]] = {order_id: [] for order_id in order_ids}
+        if not order_ids:
+            return lines
+        result = await self.session.execute(_LINES, {"order_ids": order_ids})
+        for row in result:
+            lines[row.order_id].append(OrderLine(*row))
+        return lines
+
+    async def get_order_detail(self, order_id: int) -> OrderDetail | None:
+        """One order and its lines as read models, in two column-only queries."""
+        row = (await self.session.execute(_DETAIL, {"order_id": order_id})).first()
+        if row is None:
+            return None
+        lines = await self.get_order_lines([order_id])
+        return OrderDetail(*row, lines=lines[order_id])
+
+    async def get_active_summaries(self, user_id: int) -> list[OrderSummary]:
+        result = await self.session.execute(_ACTIVE_SUMMARIES, {"user_id": user_id})
+        return [OrderSummary(*row) for row in result]
+
     async def get_active_orders(self, user_id: int) -> list[Order]:
-        active_statuses = [
-            OrderStatus.PENDING,
-            OrderStatus.CONFIRMED,
-            OrderStatus.PREPARING,
-            OrderStatus.DELIVERING,
-        ]
         stmt = (
             select(Order)
-            .where(Order.user_id == user_id, Order.status.in_(active_statuses))
+            .where(Order.user_id == user_id, Order.status.in_(ACTIVE_STATUSES))
             .order_by(Order.created_at.desc())
+            .options(*loader_options(Order, SUMMARY))
         )
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
     async def update_status(self, order_id: int, status: OrderStatus) -> Order | None:
-        order = await self.get_by_id(order_id)
-        if order:
-            order.status = status
-            await self.session.commit()
-            await self.session.refresh(order)
-        return order
+        async def unit(session: AsyncSession) -> Order | None:
+            order = await session.get(
+                Order, order_id, options=loader_options(Order, SUMMARY)
+            )
+            if order:
+                if order.status != status and self.notify_customers:
+                    # The customer is notified from this outbox row; see app.notifications.
+                    session.add(OrderEvent(order_id=order.id, status=status, available_at=utcnow()))
+                order.status = status
+                await session.flush()
+                await session.refresh(order)
+            return order
+
+        return await run_write(self.session, unit)
 
     async def cancel(self, order_id: int, user_id: int) -> Order | None:
-        order = await self.get_by_id(order_id)
-        if order and order.user_id == user_id and order.status == OrderStatus.PENDING:
-            order.status = OrderStatus.CANCELLED
-            await self.session.commit()
-            await self.session.refresh(order)
-            return order
-        return None
+        async def unit(session: AsyncSession) -> Order | None:
+            order = await session.get(
+                Order, order_id, options=loader_options(Order, SUMMARY)
+            )
+            if order and order.user_id == user_id and order.status == OrderStatus.PENDING:
+                order.status = OrderStatus.CANCELLED
+                await session.flush()
+                await session.refresh(order)
+                return order
+            return None
+
+        return await run_write(self.session, unit)
 
     async def get_all_pending(self) -> list[Order]:
         stmt = (
             select(Order)
             .where(Order.status == OrderStatus.PENDING)
             .order_by(Order.created_at.asc())
+            .options(*loader_options(Order, DETAIL))
         )
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
@@ -1,10 +1,61 @@
-from sqlalchemy import select
+from typing import TypeVar
+
+from sqlalchemy import Select, and_, bindparam, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from app.models.category import Category
 from app.models.product import Product
 from app.models.restaurant import Restaurant
+from app.models.views import (
+    CategoryView,
+    MenuCategory,
+    Page,
+    ProductDetail,
+    ProductView,
+    RestaurantView,
+)
+from app.services.catalog_cache import catalog_cache
+from app.services.loaders import DETAIL, MENU, SUMMARY, loader_options
+from database.writer import WriteUnit, after_commit, run_write
+
+PAGE_SIZE = 8
+
+T = TypeVar("T")
+
+_RESTAURANT_COLUMNS = (
+    Restaurant.id,
+    Restaurant.name,
+    Restaurant.description,
+    Restaurant.address,
+    Restaurant.image_url,
+)
+_PRODUCT_COLUMNS = (
+    Product.id,
+    Product.name,
+    Product.description,
+    Product.price,
+    Product.image_url,
+    Product.is_available,
+    Product.category_id,
+)
+
+_ACTIVE_RESTAURANTS = (
+    select(*_RESTAURANT_COLUMNS).where(Restaurant.is_active.is_(True)).order_by(Restaurant.id)
+)
+_RESTAURANT_HEADER = select(*_RESTAURANT_COLUMNS).where(
+    Restaurant.id == bindparam("restaurant_id")
+)
+_MENU = (
+    select(Category.id, Category.name, *_PRODUCT_COLUMNS)
+    .outerjoin(Product, Product.category_id == Category.id)
+    .where(Category.restaurant_id == bindparam("restaurant_id"))
+    .order_by(Category.id, Product.id)
+)
+_PRODUCT_DETAIL = (
+    select(*_PRODUCT_COLUMNS, Category.restaurant_id)
+    .join(Category, Category.id == Product.category_id)
+    .where(Product.id == bindparam("product_id"))
+)
 
 
 class RestaurantService:
@@ -12,15 +63,146 @@ class RestaurantService:
         self.session = session
 
     async def get_all_active(self) -> list[Restaurant]:
-        stmt = select(Restaurant).where(Restaurant.is_active.is_(True))
+        stmt = (
+            select(Restaurant)
+            .where(Restaurant.is_active.is_(True))
+            .options(*loader_options(Restaurant, SUMMARY))
+        )
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
+    async def _keyset_page(
+        self, stmt: Select, key, view, after: int, before: int, limit: int
+    ) -> Page:
+        if before:
+            stmt = stmt.where(key < before).order_by(key.desc()).limit(limit + 1)
+            rows = (await self.session.execute(stmt)).all()
+            items = [view(*row) for row in rows[:limit]]
+            items.reverse()
+            return Page(items, has_prev=len(rows) > limit, has_next=True)
+
+        if after:
+            stmt = stmt.where(key > after)
+        stmt = stmt.order_by(key).limit(limit + 1)
+        rows = (await self.session.execute(stmt)).all()
+        items = [view(*row) for row in rows[:limit]]
+        return Page(items, has_prev=bool(after), has_next=len(rows) > limit)
+
+    async def get_restaurant_views(self) -> list[RestaurantView]:
+        """All active restaurants as read models, ordered by id."""
+        return [RestaurantView(*row) for row in await self.session.execute(_ACTIVE_RESTAURANTS)]
+
+    async def get_active_page(
+        self, after: int = 0, before: int = 0, limit: int = PAGE_SIZE
+    ) -> Page:
+        """One page of active restaurants ordered by id, after or before a given id."""
+        stmt = select(*_RESTAURANT_COLUMNS).where(Restaurant.is_active.is_(True))
+        return await self._keyset_page(
+            stmt, Restaurant.id, RestaurantView, after, before, limit
+        )
+
+    async def get_categories_page(
+        self, restaurant_id: int, after: int = 0, before: int = 0, limit: int = PAGE_SIZE
+    ) -> Page:
+        stmt = select(Category.id, Category.name, Category.restaurant_id).where(
+            Category.restaurant_id == restaurant_id
+        )
+        return await self._keyset_page(stmt, Category.id, CategoryView, after, before, limit)
+
+    async def get_restaurant_with_categories(
+        self, restaurant_id: int, after: int = 0, before: int = 0, limit: int = PAGE_SIZE
+    ) -> tuple[RestaurantView, Page] | None:
+        """A restaurant's header and one page of its categories in a single query.
+
+        Categories are outer-joined with the keyset condition in the ON clause,
+        so the restaurant row comes back even when the page is empty.
+        """
+        category_filter = [Category.restaurant_id == Restaurant.id]
+        if before:
+            category_filter.append(Category.id < before)
+            order_by = Category.id.desc()
+        else:
+            if after:
+                category_filter.append(Category.id > after)
+            order_by = Category.id
+        stmt = (
+            select(*_RESTAURANT_COLUMNS, Category.id, Category.name, Category.restaurant_id)
+            .outerjoin(Category, and_(*category_filter))
+            .where(Restaurant.id == restaurant_id)
+            .order_by(order_by)
+            .limit(limit + 1)
+        )
+        rows = (await self.session.execute(stmt)).all()
+        if not rows:
+            return None
+
+        columns = len(_RESTAURANT_COLUMNS)
+        restaurant = RestaurantView(*rows[0][:columns])
+        categories = [
+            CategoryView(*row[columns:]) for row in rows[:limit] if row[columns] is not None
+        ]
+        has_more = len(rows) > limit
+        if before:
+            categories.reverse()
+            return restaurant, Page(categories, has_prev=has_more, has_next=True)
+        return restaurant, Page(categories, has_prev=bool(after), has_next=has_more)
+
+    async def get_restaurant_header(self, restaurant_id: int) -> RestaurantView | None:
+        """The restaurant's own columns, without loading its catalog."""
+        params = {"restaurant_id": restaurant_id}
+        row = (await self.session.execute(_RESTAURANT_HEADER, params)).first()
+        return RestaurantView(*row) if row else None
+
+    async def get_category_with_available_products(
+        self,
+        category_id: int,
+        restaurant_id: int,
+        after: int = 0,
+        before: int = 0,
+        limit: int = PAGE_SIZE,
+    ) -> tuple[CategoryView, Page] | None:
+        """A category and one page of its available products in a single query.
+
+        Products are outer-joined with the keyset condition in the ON clause,
+        so the category row comes back even when the page is empty.
+        """
+        product_filter = [Product.category_id == Category.id, Product.is_available.is_(True)]
+        if before:
+            product_filter.append(Product.id < before)
+            order_by = Product.id.desc()
+        else:
+            if after:
+                product_filter.append(Product.id > after)
+            order_by = Product.id
+        stmt = (
+            select(
+                Category.id,
+                Category.name,
+                Category.restaurant_id,
+                *_PRODUCT_COLUMNS,
+            )
+            .outerjoin(Product, and_(*product_filter))
+            .where(Category.id == category_id, Category.restaurant_id == restaurant_id)
+            .order_by(order_by)
+            .limit(limit + 1)
+        )
+        rows = (await self.session.execute(stmt)).all()
+        if not rows:
+            return None
+
+        category = CategoryView(*rows[0][:3])
+        products = [ProductView(*row[3:]) for row in rows[:limit] if row[3] is not None]
+        has_more = len(rows) > limit
+        if before:
+            products.reverse()
+            return category, Page(products, has_prev=has_more, has_next=True)
+        return category, Page(products, has_prev=bool(after), has_next=has_more)
+
     async def get_by_id(self, restaurant_id: int) -> Restaurant | None:
         stmt = (
             select(Restaurant)
             .where(Restaurant.id == restaurant_id)
-            .options(selectinload(Restaurant.categories).selectinload(Category.products))
+            .options(*loader_options(Restaurant, MENU))
         )
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
@@ -29,31 +211,57 @@ class RestaurantService:
         stmt = (
             select(Category)
             .where(Category.restaurant_id == restaurant_id)
-            .options(selectinload(Category.products))
+            .options(*loader_options(Category, MENU))
         )
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
     async def get_product(self, product_id: int) -> Product | None:
-        stmt = select(Product).where(Product.id == product_id)
+        stmt = (
+            select(Product)
+            .where(Product.id == product_id)
+            .options(*loader_options(Product, DETAIL))
+        )
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_menu_views(self, restaurant_id: int) -> list[MenuCategory]:
+        """A restaurant's categories and all their products, from one joined query."""
+        result = await self.session.execute(_MENU, {"restaurant_id": restaurant_id})
+        menu: list[MenuCategory] = []
+        for row in result:
+            if not menu or menu[-1].id != row[0]:
+                menu.append(MenuCategory(row[0], row[1], []))
+            if row[2] is not None:
+                menu[-1].products.append(ProductView(*row[2:]))
+        return menu
+
+    async def get_product_detail(self, product_id: int) -> ProductDetail | None:
+        params = {"product_id": product_id}
+        row = (await self.session.execute(_PRODUCT_DETAIL, params)).first()
+        return ProductDetail(*row) if row else None
+
     async def create_restaurant(
         self, name: str, description: str | None = None, address: str | None = None
     ) -> Restaurant:
-        restaurant = Restaurant(name=name, description=description, address=address)
-        self.session.add(restaurant)
-        await self.session.commit()
-        await self.session.refresh(restaurant)
-        return restaurant
+        async def unit(session: AsyncSession) -> Restaurant:
+            restaurant = Restaurant(name=name, description=description, address=address)
+            session.add(restaurant)
+            await session.flush()
+            await session.refresh(restaurant)
+            return restaurant
+
+        return await self._write_catalog(unit)
 
     async def create_category(self, name: str, restaurant_id: int) -> Category:
-        category = Category(name=name, restaurant_id=restaurant_id)
-        self.session.add(category)
-        await self.session.commit()
-        await self.session.refresh(category)
-        return category
+        async def unit(session: AsyncSession) -> Category:
+            category = Category(name=name, restaurant_id=restaurant_id)
+            session.add(category)
+            await session.flush()
+            await session.refresh(category)
+            return category
+
+        return await self._write_catalog(unit)
 
     async def create_product(
         self,
@@ -63,14 +271,36 @@ class RestaurantService:
         description: str | None = None,
         image_url: str | None = None,
     ) -> Product:
-        product = Product(
-            name=name,
-            price=price,
-            category_id=category_id,
-            description=description,
-            image_url=image_url,
-        )
-        self.session.add(product)
-        await self.session.commit()
-        await self.session.refresh(product)
-        return product
+        async def unit(session: AsyncSession) -> Product:
+            product = Product(
+                name=name,
+                price=price,
+                category_id=category_id,
+                description=description,
+                image_url=image_url,
+            )
+            session.add(product)
+            await session.flush()
+            await session.refresh(product)
+            return product
+
+        return await self._write_catalog(unit)
+
+    async def set_product_availability(self, product_id: int, is_available: bool) -> Product | None:
+        async def unit(session: AsyncSession) -> Product | None:
+            product = await session.get(
+                Product, product_id, options=loader_options(Product, SUMMARY)
+            )
+            if product:
+                product.is_available = is_available
+                await session.flush()
+                await session.refresh(product)
+            return product
+
+        return await self._write_catalog(unit)
+
+    async def _write_catalog(self, unit: WriteUnit[T]) -> T:
+        """Run a catalog write and drop the cached catalog once it is committed."""
+        result = await run_write(self.session, unit)
+        after_commit(self.session, catalog_cache.invalidate)
+        return result
@@ -1,7 +1,15 @@
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.user import User
+from app.services.loaders import SUMMARY, loader_options
+from database.writer import run_write
+
+_BY_TELEGRAM_ID = (
+    select(User)
+    .where(User.telegram_id == bindparam("telegram_id"))
+    .options(*loader_options(User, SUMMARY))
+)
 
 
 class UserService:
@@ -15,35 +23,41 @@ class UserService:
         last_name: str | None = None,
         username: str | None = None,
     ) -> User:
-        stmt = select(User).where(User.telegram_id == telegram_id)
-        result = await self.session.execute(stmt)
+        result = await self.session.execute(_BY_TELEGRAM_ID, {"telegram_id": telegram_id})
         user = result.scalar_one_or_none()
 
-        if user is None:
+        if user is not None:
+            return user
+
+        async def unit(session: AsyncSession) -> User:
             user = User(
                 telegram_id=telegram_id,
                 first_name=first_name,
                 last_name=last_name,
                 username=username,
             )
-            self.session.add(user)
-            await self.session.commit()
-            await self.session.refresh(user)
+            session.add(user)
+            await session.flush()
+            await session.refresh(user)
+            return user
 
-        return user
+        return await run_write(self.session, unit)
 
     async def get_by_telegram_id(self, telegram_id: int) -> User | None:
-        stmt = select(User).where(User.telegram_id == telegram_id)
-        result = await self.session.execute(stmt)
+        result = await self.session.execute(_BY_TELEGRAM_ID, {"telegram_id": telegram_id})
         return result.scalar_one_or_none()
 
     async def update_contact(
         self, telegram_id: int, phone: str, address: str
     ) -> User | None:
-        user = await self.get_by_telegram_id(telegram_id)
-        if user:
-            user.phone = phone
-            user.delivery_address = address
-            await self.session.commit()
-            await self.session.refresh(user)
-        return user
+        async def unit(session: AsyncSession) -> User | None:
+            result = await session.execute(_BY_TELEGRAM_ID, {"telegram_id": telegram_id})
+            user = result.scalar_one_or_none()
+            if user:
+                user.phone = phone
+                user.delivery_address = address
+                await session.flush()
+                await session.refresh(user)
+            return user
+
+        return await run_write(self.session, unit)
@@ -0,0 +1,102 @@
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, unquote
+
+
+def derive_secret_key(bot_token: str) -> bytes:
+    """Derive the WebApp HMAC secret key for a bot token."""
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+def check_init_data(init_data: str, secret_key: bytes) -> dict | None:
+    """Check the initData signature against a derived secret key."""
+    parsed = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = parsed.pop("hash", None)
+    if not received_hash:
+        return None
+
+    data_check_string = "\n".join(
+        f"{k}={v}" for k, v in sorted(parsed.items())
+    )
+    calculated_hash = hmac.new(
+        secret_key, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
+
+    if not hmac.compare_digest(calculated_hash, received_hash):
+        return None
+
+    user_data = parsed.get("user")
+    if user_data:
+        parsed["user"] = json.loads(unquote(user_data))
+    return parsed
+
+
+def validate_webapp_data(init_data: str, bot_token: str) -> dict | None:
+    """Validate Telegram WebApp initData and return parsed data."""
+    return check_init_data(init_data, derive_secret_key(bot_token))
+
+
+def _extract_hash(init_data: str) -> str | None:
+    for pair in init_data.split("&"):
+        if pair.startswith("hash="):
+            return pair[5:]
+    return None
+
+
+class WebAppDataValidator:
+    """Validates initData for one bot token.
+
+    The secret key is derived once. Successful validations are kept in a
+    bounded LRU cache keyed by the received hash and expire when their
+    ``auth_date`` leaves the ``max_age`` freshness window, so a Mini App
+    session re-sending the same header skips parsing and hashing.
+    Returned dicts are shared between hits and must not be mutated.
+    """
+
+    def __init__(self, bot_token: str, max_age: int = 86400, cache_size: int = 1024):
+        self.max_age = max_age
+        self.cache_size = cache_size
+        self._secret_key = derive_secret_key(bot_token)
+        self._cache: OrderedDict[str, tuple[str, float, dict]] = OrderedDict()
+
+    def validate(self, init_data: str) -> dict | None:
+        received_hash = _extract_hash(init_data)
+        if not received_hash:
+            return None
+
+        now = time.time()
+        cached = self._cache.get(received_hash)
+        if cached is not None:
+            cached_init_data, expires_at, parsed = cached
+            if now >= expires_at:
+                del self._cache[received_hash]
+            elif cached_init_data == init_data:
+                self._cache.move_to_end(received_hash)
+                return parsed
+
+        parsed = check_init_data(init_data, self._secret_key)
+        if parsed is None:
+            return None
+
+        try:
+            auth_date = int(parsed.get("auth_date", ""))
+        except ValueError:
+            return None
+        expires_at = auth_date + self.max_age
+        if now >= expires_at:
+            return None
+
+        if self.cache_size > 0:
+            self._cache[received_hash] = (init_data, expires_at, parsed)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return parsed
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def __len__(self) -> int:
+        return len(self._cache)
@@ -0,0 +1,55 @@
+from aiohttp import web
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from database.instrumentation import track_queries
+from database.writer import unit_of_work
+
+
+def read_only(handler):
+    """Mark a route that never writes; ``db_session_middleware`` gives it a read session."""
+    handler.read_only = True
+    return handler
+
+
+def query_stats_middleware(budget: int | None = None):
+    """Count the queries of each WebApp route and warn when one exceeds ``budget``."""
+    budget = settings.database_query_budget if budget is None else budget
+
+    @web.middleware
+    async def middleware(request: web.Request, handler) -> web.StreamResponse:
+        resource = request.match_info.route.resource
+        path = resource.canonical if resource is not None else request.path
+        with track_queries(f"{request.method} {path}", budget):
+            return await handler(request)
+
+    return middleware
+
+
+def db_session_middleware(
+    session_factory: async_sessionmaker[AsyncSession],
+    read_session_factory: async_sessionmaker[AsyncSession] | None = None,
+    use_unit_of_work: bool | None = None,
+):
+    """Put a session in ``request["session"]`` for each request.
+
+    The WebApp counterpart of ``DbSessionMiddleware``: ``read_only`` routes
+    use ``read_session_factory`` when given, and with the unit of work the
+    request commits once after the route returns.
+    """
+    if use_unit_of_work is None:
+        use_unit_of_work = settings.database_unit_of_work
+
+    @web.middleware
+    async def middleware(request: web.Request, handler) -> web.StreamResponse:
+        factory = session_factory
+        if read_session_factory is not None and getattr(
+            request.match_info.handler, "read_only", False
+        ):
+            factory = read_session_factory
+        scope = unit_of_work(factory) if use_unit_of_work else factory()
+        async with scope as session:
+            request["session"] = session
+            return await handler(request)
+
+    return middleware
@@ -1,49 +1,115 @@
-import hashlib
-import hmac
 import json
-from urllib.parse import parse_qsl, unquote
 
 from aiohttp import web
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from app.services.cart import CartService
+from app.config import settings
+from app.models.views import CartLine
+from app.services.cart import CartOperation, CartProductError, CartService
+from app.services.catalog_cache import CachedBody, catalog_cache
+from app.services.checkout import CheckoutService
 from app.services.order import OrderService
 from app.services.restaurant import RestaurantService
 from app.services.user import UserService
+from app.webapp.auth import WebAppDataValidator, validate_webapp_data
+from app.webapp.middlewares import db_session_middleware, query_stats_middleware, read_only
 
+__all__ = ["create_webapp_routes", "setup_webapp", "validate_webapp_data"]
 
-def validate_webapp_data(init_data: str, bot_token: str) -> dict | None:
-    """Validate Telegram WebApp initData and return parsed data."""
-    parsed = dict(parse_qsl(init_data, keep_blank_values=True))
-    received_hash = parsed.pop("hash", None)
-    if not received_hash:
-        return None
 
-    data_check_string = "\n".join(
-        f"{k}={v}" for k, v in sorted(parsed.items())
-    )
-    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
-    calculated_hash = hmac.new(
-        secret_key, data_check_string.encode(), hashlib.sha256
-    ).hexdigest()
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
 
-    if not hmac.compare_digest(calculated_hash, received_hash):
-        return None
 
-    user_data = parsed.get("user")
-    if user_data:
-        parsed["user"] = json.loads(unquote(user_data))
-    return parsed
+MAX_CART_OPERATIONS = 100
+ORDERS_PAGE_SIZE = 20
+
 
+def _parse_cart_operations(payload) -> list[CartOperation] | None:
+    raw_operations = payload.get("operations") if isinstance(payload, dict) else None
+    if not isinstance(raw_operations, list) or len(raw_operations) > MAX_CART_OPERATIONS:
+        return None
 
-def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_token: str):
+    operations = []
+    for raw in raw_operations:
+        if not isinstance(raw, dict) or raw.get("op") not in ("add", "set", "remove"):
+            return None
+        product_id = raw.get("product_id")
+        item_id = raw.get("item_id")
+        quantity = raw.get("quantity", 1)
+        # bool is an int subclass, but true/false is never an id or a quantity.
+        values = [v for v in (product_id, item_id) if v is not None] + [quantity]
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            return None
+        if product_id is None and (raw["op"] == "add" or item_id is None):
+            return None
+        if raw["op"] == "add" and quantity <= 0:
+            return None
+        operations.append(
+            CartOperation(raw["op"], product_id=product_id, item_id=item_id, quantity=quantity)
+        )
+    return operations
+
+
+def _cart_payload(lines: list[CartLine]) -> dict:
+    return {
+        "items": [
+            {
+                "id": line.id,
+                "product_name": line.name,
+                "product_price": line.price,
+                "quantity": line.quantity,
+                "subtotal": line.subtotal,
+            }
+            for line in lines
+        ],
+        "total": sum(line.subtotal for line in lines),
+    }
+
+
+def _catalog_response(request: web.Request, cached: CachedBody) -> web.Response:
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and _etag_matches(if_none_match, cached.etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=cached.body, content_type="application/json", headers=headers)
+
+
+def setup_webapp(
+    app: web.Application,
+    session_factory: async_sessionmaker[AsyncSession],
+    bot_token: str,
+    read_session_factory: async_sessionmaker[AsyncSession] | None = None,
+    query_budget: int | None = None,
+) -> None:
+    """Install the WebApp routes and their query-counting and session middlewares on ``app``.
+
+    Catalog and order-history reads use ``read_session_factory`` when given;
+    everything else goes to ``session_factory``.
+    """
+    app.middlewares.append(query_stats_middleware(query_budget))
+    app.middlewares.append(db_session_middleware(session_factory, read_session_factory))
+    app.router.add_routes(create_webapp_routes(bot_token))
+
+
+def create_webapp_routes(bot_token: str):
+    """Build the WebApp API routes; they expect ``db_session_middleware``."""
     routes = web.RouteTableDef()
+    validator = WebAppDataValidator(
+        bot_token,
+        max_age=settings.webapp_auth_max_age,
+        cache_size=settings.webapp_auth_cache_size,
+    )
 
     def _get_user_id(request: web.Request) -> int | None:
         init_data = request.headers.get("X-Telegram-Init-Data", "")
         if not init_data:
             return None
-        parsed = validate_webapp_data(init_data, bot_token)
+        parsed = validator.validate(init_data)
         if parsed and "user" in parsed:
             return parsed["user"].get("id")
         return None
@@ -52,12 +118,13 @@ def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_
     async def health(request: web.Request) -> web.Response:
         return web.json_response({"status": "ok"})
 
-    @routes.get("/api/restaurants")
-    async def get_restaurants(request: web.Request) -> web.Response:
-        async with session_factory() as session:
+    async def _restaurants_body(session: AsyncSession) -> CachedBody:
+        cached = catalog_cache.get_restaurants()
+        if cached is None:
+            version = catalog_cache.version
             service = RestaurantService(session)
-            restaurants = await service.get_all_active()
-            return web.json_response([
+            restaurants = await service.get_restaurant_views()
+            body = json.dumps([
                 {
                     "id": r.id,
                     "name": r.name,
@@ -66,15 +133,70 @@ def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_
                     "image_url": r.image_url,
                 }
                 for r in restaurants
-            ])
+            ]).encode()
+            cached = catalog_cache.set_restaurants(body, version)
+        return cached
+
+    @routes.get("/api/restaurants")
+    @read_only
+    async def get_restaurants(request: web.Request) -> web.Response:
+        cached = catalog_cache.get_restaurants()
+        if cached is None:
+            cached = await _restaurants_body(request["session"])
+        return _catalog_response(request, cached)
+
+    @routes.get("/api/bootstrap")
+    async def bootstrap(request: web.Request) -> web.Response:
+        """Restaurants with their ETag, cart and active orders for the Mini App's first screen."""
+        telegram_id = _get_user_id(request)
+        cart: dict = {"items": [], "total": 0}
+        orders: list[dict] = []
+
+        session = request["session"]
+        restaurants = await _restaurants_body(session)
+        user = None
+        if telegram_id:
+            user = await UserService(session).get_by_telegram_id(telegram_id)
+        if user:
+            cart = _cart_payload(await CartService(session).get_lines(user.id))
+            active_orders = await OrderService(session).get_active_summaries(user.id)
+            orders = [
+                {
+                    "id": o.id,
+                    "status": o.status.value,
+                    "total": o.total,
+                    "total_display": o.total_display,
+                    "created_at": o.created_at.isoformat(),
+                }
+                for o in active_orders
+            ]
+
+        # The client files the restaurant list under this ETag, so its next
+        # GET /api/restaurants revalidates instead of downloading it again.
+        body = b"".join((
+            b'{"restaurants": ',
+            restaurants.body,
+            b', "restaurants_etag": ',
+            json.dumps(restaurants.etag).encode(),
+            b', "cart": ',
+            json.dumps(cart).encode(),
+            b', "orders": ',
+            json.dumps(orders).encode(),
+            b"}",
+        ))
+        return web.Response(body=body, content_type="application/json")
 
     @routes.get("/api/restaurants/{restaurant_id}/menu")
+    @read_only
     async def get_menu(request: web.Request) -> web.Response:
         restaurant_id = int(request.match_info["restaurant_id"])
-        async with session_factory() as session:
+        cached = catalog_cache.get_menu(restaurant_id)
+        if cached is None:
+            version = catalog_cache.version
+            session = request["session"]
             service = RestaurantService(session)
-            categories = await service.get_menu(restaurant_id)
-            return web.json_response([
+            categories = await service.get_menu_views(restaurant_id)
+            body = json.dumps([
                 {
                     "id": cat.id,
                     "name": cat.name,
@@ -92,7 +214,9 @@ def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_
                     ],
                 }
                 for cat in categories
-            ])
+            ]).encode()
+            cached = catalog_cache.set_menu(restaurant_id, body, version)
+        return _catalog_response(request, cached)
 
     @routes.post("/api/cart/add")
     async def add_to_cart(request: web.Request) -> web.Response:
@@ -106,20 +230,52 @@ def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_
 
         if not product_id:
             return web.json_response({"error": "product_id required"}, status=400)
+        if not all(isinstance(v, int) and not isinstance(v, bool) for v in (product_id, quantity)):
+            return web.json_response({"error": "invalid product_id or quantity"}, status=400)
 
-        async with session_factory() as session:
-            user_service = UserService(session)
-            user = await user_service.get_by_telegram_id(telegram_id)
-            if not user:
-                return web.json_response({"error": "User not found"}, status=404)
+        session = request["session"]
+        user_service = UserService(session)
+        user = await user_service.get_by_telegram_id(telegram_id)
+        if not user:
+            return web.json_response({"error": "User not found"}, status=404)
 
-            cart_service = CartService(session)
+        cart_service = CartService(session)
+        try:
             item = await cart_service.add_item(user.id, product_id, quantity)
-            return web.json_response({
-                "id": item.id,
-                "product_id": item.product_id,
-                "quantity": item.quantity,
-            })
+        except CartProductError as exc:
+            if exc.missing:
+                return web.json_response({"error": "Product not found"}, status=404)
+            return web.json_response({"error": "Product unavailable"}, status=400)
+        return web.json_response({
+            "id": item.id,
+            "product_id": item.product_id,
+            "quantity": item.quantity,
+        })
+
+    @routes.post("/api/cart/batch")
+    async def batch_cart(request: web.Request) -> web.Response:
+        telegram_id = _get_user_id(request)
+        if not telegram_id:
+            return web.json_response({"error": "Unauthorized"}, status=401)
+
+        operations = _parse_cart_operations(await request.json())
+        if operations is None:
+            return web.json_response({"error": "invalid operations"}, status=400)
+
+        session = request["session"]
+        user_service = UserService(session)
+        user = await user_service.get_by_telegram_id(telegram_id)
+        if not user:
+            return web.json_response({"error": "User not found"}, status=404)
+
+        cart_service = CartService(session)
+        try:
+            lines = await cart_service.apply_batch(user.id, operations)
+        except CartProductError as exc:
+            if exc.missing:
+                return web.json_response({"error": "Product not found"}, status=404)
+            return web.json_response({"error": "Product unavailable"}, status=400)
+        return web.json_response(_cart_payload(lines))
 
     @routes.get("/api/cart")
     async def get_cart(request: web.Request) -> web.Response:
@@ -127,29 +283,15 @@ def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_
         if not telegram_id:
             return web.json_response({"error": "Unauthorized"}, status=401)
 
-        async with session_factory() as session:
-            user_service = UserService(session)
-            user = await user_service.get_by_telegram_id(telegram_id)
-            if not user:
-                return web.json_response({"error": "User not found"}, status=404)
-
-            cart_service = CartService(session)
-            items = await cart_service.get_items(user.id)
-            total = sum(item.subtotal for item in items)
-
-            return web.json_response({
-                "items": [
-                    {
-                        "id": item.id,
-                        "product_name": item.product.name,
-                        "product_price": item.product.price,
-                        "quantity": item.quantity,
-                        "subtotal": item.subtotal,
-                    }
-                    for item in items
-                ],
-                "total": total,
-            })
+        session = request["session"]
+        user_service = UserService(session)
+        user = await user_service.get_by_telegram_id(telegram_id)
+        if not user:
+            return web.json_response({"error": "User not found"}, status=404)
+
+        cart_service = CartService(session)
+        lines = await cart_service.get_lines(user.id)
+        return web.json_response(_cart_payload(lines))
 
     @routes.delete("/api/cart/{item_id}")
     async def remove_from_cart(request: web.Request) -> web.Response:
@@ -158,12 +300,12 @@ def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_
             return web.json_response({"error": "Unauthorized"}, status=401)
 
         item_id = int(request.match_info["item_id"])
-        async with session_factory() as session:
-            cart_service = CartService(session)
-            removed = await cart_service.remove_item(item_id)
-            if removed:
-                return web.json_response({"ok": True})
-            return web.json_response({"error": "Item not found"}, status=404)
+        session = request["session"]
+        cart_service = CartService(session)
+        removed = await cart_service.remove_item(item_id)
+        if removed:
+            return web.json_response({"ok": True})
+        return web.json_response({"error": "Item not found"}, status=404)
 
     @routes.post("/api/orders")
     async def create_order(request: web.Request) -> web.Response:
@@ -178,54 +320,52 @@ def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_
         if not address or not phone:
             return web.json_response({"error": "address and phone required"}, status=400)
 
-        async with session_factory() as session:
-            user_service = UserService(session)
-            user = await user_service.get_by_telegram_id(telegram_id)
-            if not user:
-                return web.json_response({"error": "User not found"}, status=404)
-
-            cart_service = CartService(session)
-            items = await cart_service.get_items(user.id)
-            if not items:
-                return web.json_response({"error": "Cart is empty"}, status=400)
-
-            restaurant_id = items[0].product.category.restaurant_id
-
-            order_service = OrderService(session)
-            order = await order_service.create_from_cart(
-                user_id=user.id,
-                restaurant_id=restaurant_id,
-                cart_items=items,
-                delivery_address=address,
-                phone=phone,
-                comment=data.get("comment"),
-            )
-            await cart_service.clear(user.id)
-
-            await user_service.update_contact(telegram_id, phone, address)
-
-            return web.json_response({
-                "id": order.id,
-                "status": order.status.value,
-                "total": order.total,
-            })
+        session = request["session"]
+        user_service = UserService(session)
+        user = await user_service.get_by_telegram_id(telegram_id)
+        if not user:
+            return web.json_response({"error": "User not found"}, status=404)
+
+        checkout_service = CheckoutService(session)
+        order = await checkout_service.checkout(
+            user_id=user.id,
+            delivery_address=address,
+            phone=phone,
+            comment=data.get("comment"),
+        )
+        if not order:
+            return web.json_response({"error": "Cart is empty"}, status=400)
+
+        return web.json_response({
+            "id": order.id,
+            "status": order.status.value,
+            "total": order.total,
+        })
 
     @routes.get("/api/orders")
+    @read_only
     async def get_orders(request: web.Request) -> web.Response:
         telegram_id = _get_user_id(request)
         if not telegram_id:
             return web.json_response({"error": "Unauthorized"}, status=401)
 
-        async with session_factory() as session:
-            user_service = UserService(session)
-            user = await user_service.get_by_telegram_id(telegram_id)
-            if not user:
-                return web.json_response({"error": "User not found"}, status=404)
+        session = request["session"]
+        user_service = UserService(session)
+        user = await user_service.get_by_telegram_id(telegram_id)
+        if not user:
+            return web.json_response({"error": "User not found"}, status=404)
 
-            order_service = OrderService(session)
-            orders = await order_service.get_user_orders(user.id)
+        order_service = OrderService(session)
+        try:
+            summaries, next_cursor = await order_service.get_order_summaries(
+                user.id, limit=ORDERS_PAGE_SIZE, cursor=request.query.get("cursor")
+            )
+        except ValueError:
+            return web.json_response({"error": "invalid cursor"}, status=400)
+        lines = await order_service.get_order_lines([o.id for o in summaries])
 
-            return web.json_response([
+        return web.json_response({
+            "orders": [
                 {
                     "id": o.id,
                     "status": o.status.value,
@@ -235,15 +375,17 @@ def create_webapp_routes(session_factory: async_sessionmaker[AsyncSession], bot_
                     "created_at": o.created_at.isoformat(),
                     "items": [
                         {
-                            "name": item.product.name,
-                            "quantity": item.quantity,
-                            "price": item.price,
+                            "name": line.name,
+                            "quantity": line.quantity,
+                            "price": line.price,
                         }
-                        for item in o.items
+                        for line in lines[o.id]
                     ],
                 }
-                for o in orders
-            ])
+                for o in summaries
+            ],
+            "next_cursor": next_cursor,
+        })
 
     @routes.get("/webapp")
     async def webapp_page(request: web.Request) -> web.Response:
@@ -11,12 +11,34 @@ const headers = {
 let currentView = 'restaurants';
 
 // --- API helpers ---
+// GET responses carrying an ETag are kept here so repeat requests
+// revalidate with If-None-Match and reuse the body on 304.
+const validators = new Map();
+
 async function api(path, options = {}) {
+    const method = (options.method || 'GET').toUpperCase();
+    const cached = method === 'GET' ? validators.get(path) : undefined;
     const resp = await fetch(API_BASE + path, {
-        headers,
+        headers: cached ? { ...headers, 'If-None-Match': cached.etag } : headers,
+        cache: 'no-store',
         ...options,
     });
-    return resp.json();
+    if (resp.status === 304 && cached) {
+        return cached.data;
+    }
+    const data = await resp.json();
+    // Error bodies keep the HTTP status, so callers can tell a rejected
+    // request (4xx) from a server failure (5xx).
+    if (!resp.ok && data && typeof data === 'object') data.status = resp.status;
+    const etag = resp.headers.get('ETag');
+    if (method === 'GET' && resp.ok && etag) {
+        rememberValidator(path, etag, data);
+    }
+    return data;
+}
+
+function rememberValidator(path, etag, data) {
+    validators.set(path, { etag, data });
 }
 
 // --- Views ---
@@ -33,7 +55,10 @@ function showView(viewId) {
 // --- Restaurants ---
 async function showRestaurants() {
     showView('restaurants');
-    const restaurants = await api('/api/restaurants');
+    renderRestaurants(await api('/api/restaurants'));
+}
+
+function renderRestaurants(restaurants) {
     const list = document.getElementById('restaurants-list');
 
     if (!restaurants.length) {
@@ -87,18 +112,75 @@ async function showMenu(restaurantId, name, desc) {
 }
 
 // --- Cart ---
-async function addToCart(productId) {
-    await api('/api/cart/add', {
-        method: 'POST',
-        body: JSON.stringify({ product_id: productId, quantity: 1 }),
-    });
+// Rapid taps are coalesced per product and sent as one /api/cart/batch call.
+const CART_FLUSH_DELAY_MS = 300;
+let pendingAdds = new Map();
+let cartFlushTimer = null;
+
+function addToCart(productId) {
+    pendingAdds.set(productId, (pendingAdds.get(productId) || 0) + 1);
     tg.HapticFeedback.impactOccurred('light');
-    await updateCartBadge();
+    clearTimeout(cartFlushTimer);
+    cartFlushTimer = setTimeout(flushCart, CART_FLUSH_DELAY_MS);
+}
+
+async function flushCart(extraOperations = []) {
+    clearTimeout(cartFlushTimer);
+    cartFlushTimer = null;
+    // Taps made while the request is in flight collect in a fresh map. The
+    // sent ones are merged back if the request failed in transit or on the
+    // server; taps the server rejected (4xx) are dropped.
+    const sent = pendingAdds;
+    const operations = [...sent].map(([productId, quantity]) => (
+        { op: 'add', product_id: productId, quantity }
+    )).concat(extraOperations);
+    if (!operations.length) return null;
+    pendingAdds = new Map();
+
+    let cart;
+    try {
+        cart = await api('/api/cart/batch', {
+            method: 'POST',
+            body: JSON.stringify({ operations }),
+        });
+    } catch (e) {
+        cart = { error: 'Could not update the cart, please try again.' };
+    }
+    if (cart.error) {
+        if (!cart.status || cart.status >= 500) {
+            for (const [productId, quantity] of sent) {
+                pendingAdds.set(productId, (pendingAdds.get(productId) || 0) + quantity);
+            }
+        } else {
+            await refreshCart();
+        }
+        tg.showAlert(cart.error);
+        return cart;
+    }
+    renderCartBadge(cart);
+    return cart;
+}
+
+// Show the server's cart after it rejected a change.
+async function refreshCart() {
+    try {
+        const cart = await api('/api/cart');
+        if (cart.error) return;
+        renderCartBadge(cart);
+        if (currentView === 'cart') renderCart(cart);
+    } catch (e) {
+        // the next flush or visit to the cart tries again
+    }
 }
 
 async function showCart() {
     showView('cart');
-    const data = await api('/api/cart');
+    let data = await flushCart();
+    if (!data || data.error) data = await api('/api/cart');
+    renderCart(data);
+}
+
+function renderCart(data) {
     const list = document.getElementById('cart-items');
     const totalEl = document.getElementById('cart-total');
     const formEl = document.getElementById('checkout-form');
@@ -125,23 +207,25 @@ async function showCart() {
 }
 
 async function removeFromCart(itemId) {
-    await api(`/api/cart/${itemId}`, { method: 'DELETE' });
-    await showCart();
-    await updateCartBadge();
+    const cart = await flushCart([{ op: 'remove', item_id: itemId }]);
+    if (cart && !cart.error) renderCart(cart);
 }
 
 async function updateCartBadge() {
     try {
-        const data = await api('/api/cart');
-        const badge = document.getElementById('cart-badge');
-        const count = data.items ? data.items.reduce((sum, i) => sum + i.quantity, 0) : 0;
-        badge.textContent = count;
-        badge.style.display = count > 0 ? 'inline' : 'none';
+        renderCartBadge(await api('/api/cart'));
     } catch (e) {
         // ignore auth errors for badge
     }
 }
 
+function renderCartBadge(cart) {
+    const badge = document.getElementById('cart-badge');
+    const count = cart.items ? cart.items.reduce((sum, i) => sum + i.quantity, 0) : 0;
+    badge.textContent = count;
+    badge.style.display = count > 0 ? 'inline' : 'none';
+}
+
 // --- Orders ---
 async function placeOrder() {
     const address = document.getElementById('address-input').value.trim();
@@ -153,6 +237,8 @@ async function placeOrder() {
         return;
     }
 
+    const cart = await flushCart();
+    if (cart && cart.error) return;
     const result = await api('/api/orders', {
         method: 'POST',
         body: JSON.stringify({ address, phone, comment: comment || null }),
@@ -171,27 +257,46 @@ async function placeOrder() {
 
 async function showOrders() {
     showView('orders');
-    const orders = await api('/api/orders');
+    document.getElementById('orders-list').innerHTML = '';
+    await loadOrders(null);
+}
+
+async function loadOrders(cursor) {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const page = await api('/api/orders' + query);
     const list = document.getElementById('orders-list');
+    const more = document.getElementById('orders-more');
+    if (more) more.remove();
 
-    if (!orders.length) {
+    if (!cursor && !page.orders.length) {
         list.innerHTML = '<div class="empty-state"><p>No orders yet</p></div>';
         return;
     }
 
-    list.innerHTML = orders.map(o => `
+    list.insertAdjacentHTML('beforeend', page.orders.map(o => `
         <div class="order-card">
             <div class="card-row">
                 <div class="card-title">Order #${o.id}</div>
                 <span class="order-status status-${o.status}">${o.status}</span>
             </div>
-            <div class="card-subtitle" style="margin-top:6px">${o.address}</div>
+            <div class="card-subtitle" style="margin-top:6px">${escapeHtml(o.address)}</div>
             <div style="margin-top:8px">
                 ${o.items.map(i => `<div class="card-subtitle">${escapeHtml(i.name)} x${i.quantity}</div>`).join('')}
             </div>
             <div class="card-price">${o.total_display} $</div>
         </div>
-    `).join('');
+    `).join(''));
+
+    if (page.next_cursor) {
+        list.insertAdjacentHTML('beforeend',
+            `<button id="orders-more" class="btn" onclick="loadOrders('${page.next_cursor}')">Load more</button>`);
+    }
+}
+
+function renderOrdersBadge(activeOrders) {
+    const badge = document.getElementById('orders-badge');
+    badge.textContent = activeOrders.length;
+    badge.style.display = activeOrders.length > 0 ? 'inline' : 'none';
 }
 
 // --- Helpers ---
@@ -202,5 +307,17 @@ function escapeHtml(str) {
 }
 
 // --- Init ---
-showRestaurants();
-updateCartBadge();
+// One request for everything the first screen needs.
+async function bootstrap() {
+    showView('restaurants');
+    const data = await api('/api/bootstrap');
+    // Later visits to the list revalidate it like any other catalog GET.
+    if (data.restaurants_etag) {
+        rememberValidator('/api/restaurants', data.restaurants_etag, data.restaurants);
+    }
+    renderRestaurants(data.restaurants);
+    renderCartBadge(data.cart);
+    renderOrdersBadge(data.orders);
+}
+
+bootstrap();
@@ -0,0 +1,104 @@
+"""Checkout throughput against a file-backed SQLite database.
+
+Compares the previous four-commit flow (get_items, create_from_cart, clear,
+update_contact) with the single-transaction CheckoutService.
+
+Run with ``python -m benchmarks.checkout``.
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.models.base import Base
+from app.models.category import Category
+from app.models.product import Product
+from app.models.restaurant import Restaurant
+from app.models.user import User
+from app.services.cart import CartService
+from app.services.checkout import CheckoutService
+from app.services.order import OrderService
+from app.services.user import UserService
+
+ORDERS = 300
+ITEMS_PER_ORDER = 3
+
+
+async def seed(factory) -> tuple[int, list[int], list[tuple[int, int]]]:
+    async with factory() as session:
+        restaurant = Restaurant(name="Bench", is_active=True)
+        session.add(restaurant)
+        await session.flush()
+        category = Category(name="Mains", restaurant_id=restaurant.id)
+        session.add(category)
+        await session.flush()
+        products = [
+            Product(name=f"Dish {i}", price=500 + i, category_id=category.id)
+            for i in range(ITEMS_PER_ORDER)
+        ]
+        users = [User(telegram_id=1000 + i, first_name="Bench") for i in range(ORDERS)]
+        session.add_all(products + users)
+        await session.commit()
+        return restaurant.id, [p.id for p in products], [(u.id, u.telegram_id) for u in users]
+
+
+async def fill_carts(factory, users: list[tuple[int, int]], product_ids: list[int]) -> None:
+    async with factory() as session:
+        cart_service = CartService(session)
+        for user_id, _ in users:
+            for product_id in product_ids:
+                await cart_service.add_item(user_id, product_id, 2)
+
+
+async def legacy_checkout(
+    session: AsyncSession, user_id: int, telegram_id: int, restaurant_id: int
+) -> None:
+    user_service = UserService(session)
+    cart_service = CartService(session)
+    items = await cart_service.get_items(user_id)
+    await OrderService(session).create_from_cart(
+        user_id=user_id,
+        restaurant_id=restaurant_id,
+        cart_items=items,
+        delivery_address="1 Bench St",
+        phone="+100",
+    )
+    await cart_service.clear(user_id)
+    await user_service.update_contact(telegram_id, "+100", "1 Bench St")
+
+
+async def service_checkout(
+    session: AsyncSession, user_id: int, telegram_id: int, restaurant_id: int
+) -> None:
+    await CheckoutService(session).checkout(user_id, "1 Bench St", "+100")
+
+
+async def run(name: str, checkout) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        restaurant_id, product_ids, users = await seed(factory)
+        await fill_carts(factory, users, product_ids)
+
+        started = time.perf_counter()
+        for user_id, telegram_id in users:
+            async with factory() as session:
+                await checkout(session, user_id, telegram_id, restaurant_id)
+        elapsed = time.perf_counter() - started
+        await engine.dispose()
+
+    print(f"{name:<28} {ORDERS / elapsed:8.1f} orders/sec")
+
+
+async def main() -> None:
+    await run("legacy four-commit flow", legacy_checkout)
+    await run("CheckoutService", service_checkout)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""Per-update FSM overhead, ``MemoryStorage`` vs ``DatabaseStorage``.
+
+Feeds checkout-style updates through a dispatcher. Each update reads the
+chat's state, calls ``update_data`` twice and moves to the next state,
+across ``CHATS`` chats. The database storage runs on a SQLite file with
+the app's pragma profile, without write coalescing, with it (as
+``create_dispatcher`` sets it up), and with the read cache on top. Reports
+the time and SQL queries per update.
+
+Run with ``python -m benchmarks.fsm_storage``.
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, Update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.bot import create_dispatcher
+from app.config import Settings
+from app.fsm_storage import DatabaseStorage
+from app.handlers.cart import CheckoutState
+from app.models.base import Base
+from database.engine import create_engine
+from database.instrumentation import instrument_query_counter, track_queries
+
+CHATS = 50
+UPDATES = 2000
+
+
+def make_updates() -> list[Update]:
+    return [
+        Update.model_validate(
+            {
+                "update_id": i,
+                "message": {
+                    "message_id": i,
+                    "date": 0,
+                    "chat": {"id": i % CHATS + 1, "type": "private"},
+                    "from": {"id": i % CHATS + 1, "is_bot": False, "first_name": "Bench"},
+                    "text": str(i),
+                },
+            }
+        )
+        for i in range(UPDATES)
+    ]
+
+
+def checkout_router() -> Router:
+    router = Router()
+
+    @router.message()
+    async def step(message: Message, state: FSMContext) -> None:
+        current = await state.get_state()
+        await state.update_data(address="Main st", step=message.text)
+        await state.update_data(phone="+1")
+        next_state = CheckoutState.phone if current == CheckoutState.address.state else None
+        await state.set_state(next_state or CheckoutState.address)
+
+    return router
+
+
+async def run(name: str, dp: Dispatcher, updates: list[Update]) -> None:
+    dp.include_router(checkout_router())
+    bot = Bot(token="123456:BENCH")
+    with track_queries(name) as stats:
+        started = time.perf_counter()
+        for update in updates:
+            await dp.feed_update(bot, update)
+        elapsed = time.perf_counter() - started
+    print(
+        f"{name:<24} {elapsed / len(updates) * 1e6:8.1f} us/update"
+        f"  {stats.queries / len(updates):4.1f} queries/update"
+    )
+
+
+async def main() -> None:
+    updates = make_updates()
+    config = Settings(update_concurrency=0)
+    print(f"{UPDATES} checkout updates across {CHATS} chats")
+    await run("MemoryStorage", Dispatcher(storage=MemoryStorage()), updates)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        instrument_query_counter(engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        variants = (
+            ("database, uncoalesced", lambda s: Dispatcher(storage=s), 0),
+            ("database, coalesced", lambda s: create_dispatcher(config, storage=s), 0),
+            ("database, coalesced+cache", lambda s: create_dispatcher(config, storage=s), 1024),
+        )
+        for name, make_dp, cache_size in variants:
+            storage = DatabaseStorage(factory, ttl=3600, cache_size=cache_size)
+            await run(name, make_dp(storage), updates)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""Memory and latency of a full menu read, ORM entities vs read models.
+
+Loads one restaurant's menu through ``RestaurantService.get_menu`` (ORM
+entities with the ``menu`` loader profile, held in the session's identity
+map) and through ``get_menu_views`` (slotted dataclasses built from one
+joined Core query), and reports the traced peak allocation, the memory
+still held while the result is alive, and the time per read.
+
+Run with ``python -m benchmarks.read_models``.
+"""
+import asyncio
+import gc
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.models.base import Base
+from app.models.category import Category
+from app.models.product import Product
+from app.models.restaurant import Restaurant
+from app.services.restaurant import RestaurantService
+
+CATEGORIES = 20
+PRODUCTS_PER_CATEGORY = 100
+ROUNDS = 20
+
+
+async def seed(factory) -> int:
+    async with factory() as session:
+        restaurant = Restaurant(name="Bench", is_active=True)
+        session.add(restaurant)
+        await session.flush()
+        categories = [
+            Category(name=f"Category {i}", restaurant_id=restaurant.id)
+            for i in range(CATEGORIES)
+        ]
+        session.add_all(categories)
+        await session.flush()
+        session.add_all(
+            Product(
+                name=f"Dish {c.id}-{i}",
+                description="A reasonably long description of the dish " * 2,
+                price=500 + i,
+                category_id=c.id,
+            )
+            for c in categories
+            for i in range(PRODUCTS_PER_CATEGORY)
+        )
+        await session.commit()
+        return restaurant.id
+
+
+async def orm_menu(session: AsyncSession, restaurant_id: int):
+    return await RestaurantService(session).get_menu(restaurant_id)
+
+
+async def view_menu(session: AsyncSession, restaurant_id: int):
+    return await RestaurantService(session).get_menu_views(restaurant_id)
+
+
+async def measure(factory, restaurant_id: int, read) -> tuple[int, int, float]:
+    # Warm up statement compilation so it is not counted as menu memory.
+    async with factory() as session:
+        await read(session, restaurant_id)
+
+    gc.collect()
+    tracemalloc.start()
+    async with factory() as session:
+        menu = await read(session, restaurant_id)
+        held, peak = tracemalloc.get_traced_memory()
+        del menu
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        async with factory() as session:
+            await read(session, restaurant_id)
+    elapsed = (time.perf_counter() - started) / ROUNDS
+    return peak, held, elapsed
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        restaurant_id = await seed(factory)
+
+        products = CATEGORIES * PRODUCTS_PER_CATEGORY
+        print(f"menu of {CATEGORIES} categories, {products} products")
+        for name, read in (("ORM entities", orm_menu), ("read models", view_menu)):
+            peak, held, elapsed = await measure(factory, restaurant_id, read)
+            print(
+                f"{name:<14} peak {peak / 1024:8.1f} KiB  held {held / 1024:8.1f} KiB"
+                f"  {elapsed * 1000:6.1f} ms/read"
+            )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""Concurrent CartService.add_item throughput on file-backed SQLite.
+
+Compares SQLite's defaults (rollback journal, FULL sync) with the pragma
+profile that ``database.engine.create_engine`` applies from ``Settings``,
+and the same profile with writes group-committed by a ``WriteCoordinator``.
+
+Run with ``python -m benchmarks.sqlite_writes``.
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.models.base import Base
+from app.models.category import Category
+from app.models.product import Product
+from app.models.restaurant import Restaurant
+from app.models.user import User
+from app.services.cart import CartService
+from database.engine import (
+    create_engine,
+    create_session_factory,
+    create_write_coordinator,
+    create_writer_engine,
+)
+
+WORKERS = 20
+ADDS_PER_WORKER = 50
+
+
+async def seed(factory) -> tuple[list[int], list[int]]:
+    async with factory() as session:
+        restaurant = Restaurant(name="Bench", is_active=True)
+        session.add(restaurant)
+        await session.flush()
+        category = Category(name="Mains", restaurant_id=restaurant.id)
+        session.add(category)
+        await session.flush()
+        products = [Product(name=f"Dish {i}", price=100, category_id=category.id) for i in range(5)]
+        users = [User(telegram_id=1000 + i, first_name="Bench") for i in range(WORKERS)]
+        session.add_all(products + users)
+        await session.commit()
+        return [u.id for u in users], [p.id for p in products]
+
+
+async def run(name: str, engine, writer_engine=None) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    coordinator = None
+    if writer_engine is not None:
+        coordinator = create_write_coordinator(writer_engine)
+        coordinator.start()
+        factory = create_session_factory(engine, coordinator)
+    else:
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    user_ids, product_ids = await seed(factory)
+    errors = 0
+
+    async def worker(user_id: int) -> None:
+        nonlocal errors
+        for i in range(ADDS_PER_WORKER):
+            async with factory() as session:
+                try:
+                    await CartService(session).add_item(user_id, product_ids[i % len(product_ids)])
+                except OperationalError:
+                    errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(user_id) for user_id in user_ids))
+    elapsed = time.perf_counter() - started
+    if coordinator is not None:
+        await coordinator.close()
+    await engine.dispose()
+
+    done = WORKERS * ADDS_PER_WORKER - errors
+    print(f"{name:<22} {done / elapsed:8.1f} adds/sec  ({errors} 'database is locked' errors)")
+    if coordinator is not None:
+        print(f"{'':<22} {coordinator.units / coordinator.batches:8.1f} writes per commit")
+
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        default_url = f"sqlite+aiosqlite:///{Path(tmp) / 'default.db'}"
+        await run("SQLite defaults", create_async_engine(default_url))
+        tuned_url = f"sqlite+aiosqlite:///{Path(tmp) / 'tuned.db'}"
+        await run("pragma profile", create_engine(tuned_url))
+        grouped_url = f"sqlite+aiosqlite:///{Path(tmp) / 'grouped.db'}"
+        await run(
+            "group commit", create_engine(grouped_url), create_writer_engine(grouped_url)
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
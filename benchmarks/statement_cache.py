@@ -0,0 +1,71 @@
+"""Hot user lookup with a statement rebuilt per call vs a prebuilt one.
+
+Both variants hit SQLAlchemy's compiled cache. The prebuilt statement also
+skips constructing the select and recomputing its cache key each call.
+Reports lookups per second and each run's compiled cache hit ratio.
+
+Run with ``python -m benchmarks.statement_cache``.
+"""
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.base import Base
+from app.models.user import User
+from app.services.loaders import SUMMARY, loader_options
+from app.services.user import UserService
+from database.engine import create_engine
+from database.instrumentation import statement_cache_stats
+
+USERS = 200
+LOOKUPS = 5000
+
+
+async def rebuilt_lookup(session: AsyncSession, telegram_id: int) -> User | None:
+    stmt = (
+        select(User)
+        .where(User.telegram_id == telegram_id)
+        .options(*loader_options(User, SUMMARY))
+    )
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
+async def prebuilt_lookup(session: AsyncSession, telegram_id: int) -> User | None:
+    return await UserService(session).get_by_telegram_id(telegram_id)
+
+
+async def run(name: str, lookup) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as session:
+            session.add_all(
+                User(telegram_id=1000 + i, first_name="Bench") for i in range(USERS)
+            )
+            await session.commit()
+
+        stats = statement_cache_stats(engine)
+        stats.reset()
+        async with factory() as session:
+            started = time.perf_counter()
+            for i in range(LOOKUPS):
+                await lookup(session, 1000 + i % USERS)
+            elapsed = time.perf_counter() - started
+        await engine.dispose()
+
+    print(f"{name:<22} {LOOKUPS / elapsed:8.1f} lookups/sec  {stats}")
+
+
+async def main() -> None:
+    await run("rebuilt per call", rebuilt_lookup)
+    await run("prebuilt statement", prebuilt_lookup)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
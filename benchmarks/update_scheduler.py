@@ -0,0 +1,105 @@
+"""Synthetic update load through the dispatcher, unscheduled vs scheduled.
+
+Feeds bursts of message updates from many chats the way polling does (one
+task per update) into a plain ``Dispatcher`` and a ``ScheduledDispatcher``.
+The handler holds one of ``POOL`` connections for a few milliseconds, like
+a handler doing one database round trip. Reports throughput, p50/p99
+latency from arrival to handled, how many updates started while another
+update from the same chat was still running, and the scheduler's counters.
+
+Run with ``python -m benchmarks.update_scheduler``.
+"""
+import asyncio
+import random
+import statistics
+import time
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message, Update
+
+from app.scheduler import ScheduledDispatcher, UpdateScheduler
+
+CHATS = 200
+UPDATES = 4000
+POOL = 15
+WORK_MS = 2
+CONCURRENCY = 10
+
+
+def make_updates() -> list[Update]:
+    rng = random.Random(42)
+    updates = []
+    for i in range(UPDATES):
+        chat_id = rng.randrange(CHATS) + 1
+        updates.append(
+            Update.model_validate(
+                {
+                    "update_id": i,
+                    "message": {
+                        "message_id": i,
+                        "date": 0,
+                        "chat": {"id": chat_id, "type": "private"},
+                        "from": {"id": chat_id, "is_bot": False, "first_name": "Bench"},
+                        "text": str(i),
+                    },
+                }
+            )
+        )
+    return updates
+
+
+async def run(name: str, dp: Dispatcher, updates: list[Update]) -> None:
+    pool = asyncio.Semaphore(POOL)
+    busy_chats: set[int] = set()
+    overlapped = 0
+    router = Router()
+
+    @router.message()
+    async def handle(message: Message) -> None:
+        nonlocal overlapped
+        chat_id = message.chat.id
+        if chat_id in busy_chats:
+            overlapped += 1
+        busy_chats.add(chat_id)
+        try:
+            async with pool:
+                await asyncio.sleep(WORK_MS / 1000)
+        finally:
+            busy_chats.discard(chat_id)
+
+    dp.include_router(router)
+    bot = Bot(token="123456:BENCH")
+    latencies: list[float] = []
+
+    async def feed(update: Update) -> None:
+        arrived = time.perf_counter()
+        await dp.feed_update(bot, update)
+        latencies.append(time.perf_counter() - arrived)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(feed(update) for update in updates))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:<22} {len(updates) / elapsed:8.1f} updates/sec"
+        f"  p50 {quantiles[49] * 1000:7.1f} ms  p99 {quantiles[98] * 1000:7.1f} ms"
+        f"  same-chat overlaps {overlapped}"
+    )
+    if isinstance(dp, ScheduledDispatcher):
+        print(f"{'':<22} {dp.scheduler.stats}")
+
+
+async def main() -> None:
+    updates = make_updates()
+    print(f"{UPDATES} updates from {CHATS} chats, {WORK_MS} ms of work on a pool of {POOL}")
+    await run("unscheduled", Dispatcher(), updates)
+    await run(
+        f"scheduled ({CONCURRENCY} slots)",
+        ScheduledDispatcher(scheduler=UpdateScheduler(CONCURRENCY)),
+        updates,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+"""Per-request cost of WebApp initData validation, with and without the cache.
+
+Run with ``python -m benchmarks.webapp_auth``.
+"""
+import hashlib
+import hmac
+import json
+import time
+import timeit
+from urllib.parse import urlencode
+
+from app.webapp.auth import WebAppDataValidator, validate_webapp_data
+
+BOT_TOKEN = "123456:benchmark-token"
+ROUNDS = 50_000
+
+
+def make_init_data(telegram_id: int) -> str:
+    fields = {
+        "auth_date": str(int(time.time())),
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps({
+            "id": telegram_id,
+            "first_name": "Bench",
+            "last_name": "User",
+            "username": "bench_user",
+            "language_code": "en",
+        }),
+    }
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def main() -> None:
+    init_data = make_init_data(100500)
+    validator = WebAppDataValidator(BOT_TOKEN)
+    uncached = WebAppDataValidator(BOT_TOKEN, cache_size=0)
+
+    cases = {
+        "validate_webapp_data (baseline)": lambda: validate_webapp_data(init_data, BOT_TOKEN),
+        "validator, cache disabled": lambda: uncached.validate(init_data),
+        "validator, cache hit": lambda: validator.validate(init_data),
+    }
+    for name, fn in cases.items():
+        seconds = min(timeit.repeat(fn, number=ROUNDS, repeat=3))
+        print(f"{name:<34} {seconds / ROUNDS * 1e6:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
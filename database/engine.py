@@ -1,24 +1,224 @@
+import logging
+from pathlib import Path
+
+from sqlalchemy import event, inspect, make_url, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import URL
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.config import settings
+from app.config import Settings, settings
 from app.models.base import Base
+from database.instrumentation import (
+    instrument_query_counter,
+    instrument_statement_cache,
+    statement_cache_stats,
+)
+from database.migrations import apply_migrations
+from database.writer import WRITE_COORDINATOR_KEY, WriteCoordinator
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock key that serializes init_db across processes.
+INIT_DB_LOCK_ID = 0x666F6F64
+
+
+def sqlite_pragmas(config: Settings = settings, read_only: bool = False) -> dict[str, str | int]:
+    """PRAGMA profile applied to every new SQLite connection.
+
+    Read-only connections cannot switch the journal mode; they get
+    ``query_only`` instead.
+    """
+    pragmas = {
+        "journal_mode": config.sqlite_journal_mode,
+        "synchronous": config.sqlite_synchronous,
+        "cache_size": config.sqlite_cache_size,
+        "mmap_size": config.sqlite_mmap_size,
+        "temp_store": config.sqlite_temp_store,
+        "busy_timeout": config.sqlite_busy_timeout,
+        "foreign_keys": "ON" if config.sqlite_foreign_keys else "OFF",
+    }
+    if read_only:
+        del pragmas["journal_mode"]
+        pragmas["query_only"] = "ON"
+    return pragmas
+
+
+def _set_sqlite_pragmas(pragmas: dict[str, str | int]):
+    def on_connect(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return on_connect
+
+
+def engine_options(url: str | URL, config: Settings = settings, read: bool = False) -> dict:
+    """Pool and driver keyword arguments for ``create_async_engine``.
+
+    Every engine gets the compiled statement cache size. SQLite keeps
+    SQLAlchemy's default pool; its tuning is the pragma profile.
+    Server databases get the configured pool, with the read pool sizes for
+    ``read`` engines. asyncpg also gets the prepared statement cache size.
+    """
+    url = make_url(url)
+    options = {"query_cache_size": config.database_compiled_cache_size}
+    if url.get_backend_name() == "sqlite":
+        return options
+    options |= {
+        "pool_size": config.database_read_pool_size if read else config.database_pool_size,
+        "max_overflow": (
+            config.database_read_max_overflow if read else config.database_max_overflow
+        ),
+        "pool_recycle": config.database_pool_recycle,
+        "pool_pre_ping": config.database_pool_pre_ping,
+    }
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": config.database_statement_cache_size,
+        }
+    return options
+
+
+def create_engine(url: str | None = None, config: Settings = settings):
+    url = url or config.database_url
+    engine = create_async_engine(url, echo=False, **engine_options(url, config))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas(sqlite_pragmas(config)))
+    if config.database_cache_stats:
+        instrument_statement_cache(engine)
+    instrument_query_counter(engine)
+    return engine
+
+
+def create_read_engine(engine, config: Settings = settings):
+    """Engine for read-only handlers and routes, or ``None`` to read from ``engine``.
 
+    ``database_read_url`` points at a replica. Without one, a file-backed
+    SQLite database in WAL mode gets a pool of read-only connections to the
+    same file; WAL readers do not block the writer.
+    """
+    if config.database_read_url:
+        read_engine = create_async_engine(
+            config.database_read_url,
+            echo=False,
+            **engine_options(config.database_read_url, config, read=True),
+        )
+    else:
+        url = engine.url
+        if (
+            url.get_backend_name() != "sqlite"
+            or url.database in (None, "", ":memory:")
+            or config.sqlite_journal_mode.upper() != "WAL"
+        ):
+            return None
+        path = Path(url.database).resolve()
+        read_url = url.set(database=f"file:{path}?mode=ro", query={"uri": "true"})
+        read_engine = create_async_engine(
+            read_url,
+            echo=False,
+            pool_size=config.database_read_pool_size,
+            max_overflow=config.database_read_max_overflow,
+            **engine_options(read_url, config, read=True),
+        )
 
-def create_engine(url: str | None = None):
-    return create_async_engine(
-        url or settings.database_url,
-        echo=False,
+    if read_engine.dialect.name == "sqlite":
+        event.listen(
+            read_engine.sync_engine,
+            "connect",
+            _set_sqlite_pragmas(sqlite_pragmas(config, read_only=True)),
+        )
+    if config.database_cache_stats:
+        instrument_statement_cache(read_engine)
+    instrument_query_counter(read_engine)
+    return read_engine
+
+
+def create_writer_engine(url: str | None = None, config: Settings = settings):
+    """Single-connection engine for the write coordinator.
+
+    pysqlite only opens a transaction lazily before DML, which makes the
+    first SAVEPOINT act as the outer transaction and commit on release.
+    The writer takes over transaction control and opens each group with
+    ``BEGIN IMMEDIATE`` so the file lock is held from the start.
+    """
+    engine = create_async_engine(
+        url or config.database_url, echo=False, pool_size=1, max_overflow=0
+    )
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    set_pragmas = _set_sqlite_pragmas(sqlite_pragmas(config))
+
+    def on_connect(dbapi_connection, connection_record) -> None:
+        set_pragmas(dbapi_connection, connection_record)
+        dbapi_connection.isolation_level = None
+
+    def on_begin(conn) -> None:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    event.listen(engine.sync_engine, "connect", on_connect)
+    event.listen(engine.sync_engine, "begin", on_begin)
+    return engine
+
+
+def create_write_coordinator(engine, config: Settings = settings) -> WriteCoordinator:
+    """Coordinator writing through ``engine``, which it disposes on ``close``."""
+    return WriteCoordinator(
+        create_session_factory(engine),
+        max_batch=config.sqlite_group_commit_max_batch,
+        max_delay=config.sqlite_group_commit_delay_ms / 1000,
+        engine=engine,
     )
 
 
-def create_session_factory(engine) -> async_sessionmaker[AsyncSession]:
-    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+def start_write_coordinator(engine, config: Settings = settings) -> WriteCoordinator | None:
+    """Start group commit when it is enabled and ``engine`` is SQLite."""
+    if not config.sqlite_group_commit or engine.dialect.name != "sqlite":
+        return None
+    writer_engine = create_writer_engine(engine.url.render_as_string(hide_password=False), config)
+    coordinator = create_write_coordinator(writer_engine, config)
+    coordinator.start()
+    return coordinator
+
+
+_UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def upsert_insert(session: AsyncSession):
+    """The dialect's ``insert`` construct, which supports ``on_conflict_do_update``."""
+    dialect = session.get_bind().dialect.name
+    try:
+        return _UPSERT_INSERTS[dialect]
+    except KeyError:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}") from None
+
+
+def create_session_factory(
+    engine, write_coordinator: WriteCoordinator | None = None
+) -> async_sessionmaker[AsyncSession]:
+    """Session factory for the app; service writes go through ``write_coordinator`` if given."""
+    info = {WRITE_COORDINATOR_KEY: write_coordinator} if write_coordinator else None
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, info=info)
 
 
 async def init_db(engine) -> None:
     async with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # The bot and the WebApp may start together; let one create the schema.
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": INIT_DB_LOCK_ID})
+        fresh = not await conn.run_sync(lambda c: inspect(c).has_table("users"))
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(apply_migrations, stamp_only=fresh)
 
 
-async def close_db(engine) -> None:
+async def close_db(engine, write_coordinator: WriteCoordinator | None = None) -> None:
+    if write_coordinator is not None:
+        await write_coordinator.close()
+    stats = statement_cache_stats(engine)
+    if stats is not None:
+        logger.info("Statement cache for %s: %s", engine.url.render_as_string(), stats)
     await engine.dispose()
@@ -0,0 +1,139 @@
+"""Engine instrumentation: compiled statement cache and per-scope query counts.
+
+SQLAlchemy compiles each distinct statement shape once per engine and
+reuses the compiled form for later executions with the same cache key.
+``instrument_statement_cache`` counts, for every statement an engine
+executes, whether the compiled form came from that cache.
+
+``instrument_query_counter`` attributes every cursor execution to the
+``QueryStats`` of the innermost ``track_queries`` scope in the current
+context. The bot and WebApp middlewares open one scope per handler or
+route, which makes N+1 patterns show up as a query count over budget.
+"""
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from weakref import WeakKeyDictionary, WeakSet
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class StatementCacheStats:
+    hits: int = 0
+    misses: int = 0
+    uncached: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """Share of cacheable executions that reused a compiled statement."""
+        cacheable = self.hits + self.misses
+        return self.hits / cacheable if cacheable else 0.0
+
+    def reset(self) -> None:
+        self.hits = self.misses = self.uncached = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits} hits, {self.misses} misses, {self.uncached} uncached "
+            f"(hit ratio {self.hit_ratio:.1%})"
+        )
+
+
+_stats: WeakKeyDictionary[Engine, StatementCacheStats] = WeakKeyDictionary()
+
+
+def statement_cache_stats(engine) -> StatementCacheStats | None:
+    """The counters for ``engine``, or ``None`` if it is not instrumented."""
+    return _stats.get(engine.sync_engine)
+
+
+def instrument_statement_cache(engine) -> StatementCacheStats:
+    """Count compiled cache hits and misses for every statement ``engine`` executes.
+
+    Plain SQL strings (``exec_driver_sql``, pragmas) are not counted.
+    Instrumenting an engine twice returns the existing counters.
+    """
+    stats = _stats.get(engine.sync_engine)
+    if stats is not None:
+        return stats
+    stats = _stats[engine.sync_engine] = StatementCacheStats()
+
+    def after_execute(conn, clauseelement, multiparams, params, execution_options, result):
+        context = getattr(result, "context", None)
+        cache_hit = getattr(context, "cache_hit", None)
+        if cache_hit is CACHE_HIT:
+            stats.hits += 1
+        elif cache_hit is CACHE_MISS:
+            stats.misses += 1
+        else:
+            stats.uncached += 1
+
+    event.listen(engine.sync_engine, "after_execute", after_execute)
+    return stats
+
+
+@dataclass(slots=True)
+class QueryStats:
+    name: str
+    queries: int = 0
+    db_time: float = 0.0
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.queries} queries in {self.db_time * 1000:.1f} ms"
+
+
+_current_scope: ContextVar[QueryStats | None] = ContextVar("query_scope", default=None)
+_counted_engines: WeakSet[Engine] = WeakSet()
+
+
+def instrument_query_counter(engine) -> None:
+    """Attribute ``engine``'s cursor executions to the current ``track_queries`` scope."""
+    sync_engine = engine.sync_engine
+    if sync_engine in _counted_engines:
+        return
+    _counted_engines.add(sync_engine)
+
+    # The start time lives on the execution context, which is dropped with the
+    # statement, so a query that fails leaves nothing behind on the connection.
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _current_scope.get() is not None:
+            context._query_started = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_scope.get()
+        started = getattr(context, "_query_started", None)
+        if stats is None or started is None:
+            return
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+@contextmanager
+def track_queries(name: str, budget: int = 0) -> Iterator[QueryStats]:
+    """Count queries issued in this context until the block exits.
+
+    Logs a warning when more than ``budget`` queries ran (0 disables the
+    check) and a debug line otherwise. Writes handed to the group-commit
+    writer run in its own task and are not counted.
+    """
+    stats = QueryStats(name)
+    token = _current_scope.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_scope.reset(token)
+        if budget and stats.queries > budget:
+            logger.warning("Query budget of %s exceeded by %s", budget, stats)
+        else:
+            logger.debug("%s", stats)
@@ -0,0 +1,96 @@
+"""Versioned schema migrations applied at startup.
+
+``Base.metadata.create_all`` creates missing tables but never alters
+existing ones. Changes to tables that already hold production data are
+listed here as numbered migrations. Each one is a list of SQL statements
+that must be safe on SQLite and PostgreSQL. Applied versions are recorded
+in ``schema_migrations``. A database created from scratch already has the
+current schema, so its versions are only recorded, not run.
+"""
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import Column, Connection, DateTime, Integer, MetaData, String, Table, func, select
+
+logger = logging.getLogger(__name__)
+
+migrations_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migrations_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime, server_default=func.now(), nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...]
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(
+        1,
+        "unique cart line per user and product",
+        (
+            # Fold duplicate lines into the oldest one before the unique index goes in.
+            "UPDATE cart_items SET quantity = ("
+            " SELECT SUM(dup.quantity) FROM cart_items AS dup"
+            " WHERE dup.user_id = cart_items.user_id AND dup.product_id = cart_items.product_id"
+            ") WHERE id IN ("
+            " SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id HAVING COUNT(*) > 1"
+            ")",
+            "DELETE FROM cart_items WHERE id NOT IN ("
+            " SELECT MIN(id) FROM cart_items GROUP BY user_id, product_id"
+            ")",
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_items_user_product"
+            " ON cart_items (user_id, product_id)",
+        ),
+    ),
+    Migration(
+        2,
+        "indexes for hot query paths",
+        (
+            "CREATE INDEX IF NOT EXISTS ix_orders_user_id_created_at"
+            " ON orders (user_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_orders_status_created_at"
+            " ON orders (status, created_at)",
+            "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)",
+            "CREATE INDEX IF NOT EXISTS ix_categories_restaurant_id"
+            " ON categories (restaurant_id)",
+            "CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id)",
+        ),
+    ),
+)
+
+
+def apply_migrations(
+    conn: Connection,
+    migrations: tuple[Migration, ...] = MIGRATIONS,
+    stamp_only: bool = False,
+) -> list[int]:
+    """Run pending migrations on a sync connection inside the caller's transaction.
+
+    With ``stamp_only`` the pending versions are recorded without running
+    their statements. Returns the versions that were applied.
+    """
+    migrations_metadata.create_all(conn)
+    applied = set(conn.scalars(select(schema_migrations.c.version)))
+
+    done = []
+    for migration in sorted(migrations, key=lambda m: m.version):
+        if migration.version in applied:
+            continue
+        if not stamp_only:
+            logger.info("Applying migration %s: %s", migration.version, migration.name)
+            for statement in migration.statements:
+                conn.exec_driver_sql(statement)
+        conn.execute(
+            schema_migrations.insert().values(version=migration.version, name=migration.name)
+        )
+        done.append(migration.version)
+    return done
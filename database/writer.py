@@ -0,0 +1,225 @@
+"""Write units, the per-update unit of work, and single-writer group commit.
+
+Every service write is a *write unit*: an async callable that takes a
+session, makes its changes and returns a result without committing.
+``run_write`` executes a unit in one of three ways:
+
+- Inside ``unit_of_work`` it only flushes on the caller's session; the
+  unit of work commits when the handler or route returns, or earlier
+  through ``commit_unit_of_work``.
+- When the session factory was built with a ``WriteCoordinator``, it runs
+  on the coordinator's writer task.
+- Otherwise it runs on the caller's session and commits.
+
+The writer collects units for a few milliseconds, runs each inside its
+own SAVEPOINT, and commits the whole group in one transaction, so many
+small mutations share a single fsync. A unit that raises only rolls back
+its own savepoint and fails its own caller.
+
+Objects returned by a unit that ran on the writer belong to the writer's
+session, not the caller's.
+"""
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+WriteUnit = Callable[[AsyncSession], Awaitable[T]]
+
+WRITE_COORDINATOR_KEY = "write_coordinator"
+UNIT_OF_WORK_KEY = "unit_of_work"
+# Set on a unit of work's session while it has uncommitted writes.
+UNIT_OF_WORK_WRITES_KEY = "unit_of_work_writes"
+
+_current_unit: ContextVar[AsyncSession | None] = ContextVar("unit_of_work", default=None)
+
+
+@asynccontextmanager
+async def unit_of_work(
+    session_factory: async_sessionmaker[AsyncSession],
+) -> AsyncIterator[AsyncSession]:
+    """A session whose service writes only flush; commits once on exit.
+
+    Any exception rolls back everything the block wrote since the last
+    commit. Callbacks registered with ``after_commit`` run after the commit.
+    """
+    async with session_factory() as session:
+        callbacks: list[Callable[[], None]] = []
+        session.info[UNIT_OF_WORK_KEY] = callbacks
+        token = _current_unit.set(session)
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            _current_unit.reset(token)
+        for callback in callbacks:
+            callback()
+
+
+async def commit_unit_of_work() -> None:
+    """Commit what the current context's unit of work has written so far.
+
+    Call it before waiting on something slow, such as a paced Telegram call,
+    so the write lock is not held meanwhile. ``after_commit`` callbacks
+    registered so far run now. The block goes on in a new transaction.
+    Does nothing outside a unit of work or when nothing was written.
+    """
+    session = _current_unit.get()
+    if session is None or not session.info.pop(UNIT_OF_WORK_WRITES_KEY, False):
+        return
+    await session.commit()
+    callbacks = session.info[UNIT_OF_WORK_KEY]
+    committed = callbacks[:]
+    callbacks.clear()
+    for callback in committed:
+        callback()
+
+
+def in_unit_of_work(session: AsyncSession) -> bool:
+    return UNIT_OF_WORK_KEY in session.info
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], None]) -> None:
+    """Run ``callback`` once the session's last ``run_write`` is committed."""
+    callbacks = session.info.get(UNIT_OF_WORK_KEY)
+    if callbacks is None:
+        callback()
+    else:
+        callbacks.append(callback)
+
+
+async def run_write(session: AsyncSession, unit: WriteUnit[T]) -> T:
+    """Run a write unit and commit it.
+
+    Inside a unit of work the commit is left to ``unit_of_work``. Otherwise
+    the unit goes through the coordinator if one is configured.
+    """
+    if in_unit_of_work(session):
+        result = await unit(session)
+        await session.flush()
+        session.info[UNIT_OF_WORK_WRITES_KEY] = True
+        return result
+
+    coordinator = session.info.get(WRITE_COORDINATOR_KEY)
+    if coordinator is not None:
+        return await coordinator.submit(unit)
+
+    try:
+        result = await unit(session)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    return result
+
+
+class WriteCoordinator:
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        max_batch: int = 64,
+        max_delay: float = 0.005,
+        engine: AsyncEngine | None = None,
+    ):
+        self.session_factory = session_factory
+        # The writer's own engine, if it has one; disposed by ``close``.
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self.units = 0
+        self._queue: asyncio.Queue[tuple[WriteUnit, asyncio.Future] | None] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="write-coordinator")
+
+    async def stop(self) -> None:
+        """Commit everything already submitted, then stop the writer task."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+
+    async def close(self) -> None:
+        """Stop the writer task and dispose of its engine."""
+        await self.stop()
+        if self.engine is not None:
+            await self.engine.dispose()
+
+    async def submit(self, unit: WriteUnit[T]) -> T:
+        if self._task is None:
+            raise RuntimeError("WriteCoordinator is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((unit, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                try:
+                    if self._queue.empty():
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        entry = await asyncio.wait_for(self._queue.get(), timeout)
+                    else:
+                        entry = self._queue.get_nowait()
+                except asyncio.TimeoutError:
+                    break
+                if entry is None:
+                    stopping = True
+                    break
+                batch.append(entry)
+            await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch: list[tuple[WriteUnit, asyncio.Future]]) -> None:
+        outcomes: list[tuple[asyncio.Future, object, BaseException | None]] = []
+        try:
+            async with self.session_factory() as session:
+                for unit, future in batch:
+                    if future.cancelled():
+                        continue
+                    try:
+                        async with session.begin_nested():
+                            result = await unit(session)
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+                    else:
+                        outcomes.append((future, result, None))
+                await session.commit()
+        except Exception as exc:
+            logger.exception("Group commit of %s write units failed", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        self.batches += 1
+        self.units += len(outcomes)
+        for future, result, error in outcomes:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
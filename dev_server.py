@@ -7,7 +7,7 @@ from app.models.category import Category
 from app.models.product import Product
 from app.models.restaurant import Restaurant
 from app.models.user import User
-from app.webapp.routes import create_webapp_routes
+from app.webapp.routes import setup_webapp
 from database.engine import create_engine, create_session_factory, init_db
 
 DEMO_TOKEN = "demo"
@@ -91,8 +91,7 @@ async def main():
     await seed_data(session_factory)
 
     app = web.Application()
-    routes = create_webapp_routes(session_factory, DEMO_TOKEN)
-    app.router.add_routes(routes)
+    setup_webapp(app, session_factory, DEMO_TOKEN)
 
     runner = web.AppRunner(app)
     await runner.setup()
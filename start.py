@@ -11,8 +11,15 @@ from aiohttp import web
 
 from app.config import settings
 from app.models.restaurant import Restaurant
-from app.webapp.routes import create_webapp_routes
-from database.engine import close_db, create_engine, create_session_factory, init_db
+from app.webapp.routes import setup_webapp
+from database.engine import (
+    close_db,
+    create_engine,
+    create_read_engine,
+    create_session_factory,
+    init_db,
+    start_write_coordinator,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -91,14 +98,31 @@ async def main():
 
     engine = create_engine()
     await init_db(engine)
-    session_factory = create_session_factory(engine)
+    write_coordinator = start_write_coordinator(engine)
+    session_factory = create_session_factory(engine, write_coordinator)
+    read_engine = create_read_engine(engine)
+    read_session_factory = create_session_factory(read_engine) if read_engine else None
 
     await seed_if_empty(session_factory)
 
     # Start WebApp HTTP server
     webapp_app = web.Application()
-    webapp_routes = create_webapp_routes(session_factory, settings.bot_token)
-    webapp_app.router.add_routes(webapp_routes)
+    setup_webapp(webapp_app, session_factory, settings.bot_token, read_session_factory)
+
+    bot = dp = None
+    if settings.bot_token and settings.bot_token != "your_telegram_bot_token":
+        from app.bot import create_bot, create_dispatcher, create_fsm_storage, setup_webhook
+        from app.handlers import setup_routers
+        from app.middlewares import DbSessionMiddleware
+
+        bot = create_bot()
+        dp = create_dispatcher(storage=create_fsm_storage(session_factory))
+        db_middleware = DbSessionMiddleware(session_factory, read_session_factory)
+        dp.message.middleware(db_middleware)
+        dp.callback_query.middleware(db_middleware)
+        dp.include_router(setup_routers())
+        if settings.bot_mode == "webhook":
+            setup_webhook(webapp_app, dp, bot)
 
     runner = web.AppRunner(webapp_app)
     await runner.setup()
@@ -107,36 +131,33 @@ async def main():
     await site.start()
     logger.info("WebApp server started on %s:%s", settings.webapp_host, port)
 
-    # Start Telegram bot polling
-    if settings.bot_token and settings.bot_token != "your_telegram_bot_token":
-        from aiogram import Bot
-        from aiogram.client.default import DefaultBotProperties
-        from aiogram.enums import ParseMode
-
-        from app.handlers import setup_routers
-        from app.middlewares import DbSessionMiddleware
-
-        bot = Bot(
-            token=settings.bot_token,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML),
-        )
-        from aiogram import Dispatcher
-
-        dp = Dispatcher()
-        dp.update.middleware(DbSessionMiddleware(session_factory))
-        dp.include_router(setup_routers())
-
-        logger.info("Starting Telegram bot polling...")
-        try:
+    notifier = None
+    if bot is not None:
+        from app.notifications import start_order_notifier
+
+        notifier = start_order_notifier(bot, session_factory)
+
+    try:
+        if bot is None:
+            logger.warning("BOT_BOT_TOKEN not set, running WebApp server only.")
+            await asyncio.Event().wait()
+        elif settings.bot_mode == "webhook":
+            logger.info("Receiving Telegram updates via webhook at %s", settings.webhook_path)
+            await asyncio.Event().wait()
+        else:
+            # Start Telegram bot polling
+            logger.info("Starting Telegram bot polling...")
             await dp.start_polling(bot)
-        finally:
+    finally:
+        if notifier is not None:
+            await notifier.stop()
+        if bot is not None:
             await bot.session.close()
-    else:
-        logger.warning("BOT_BOT_TOKEN not set, running WebApp server only.")
-        await asyncio.Event().wait()
 
     await runner.cleanup()
-    await close_db(engine)
+    await close_db(engine, write_coordinator)
+    if read_engine is not None:
+        await close_db(read_engine)
 
 
 if __name__ == "__main__":
@@ -1,12 +1,34 @@
+import os
+import time
+from contextlib import contextmanager
+
 import pytest
+from aiogram.types import Update
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.models.base import Base
+from app.services.catalog_cache import catalog_cache
+from database.engine import create_engine, init_db
+from database.instrumentation import instrument_query_counter, track_queries
+from database.migrations import migrations_metadata
+
+
+@pytest.fixture(autouse=True)
+def clear_catalog_cache():
+    catalog_cache.invalidate()
+    yield
+    catalog_cache.invalidate()
+
+
+TEST_DATABASE_URL = os.environ.get("BOT_TEST_DATABASE_URL")
 
 
 @pytest.fixture
 async def engine():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    """Empty schema on in-memory SQLite, or on ``BOT_TEST_DATABASE_URL`` when it is set."""
+    engine = create_async_engine(TEST_DATABASE_URL or "sqlite+aiosqlite:///:memory:")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     yield engine
@@ -24,3 +46,101 @@ async def session_factory(engine):
 async def session(session_factory):
     async with session_factory() as session:
         yield session
+
+
+@pytest.fixture
+def assert_queries(engine):
+    """``with assert_queries(n):`` fails unless exactly ``n`` queries ran in the block."""
+    instrument_query_counter(engine)
+
+    @contextmanager
+    def check(expected: int):
+        with track_queries("test") as stats:
+            yield stats
+        assert stats.queries == expected, f"expected {expected} queries, got {stats}"
+
+    return check
+
+
+@pytest.fixture
+async def pg_engine():
+    """Initialized engine on the PostgreSQL in ``BOT_TEST_DATABASE_URL``; skips without one."""
+    if not TEST_DATABASE_URL:
+        pytest.skip("BOT_TEST_DATABASE_URL is not set")
+    engine = create_engine(TEST_DATABASE_URL)
+    await init_db(engine)
+    yield engine
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(migrations_metadata.drop_all)
+    await engine.dispose()
+
+
+API_ERRORS = {
+    400: "Bad Request: chat not found",
+    403: "Forbidden: bot was blocked by the user",
+    429: "Too Many Requests: retry after 1",
+    500: "Internal Server Error",
+}
+
+
+def make_update(update_id: int, text: str, chat_id: int = 42) -> Update:
+    """A private-chat text message from user ``chat_id``."""
+    return Update.model_validate(
+        {
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "TestUser"},
+                "text": text,
+            },
+        }
+    )
+
+
+class FakeBotApi:
+    """Stand-in for the Bot API that records calls and can answer with errors."""
+
+    def __init__(self):
+        self.calls: list[tuple[str, str | None, str | None, float]] = []
+        self.errors: list[int] = []  # status codes to answer the next calls with
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        form = await request.post()
+        if self.errors:
+            status = self.errors.pop(0)
+            error = {"ok": False, "error_code": status, "description": API_ERRORS[status]}
+            if status == 429:
+                error["parameters"] = {"retry_after": 1}
+            return web.json_response(error, status=status)
+        chat_id, text = form.get("chat_id"), form.get("text")
+        self.calls.append((method, chat_id, text, time.monotonic()))
+        if method == "sendMessage":
+            result = {
+                "message_id": len(self.calls),
+                "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"},
+                "text": text,
+            }
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    def texts(self) -> list[str]:
+        return [text for _, _, text, _ in self.calls]
+
+
+@pytest.fixture
+async def api():
+    """A running ``FakeBotApi``; point a bot's session at ``api.url``."""
+    fake = FakeBotApi()
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", fake.handle)
+    server = TestServer(app)
+    await server.start_server()
+    fake.url = str(server.make_url("")).rstrip("/")
+    yield fake
+    await server.close()
@@ -0,0 +1,468 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_mock_engine, event, func, select, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import Settings
+from app.models.base import Base
+from app.models.cart import CartItem
+from app.models.category import Category
+from app.models.order import OrderStatus
+from app.models.product import Product
+from app.models.restaurant import Restaurant
+from app.models.user import User
+from app.services.cart import CartOperation, CartService
+from app.services.checkout import CheckoutService
+from app.services.order import OrderService
+from app.services.restaurant import RestaurantService
+from app.services.user import UserService
+from database.engine import (
+    close_db,
+    create_engine,
+    create_read_engine,
+    create_session_factory,
+    create_writer_engine,
+    engine_options,
+    init_db,
+    sqlite_pragmas,
+    start_write_coordinator,
+)
+from database.instrumentation import (
+    instrument_query_counter,
+    instrument_statement_cache,
+    statement_cache_stats,
+    track_queries,
+)
+from database.migrations import MIGRATIONS, apply_migrations
+from database.writer import WriteCoordinator
+
+LEGACY_SCHEMA = (
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, telegram_id BIGINT UNIQUE,"
+    " first_name VARCHAR(255), last_name VARCHAR(255), username VARCHAR(255),"
+    " phone VARCHAR(20), delivery_address VARCHAR(500),"
+    " created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,"
+    " updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL)",
+    "CREATE TABLE restaurants (id INTEGER PRIMARY KEY, name VARCHAR(255),"
+    " description TEXT, address VARCHAR(500), image_url VARCHAR(500), is_active BOOLEAN,"
+    " created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,"
+    " updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL)",
+    "CREATE TABLE categories (id INTEGER PRIMARY KEY, name VARCHAR(255),"
+    " restaurant_id INTEGER REFERENCES restaurants (id))",
+    "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR(255), description TEXT,"
+    " price INTEGER, image_url VARCHAR(500), is_available BOOLEAN,"
+    " category_id INTEGER REFERENCES categories (id))",
+    "CREATE TABLE cart_items (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id),"
+    " product_id INTEGER REFERENCES products (id), quantity INTEGER)",
+    "CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id),"
+    " restaurant_id INTEGER REFERENCES restaurants (id), status VARCHAR(10), total INTEGER,"
+    " delivery_address VARCHAR(500), phone VARCHAR(20), comment TEXT,"
+    " created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL,"
+    " updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL)",
+    "CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders (id),"
+    " product_id INTEGER REFERENCES products (id), quantity INTEGER, price INTEGER)",
+)
+
+
+async def _index_names(conn) -> set[str]:
+    result = await conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))
+    return set(result.scalars())
+
+
+class TestMigrations:
+    async def test_fresh_database_is_stamped(self):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        await init_db(engine)
+        async with engine.connect() as conn:
+            versions = await conn.execute(text("SELECT version FROM schema_migrations"))
+            assert sorted(versions.scalars()) == [m.version for m in MIGRATIONS]
+            assert "ix_orders_user_id_created_at" in await _index_names(conn)
+        await engine.dispose()
+
+    async def test_legacy_database_is_migrated(self):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            for statement in LEGACY_SCHEMA:
+                await conn.exec_driver_sql(statement)
+            await conn.exec_driver_sql("INSERT INTO users (id, first_name) VALUES (1, 'A')")
+            await conn.exec_driver_sql(
+                "INSERT INTO cart_items (user_id, product_id, quantity)"
+                " VALUES (1, 7, 1), (1, 7, 2), (1, 8, 1)"
+            )
+
+        await init_db(engine)
+
+        async with engine.connect() as conn:
+            rows = await conn.execute(
+                text("SELECT product_id, quantity FROM cart_items ORDER BY product_id")
+            )
+            assert rows.all() == [(7, 3), (8, 1)]
+            assert {
+                "uq_cart_items_user_product",
+                "ix_orders_user_id_created_at",
+                "ix_orders_status_created_at",
+                "ix_order_items_order_id",
+                "ix_categories_restaurant_id",
+                "ix_products_category_id",
+            } <= await _index_names(conn)
+            users = await conn.execute(text("SELECT first_name FROM users"))
+            assert users.scalars().all() == ["A"]
+        await engine.dispose()
+
+    async def test_apply_migrations_is_idempotent(self):
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        await init_db(engine)
+        async with engine.begin() as conn:
+            assert await conn.run_sync(apply_migrations) == []
+        await engine.dispose()
+
+
+class TestSqlitePragmas:
+    async def test_profile_applied_on_connect(self, tmp_path):
+        engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'pragmas.db'}")
+        async with engine.connect() as conn:
+            pragma = {}
+            for name in ("journal_mode", "synchronous", "busy_timeout", "foreign_keys"):
+                result = await conn.exec_driver_sql(f"PRAGMA {name}")
+                pragma[name] = result.scalar()
+        await engine.dispose()
+
+        assert pragma["journal_mode"] == "wal"
+        assert pragma["synchronous"] == 1  # NORMAL
+        assert pragma["busy_timeout"] == 5000
+        assert pragma["foreign_keys"] == 1
+
+    def test_profile_follows_settings(self):
+        config = Settings(sqlite_journal_mode="DELETE", sqlite_foreign_keys=False)
+        pragmas = sqlite_pragmas(config)
+        assert pragmas["journal_mode"] == "DELETE"
+        assert pragmas["foreign_keys"] == "OFF"
+
+
+class TestPostgresBackend:
+    def test_schema_ddl(self):
+        statements = []
+        mock = create_mock_engine(
+            "postgresql+asyncpg://",
+            lambda sql, *args, **kwargs: statements.append(str(sql.compile(dialect=mock.dialect))),
+        )
+        Base.metadata.create_all(mock, checkfirst=False)
+        ddl = "\n".join(statements)
+        assert "CREATE TYPE orderstatus AS ENUM" in ddl
+        assert "telegram_id BIGINT NOT NULL" in ddl
+        assert "CREATE UNIQUE INDEX uq_cart_items_user_product" in ddl
+
+    def test_pool_options(self):
+        config = Settings(
+            database_pool_size=20,
+            database_max_overflow=5,
+            database_pool_recycle=600,
+            database_statement_cache_size=0,
+            database_compiled_cache_size=1000,
+        )
+        options = engine_options("postgresql+asyncpg://bot@db/bot", config)
+        assert options == {
+            "query_cache_size": 1000,
+            "pool_size": 20,
+            "max_overflow": 5,
+            "pool_recycle": 600,
+            "pool_pre_ping": True,
+            "connect_args": {"prepared_statement_cache_size": 0},
+        }
+        read = engine_options("postgresql+asyncpg://bot@replica/bot", config, read=True)
+        assert read["pool_size"] == config.database_read_pool_size
+        assert engine_options("sqlite+aiosqlite:///bot.db", config) == {"query_cache_size": 1000}
+
+    async def test_engine_uses_pool_settings(self):
+        engine = create_engine(
+            "postgresql+asyncpg://bot@db/bot", Settings(database_pool_size=12)
+        )
+        assert engine.pool.size() == 12
+        assert engine.pool._pre_ping
+        await engine.dispose()
+
+    async def test_init_db_is_idempotent(self, pg_engine):
+        await init_db(pg_engine)
+        async with pg_engine.connect() as conn:
+            versions = await conn.execute(text("SELECT version FROM schema_migrations"))
+            assert sorted(versions.scalars()) == [m.version for m in MIGRATIONS]
+
+    async def test_cart_upserts_and_checkout(self, pg_engine):
+        factory = create_session_factory(pg_engine)
+        async with factory() as session:
+            user = await UserService(session).get_or_create(telegram_id=2**40, first_name="A")
+            restaurant = Restaurant(name="R", is_active=True)
+            session.add(restaurant)
+            await session.flush()
+            category = Category(name="C", restaurant_id=restaurant.id)
+            session.add(category)
+            await session.flush()
+            product = Product(name="P", price=100, category_id=category.id)
+            session.add(product)
+            await session.commit()
+
+            cart = CartService(session)
+            await cart.add_item(user.id, product.id, 1)
+            item = await cart.add_item(user.id, product.id, 2)
+            assert item.quantity == 3
+            items = await cart.apply_batch(user.id, [CartOperation("set", product.id, quantity=5)])
+            assert [i.quantity for i in items] == [5]
+
+            order = await CheckoutService(session).checkout(user.id, "Addr", "Phone")
+            assert order.total == 500
+            assert await cart.get_items(user.id) == []
+            summaries, _ = await OrderService(session).get_order_summaries(user.id)
+            assert [s.id for s in summaries] == [order.id]
+
+
+class TestReadEngine:
+    async def test_sqlite_file_gets_read_only_pool(self, tmp_path):
+        engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'split.db'}")
+        await init_db(engine)
+        async with engine.begin() as conn:
+            await conn.execute(text("INSERT INTO restaurants (name, is_active) VALUES ('R', 1)"))
+
+        read_engine = create_read_engine(engine)
+        async with read_engine.connect() as conn:
+            count = await conn.scalar(text("SELECT COUNT(*) FROM restaurants"))
+            assert count == 1
+            with pytest.raises(OperationalError):
+                await conn.execute(text("DELETE FROM restaurants"))
+        assert read_engine.pool.size() == Settings().database_read_pool_size
+        await read_engine.dispose()
+        await engine.dispose()
+
+    async def test_no_split_without_replica(self, engine, tmp_path):
+        assert create_read_engine(engine) is None
+        file_engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'rollback.db'}")
+        assert create_read_engine(file_engine, Settings(sqlite_journal_mode="DELETE")) is None
+        await file_engine.dispose()
+
+    async def test_replica_url(self, engine, tmp_path):
+        replica = f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}"
+        read_engine = create_read_engine(engine, Settings(database_read_url=replica))
+        assert read_engine.url.database == str(tmp_path / "replica.db")
+        await read_engine.dispose()
+
+
+@pytest.fixture
+async def coordinated(tmp_path):
+    """A file database whose session factory routes writes through a WriteCoordinator."""
+    url = f"sqlite+aiosqlite:///{tmp_path / 'writer.db'}"
+    engine = create_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    config = Settings(sqlite_group_commit=True, sqlite_group_commit_delay_ms=20)
+    coordinator = start_write_coordinator(engine, config)
+    yield create_session_factory(engine, coordinator), coordinator
+    await close_db(engine, coordinator)
+
+
+class TestWriteCoordinator:
+    async def test_concurrent_writes_share_commits(self, coordinated):
+        factory, coordinator = coordinated
+        async with factory() as session:
+            user = await UserService(session).get_or_create(telegram_id=1, first_name="A")
+            restaurant = Restaurant(name="R", is_active=True)
+            session.add(restaurant)
+            await session.flush()
+            category = Category(name="C", restaurant_id=restaurant.id)
+            session.add(category)
+            await session.flush()
+            product = Product(name="P", price=100, category_id=category.id)
+            session.add(product)
+            await session.commit()
+
+        async def add_one():
+            async with factory() as session:
+                return await CartService(session).add_item(user.id, product.id, 1)
+
+        batches = coordinator.batches
+        await asyncio.gather(*(add_one() for _ in range(50)))
+
+        assert coordinator.batches - batches < 50
+        async with factory() as session:
+            rows = await session.execute(
+                select(func.count(), func.sum(CartItem.quantity)).where(
+                    CartItem.user_id == user.id
+                )
+            )
+            assert rows.one() == (1, 50)
+
+    async def test_failed_unit_does_not_abort_group(self, coordinated):
+        factory, _ = coordinated
+
+        async def create(telegram_id: int):
+            async with factory() as session:
+                return await UserService(session).get_or_create(telegram_id, "A")
+
+        async def broken(session):
+            session.add(User(telegram_id=None, first_name=None))
+            await session.flush()
+
+        async with factory() as session:
+            failing = session.info["write_coordinator"].submit(broken)
+            results = await asyncio.gather(
+                create(1), failing, create(2), return_exceptions=True
+            )
+
+        assert isinstance(results[1], Exception)
+        assert {results[0].telegram_id, results[2].telegram_id} == {1, 2}
+        async with factory() as session:
+            count = await session.scalar(select(func.count()).select_from(User))
+            assert count == 2
+
+    async def test_disabled_by_default(self, engine):
+        assert start_write_coordinator(engine, Settings()) is None
+
+    async def test_writer_uses_config_and_is_disposed(self, tmp_path):
+        engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'config.db'}")
+        config = Settings(sqlite_group_commit=True, sqlite_cache_size=-1234)
+        coordinator = start_write_coordinator(engine, config)
+        async with coordinator.engine.connect() as conn:
+            assert await conn.scalar(text("PRAGMA cache_size")) == -1234
+
+        disposed = []
+        event.listen(coordinator.engine.sync_engine, "engine_disposed", disposed.append)
+        await close_db(engine, coordinator)
+        assert disposed == [coordinator.engine.sync_engine]
+
+    async def test_stop_drains_pending_units(self, tmp_path):
+        engine = create_writer_engine(f"sqlite+aiosqlite:///{tmp_path / 'drain.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        coordinator = WriteCoordinator(create_session_factory(engine), max_delay=1)
+        coordinator.start()
+
+        async def unit(session):
+            session.add(User(telegram_id=7, first_name="A"))
+
+        pending = asyncio.ensure_future(coordinator.submit(unit))
+        await asyncio.sleep(0)
+        await coordinator.stop()
+        await pending
+
+        async with create_session_factory(engine)() as session:
+            assert await session.scalar(select(func.count()).select_from(User)) == 1
+        await engine.dispose()
+        with pytest.raises(RuntimeError):
+            await coordinator.submit(unit)
+
+
+class TestStatementCache:
+    async def test_repeated_lookups_hit_compiled_cache(self, engine, session):
+        stats = instrument_statement_cache(engine)
+        assert instrument_statement_cache(engine) is stats
+        assert statement_cache_stats(engine) is stats
+
+        service = UserService(session)
+        for telegram_id in range(5):
+            await service.get_by_telegram_id(telegram_id)
+        await OrderService(session).get_order_lines([1, 2, 3])
+        await OrderService(session).get_order_lines([4])
+
+        assert (stats.hits, stats.misses) == (5, 2)
+        assert stats.hit_ratio == pytest.approx(5 / 7)
+        assert "hit ratio 71.4%" in str(stats)
+
+    def test_disabled_by_setting(self):
+        engine = create_engine("sqlite+aiosqlite://", Settings(database_cache_stats=False))
+        assert statement_cache_stats(engine) is None
+        assert statement_cache_stats(create_engine("sqlite+aiosqlite://")) is not None
+
+    async def test_close_db_logs_stats(self, caplog):
+        engine = create_engine("sqlite+aiosqlite://")
+        async with engine.connect() as conn:
+            await conn.execute(select(1))
+        with caplog.at_level("INFO", logger="database.engine"):
+            await close_db(engine)
+        assert "0 hits, 1 misses" in caplog.text
+
+
+class TestQueryCounter:
+    async def test_failed_query_leaves_no_residue(self, engine):
+        instrument_query_counter(engine)
+        async with engine.connect() as conn:
+            info = dict(conn.info)
+            with track_queries("failing") as stats:
+                with pytest.raises(DBAPIError):
+                    await conn.execute(text("SELECT * FROM no_such_table"))
+            await conn.rollback()
+            assert conn.info == info
+            assert stats.queries == 0
+
+            with track_queries("next") as stats:
+                await conn.execute(select(1))
+            assert stats.queries == 1
+            assert conn.info == info
+
+
+@pytest.fixture
+async def query_plans(engine):
+    """Collect EXPLAIN QUERY PLAN details for every SELECT the services issue."""
+    if engine.dialect.name != "sqlite":
+        pytest.skip("EXPLAIN QUERY PLAN is SQLite syntax")
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+
+    async def plans() -> list[tuple[str, list[str]]]:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+        explained = []
+        async with engine.connect() as conn:
+            for statement, parameters in statements:
+                result = await conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", tuple(parameters)
+                )
+                explained.append((statement, [row[3] for row in result]))
+        return explained
+
+    return statements, plans
+
+
+HOT_TABLES = ("cart_items", "orders", "order_items", "categories", "products")
+
+
+async def test_service_queries_use_indexes(session, query_plans):
+    user = User(telegram_id=1, first_name="A")
+    restaurant = Restaurant(name="R", is_active=True)
+    session.add_all([user, restaurant])
+    await session.flush()
+    category = Category(name="C", restaurant_id=restaurant.id)
+    session.add(category)
+    await session.flush()
+    product = Product(name="P", price=100, category_id=category.id)
+    session.add(product)
+    await session.commit()
+    await CartService(session).add_item(user.id, product.id, 1)
+    await CheckoutService(session).checkout(user.id, "Addr", "Phone")
+    await CartService(session).add_item(user.id, product.id, 1)
+
+    statements, plans = query_plans
+    statements.clear()
+
+    restaurants = RestaurantService(session)
+    orders = OrderService(session)
+    await CartService(session).get_items(user.id)
+    await orders.get_user_orders(user.id)
+    summaries, _ = await orders.get_order_summaries(user.id)
+    await orders.get_order_lines([s.id for s in summaries])
+    await orders.get_active_orders(user.id)
+    await orders.get_all_pending()
+    await restaurants.get_menu(restaurant.id)
+    await restaurants.get_categories_page(restaurant.id)
+    await restaurants.get_restaurant_with_categories(restaurant.id)
+    await restaurants.get_category_with_available_products(category.id, restaurant.id)
+    await orders.update_status(summaries[0].id, OrderStatus.CONFIRMED)
+
+    explained = await plans()
+    assert explained
+    for statement, details in explained:
+        for detail in details:
+            scanned = detail.split()[1] if detail.startswith("SCAN ") else None
+            assert scanned not in HOT_TABLES, f"{detail!r} in plan for {statement}"
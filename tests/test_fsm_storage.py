@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiogram import Bot, F, Router
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.types import Message
+from sqlalchemy import func, select, update
+
+from app.bot import create_dispatcher
+from app.config import Settings
+from app.fsm_storage import DatabaseStorage
+from app.handlers.cart import CheckoutState
+from app.models.fsm import FsmState
+from tests.conftest import make_update
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+async def row_count(session_factory) -> int:
+    async with session_factory() as session:
+        return await session.scalar(select(func.count()).select_from(FsmState))
+
+
+class TestDatabaseStorage:
+    async def test_state_and_data_survive_restart(self, session_factory):
+        storage = DatabaseStorage(session_factory, ttl=3600)
+        await storage.set_state(KEY, CheckoutState.phone)
+        await storage.update_data(KEY, {"address": "Main st"})
+
+        restarted = DatabaseStorage(session_factory, ttl=3600)
+        assert await restarted.get_state(KEY) == CheckoutState.phone.state
+        assert await restarted.get_data(KEY) == {"address": "Main st"}
+        assert await restarted.get_state(StorageKey(bot_id=1, chat_id=7, user_id=7)) is None
+
+    async def test_clear_deletes_row(self, session_factory):
+        storage = DatabaseStorage(session_factory)
+        await storage.set_state(KEY, CheckoutState.address)
+        await storage.set_data(KEY, {"address": "Main st"})
+        assert await row_count(session_factory) == 1
+
+        context = FSMContext(storage, KEY)
+        await context.clear()
+        assert await row_count(session_factory) == 0
+
+    async def test_expired_state_reads_empty_and_is_purged(self, session_factory):
+        storage = DatabaseStorage(session_factory, ttl=60)
+        await storage.set_state(KEY, CheckoutState.confirm)
+        async with session_factory() as session:
+            await session.execute(
+                update(FsmState).values(expires_at=datetime(2000, 1, 1))
+            )
+            await session.commit()
+
+        assert await storage.get_state(KEY) is None
+        assert await storage.purge_expired() == 1
+        assert await row_count(session_factory) == 0
+
+    async def test_write_moves_expiry_ahead(self, session_factory):
+        storage = DatabaseStorage(session_factory, ttl=60)
+        await storage.set_state(KEY, CheckoutState.address)
+        async with session_factory() as session:
+            expires_at = await session.scalar(select(FsmState.expires_at))
+        remaining = expires_at - datetime.now(timezone.utc).replace(tzinfo=None)
+        assert timedelta(seconds=50) < remaining <= timedelta(seconds=60)
+
+    async def test_batch_writes_once(self, session_factory, assert_queries):
+        storage = DatabaseStorage(session_factory, ttl=3600)
+        with assert_queries(2):  # one load, one upsert
+            async with storage.batch():
+                await storage.set_state(KEY, CheckoutState.address)
+                await storage.update_data(KEY, {"address": "Main st"})
+                await storage.update_data(KEY, {"phone": "+1"})
+                assert await storage.get_state(KEY) == CheckoutState.address.state
+        assert await storage.get_data(KEY) == {"address": "Main st", "phone": "+1"}
+
+    async def test_batch_is_dropped_on_error(self, session_factory):
+        storage = DatabaseStorage(session_factory)
+        with pytest.raises(RuntimeError):
+            async with storage.batch():
+                await storage.set_state(KEY, CheckoutState.address)
+                raise RuntimeError("handler failed")
+        assert await row_count(session_factory) == 0
+
+    async def test_read_cache(self, session_factory, assert_queries):
+        storage = DatabaseStorage(session_factory, cache_size=10)
+        await storage.set_state(KEY, CheckoutState.address)
+        await storage.update_data(KEY, {"address": "Main st"})
+
+        with assert_queries(0):
+            assert await storage.get_state(KEY) == CheckoutState.address.state
+            assert await storage.get_data(KEY) == {"address": "Main st"}
+
+
+async def test_dispatcher_coalesces_each_update(session_factory, assert_queries):
+    storage = DatabaseStorage(session_factory, ttl=3600)
+    dp = create_dispatcher(Settings(update_concurrency=4), storage=storage)
+    router = Router()
+
+    @router.message(F.text == "checkout")
+    async def checkout(message: Message, state: FSMContext) -> None:
+        await state.update_data(address="Main st")
+        await state.update_data(phone="+1")
+        await state.set_state(CheckoutState.confirm)
+
+    @router.message(CheckoutState.confirm)
+    async def confirm(message: Message, state: FSMContext) -> None:
+        data = await state.get_data()
+        assert data == {"address": "Main st", "phone": "+1"}
+        await state.clear()
+
+    dp.include_router(router)
+    bot = Bot(token="123456:TEST")
+
+    # One load shared by the FSM middleware and the handler, then one upsert.
+    with assert_queries(2):
+        await dp.feed_update(bot, make_update(1, "checkout"))
+    assert await DatabaseStorage(session_factory).get_state(
+        StorageKey(bot_id=bot.id, chat_id=42, user_id=42)
+    ) == CheckoutState.confirm.state
+
+    await dp.feed_update(bot, make_update(2, "yes"))
+    assert await row_count(session_factory) == 0
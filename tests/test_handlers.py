@@ -0,0 +1,33 @@
+from unittest.mock import AsyncMock, MagicMock
+
+from app.handlers import menu
+from app.keyboards.inline import RestaurantCB
+from app.services.restaurant import RestaurantService
+
+
+def make_callback() -> MagicMock:
+    callback = MagicMock()
+    callback.answer = AsyncMock()
+    callback.message.edit_text = AsyncMock()
+    return callback
+
+
+async def test_show_categories_is_one_query(session, assert_queries):
+    service = RestaurantService(session)
+    restaurant = await service.create_restaurant("Test Restaurant", "Desc")
+    await service.create_category("Pizza", restaurant.id)
+
+    callback = make_callback()
+    with assert_queries(1):
+        await menu.show_categories(callback, RestaurantCB(id=restaurant.id), session)
+
+    text = callback.message.edit_text.await_args.args[0]
+    assert text.startswith("<b>Test Restaurant</b>\nDesc\n")
+    callback.answer.assert_awaited_once_with()
+
+
+async def test_show_categories_unknown_restaurant(session, assert_queries):
+    callback = make_callback()
+    with assert_queries(1):
+        await menu.show_categories(callback, RestaurantCB(id=9999), session)
+    callback.answer.assert_awaited_once_with("Restaurant not found", show_alert=True)
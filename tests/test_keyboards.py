@@ -4,10 +4,13 @@ from app.keyboards.inline import (
     AddToCartCB,
     CartActionCB,
     CategoryCB,
+    CategoryPageCB,
     OrderActionCB,
     OrderCB,
     ProductCB,
+    ProductPageCB,
     RestaurantCB,
+    RestaurantPageCB,
     admin_order_keyboard,
     cart_keyboard,
     categories_keyboard,
@@ -45,7 +48,7 @@ def _mock_product(id=1, name="TestProd", price=999, price_display="9.99",
     m.is_available = is_available
     m.category_id = category_id
     m.category = category or _mock_category()
-    m.category.restaurant_id = 1
+    m.restaurant_id = 1
     return m
 
 
@@ -53,9 +56,8 @@ def _mock_cart_item(id=1, product_name="Item", price_display="5.00", quantity=2)
     m = MagicMock()
     m.id = id
     m.quantity = quantity
-    m.product = MagicMock()
-    m.product.name = product_name
-    m.product.price_display = price_display
+    m.name = product_name
+    m.price_display = price_display
     return m
 
 
@@ -108,6 +110,13 @@ class TestCallbackData:
         assert unpacked.action == "cancel"
         assert unpacked.order_id == 50
 
+    def test_page_cbs(self):
+        assert RestaurantPageCB.unpack(RestaurantPageCB(after=8).pack()).after == 8
+        unpacked = ProductPageCB.unpack(
+            ProductPageCB(restaurant_id=1, category_id=2, before=30).pack()
+        )
+        assert (unpacked.category_id, unpacked.after, unpacked.before) == (2, 0, 30)
+
 
 class TestKeyboardBuilders:
     def test_restaurants_keyboard(self):
@@ -120,6 +129,22 @@ class TestKeyboardBuilders:
         kb = restaurants_keyboard([])
         assert len(kb.inline_keyboard) == 0
 
+    def test_restaurants_keyboard_paged(self):
+        restaurants = [_mock_restaurant(9, "R9"), _mock_restaurant(12, "R12")]
+        kb = restaurants_keyboard(restaurants, has_prev=True, has_next=True)
+        nav = kb.inline_keyboard[-1]
+        assert [b.text for b in nav] == ["< Prev", "Next >"]
+        assert RestaurantPageCB.unpack(nav[0].callback_data).before == 9
+        assert RestaurantPageCB.unpack(nav[1].callback_data).after == 12
+
+    def test_categories_keyboard_paged(self):
+        categories = [_mock_category(3, "Cat3")]
+        kb = categories_keyboard(categories, restaurant_id=7, has_next=True)
+        # 1 category + next button + back button
+        assert len(kb.inline_keyboard) == 3
+        cb = CategoryPageCB.unpack(kb.inline_keyboard[1][0].callback_data)
+        assert (cb.restaurant_id, cb.after) == (7, 3)
+
     def test_categories_keyboard(self):
         categories = [_mock_category(1, "Cat1"), _mock_category(2, "Cat2")]
         kb = categories_keyboard(categories, restaurant_id=1)
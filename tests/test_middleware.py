@@ -1,8 +1,22 @@
+import asyncio
 from unittest.mock import AsyncMock, MagicMock
 
-from sqlalchemy.ext.asyncio import AsyncSession
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.dispatcher.event.handler import HandlerObject
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
-from app.middlewares.db import DbSessionMiddleware
+from app.bot import create_bot
+from app.config import Settings
+from app.handlers import menu
+from app.middlewares.db import READ_ONLY, CommitBeforeRequestMiddleware, DbSessionMiddleware
+from app.outbound import OutboundLimiter
+from app.services.user import UserService
+from database.engine import init_db
+from database.instrumentation import instrument_query_counter
 
 
 async def test_db_session_middleware(session_factory):
@@ -18,3 +32,112 @@ async def test_db_session_middleware(session_factory):
     assert "session" in data
     assert isinstance(data["session"], AsyncSession)
     handler.assert_awaited_once()
+
+
+async def test_read_only_handler_uses_read_factory(engine):
+    primary = async_sessionmaker(engine, info={"role": "primary"})
+    replica = async_sessionmaker(engine, info={"role": "replica"})
+    middleware = DbSessionMiddleware(primary, replica)
+
+    async def handler(event, data):
+        return data["session"].info["role"]
+
+    read_only = {"handler": HandlerObject(callback=handler, flags=READ_ONLY)}
+    writing = {"handler": HandlerObject(callback=handler)}
+
+    assert await middleware(handler, MagicMock(), read_only) == "replica"
+    assert await middleware(handler, MagicMock(), writing) == "primary"
+    assert await DbSessionMiddleware(primary)(handler, MagicMock(), read_only) == "primary"
+
+
+def test_catalog_handlers_are_read_only():
+    flagged = {
+        handler.callback.__name__
+        for observer in (menu.router.message, menu.router.callback_query)
+        for handler in observer.handlers
+        if handler.flags.get("read_only")
+    }
+    assert {"cmd_menu", "show_categories", "show_products", "show_product_detail"} <= flagged
+    assert "add_to_cart" not in flagged
+
+
+async def test_queries_counted_per_handler(engine, session_factory, caplog):
+    instrument_query_counter(engine)
+    middleware = DbSessionMiddleware(session_factory, query_budget=2)
+
+    async def chatty_handler(event, data):
+        for _ in range(3):
+            await data["session"].execute(text("SELECT 1"))
+
+    async def quiet_handler(event, data):
+        await data["session"].execute(text("SELECT 1"))
+
+    with caplog.at_level("DEBUG", logger="database.instrumentation"):
+        for handler in (chatty_handler, quiet_handler):
+            data = {"handler": HandlerObject(callback=handler)}
+            await middleware(handler, MagicMock(), data)
+
+    warnings = [r.getMessage() for r in caplog.records if r.levelname == "WARNING"]
+    assert len(warnings) == 1
+    assert warnings[0].startswith("Query budget of 2 exceeded by chatty_handler: 3 queries")
+    assert any(r.getMessage().startswith("quiet_handler: 1 queries") for r in caplog.records)
+
+
+async def test_update_is_one_transaction(session_factory):
+    async def handler(event, data):
+        await UserService(data["session"]).get_or_create(telegram_id=1, first_name="A")
+        raise RuntimeError("handler failed")
+
+    for use_unit_of_work, expected in ((True, None), (False, "A")):
+        middleware = DbSessionMiddleware(session_factory, use_unit_of_work=use_unit_of_work)
+        with pytest.raises(RuntimeError):
+            await middleware(handler, MagicMock(), {})
+        async with session_factory() as session:
+            user = await UserService(session).get_by_telegram_id(1)
+            assert (user and user.first_name) == expected
+
+
+async def test_writes_are_committed_before_paced_sends(api, tmp_path):
+    # A short busy timeout: a writer blocked behind the handler fails fast.
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'bot.db'}", connect_args={"timeout": 0.2}
+    )
+    await init_db(engine)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api.url))
+    session.middleware(CommitBeforeRequestMiddleware())
+    session.middleware(OutboundLimiter(chat_rate=2, chat_burst=1))
+    bot = Bot(token="123456:TEST", session=session)
+    first_sent = asyncio.Event()
+
+    async def handler(event, data):
+        await UserService(data["session"]).get_or_create(telegram_id=1, first_name="A")
+        await bot.send_message(1, "first")
+        first_sent.set()
+        await bot.send_message(1, "second")  # paced: waits for the chat's next token
+        await UserService(data["session"]).get_or_create(telegram_id=3, first_name="C")
+
+    middleware = DbSessionMiddleware(factory, use_unit_of_work=True)
+    update = asyncio.create_task(middleware(handler, MagicMock(), {}))
+    await first_sent.wait()
+    async with factory() as other:
+        await UserService(other).get_or_create(telegram_id=2, first_name="B")
+    assert not update.done()
+    await update
+
+    async with factory() as check:
+        service = UserService(check)
+        for telegram_id in (1, 2, 3):
+            assert await service.get_by_telegram_id(telegram_id) is not None
+    assert api.texts() == ["first", "second"]
+    await bot.session.close()
+    await engine.dispose()
+
+
+def test_create_bot_commits_before_requests():
+    middleware = create_bot(Settings(bot_token="123456:TEST")).session.middleware
+    assert isinstance(middleware[0], CommitBeforeRequestMiddleware)
+    middleware = create_bot(
+        Settings(bot_token="123456:TEST", database_unit_of_work=False)
+    ).session.middleware
+    assert not any(isinstance(m, CommitBeforeRequestMiddleware) for m in middleware)
@@ -81,7 +81,7 @@ async def test_cart_item_subtotal(session):
     cart_item = CartItem(user_id=user.id, product_id=product.id, quantity=3)
     session.add(cart_item)
     await session.commit()
-    await session.refresh(cart_item)
+    await session.refresh(cart_item, ["product"])
 
     assert cart_item.subtotal == 1500
 
@@ -0,0 +1,179 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from sqlalchemy import select
+
+from app.config import Settings
+from app.models.base import utcnow
+from app.models.order import Order, OrderEvent, OrderStatus
+from app.models.restaurant import Restaurant
+from app.models.user import User
+from app.notifications import OrderNotifier, start_order_notifier
+from app.services.order import OrderService
+from database.writer import unit_of_work
+
+TELEGRAM_ID = 100500
+
+
+@pytest.fixture
+async def order(session) -> Order:
+    user = User(telegram_id=TELEGRAM_ID, first_name="Test")
+    restaurant = Restaurant(name="Test Restaurant")
+    session.add_all([user, restaurant])
+    await session.flush()
+    order = Order(
+        user_id=user.id,
+        restaurant_id=restaurant.id,
+        total=899,
+        delivery_address="Main st",
+        phone="+1",
+    )
+    session.add(order)
+    await session.commit()
+    return order
+
+
+@pytest.fixture
+async def bot(api):
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api.url))
+    bot = Bot(token="123456:TEST", session=session)
+    yield bot
+    await bot.session.close()
+
+
+async def events(session_factory) -> list[OrderEvent]:
+    async with session_factory() as session:
+        return list(await session.scalars(select(OrderEvent).order_by(OrderEvent.id)))
+
+
+class TestOrderEvents:
+    async def test_status_change_writes_event(self, session, session_factory, order):
+        service = OrderService(session)
+        await service.update_status(order.id, OrderStatus.CONFIRMED)
+        await service.update_status(order.id, OrderStatus.CONFIRMED)
+        await service.update_status(order.id, OrderStatus.PREPARING)
+
+        written = await events(session_factory)
+        assert [(e.order_id, e.status) for e in written] == [
+            (order.id, OrderStatus.CONFIRMED),
+            (order.id, OrderStatus.PREPARING),
+        ]
+        assert all(e.available_at <= utcnow() and e.attempts == 0 for e in written)
+
+    async def test_no_event_when_notifications_are_off(self, session, session_factory, order):
+        await OrderService(session, notify_customers=False).update_status(
+            order.id, OrderStatus.CONFIRMED
+        )
+
+        assert await events(session_factory) == []
+        async with session_factory() as session:
+            assert (await session.get(Order, order.id)).status == OrderStatus.CONFIRMED
+
+    async def test_event_rolls_back_with_status(self, session_factory, order):
+        with pytest.raises(RuntimeError):
+            async with unit_of_work(session_factory) as session:
+                await OrderService(session).update_status(order.id, OrderStatus.CONFIRMED)
+                raise RuntimeError("handler failed")
+
+        assert await events(session_factory) == []
+        async with session_factory() as session:
+            assert (await session.get(Order, order.id)).status == OrderStatus.PENDING
+
+
+class TestOrderNotifier:
+    async def test_delivers_in_order_and_deletes(self, session, session_factory, order, api, bot):
+        service = OrderService(session)
+        await service.update_status(order.id, OrderStatus.CONFIRMED)
+        await service.update_status(order.id, OrderStatus.PREPARING)
+
+        notifier = OrderNotifier(bot, session_factory)
+        assert await notifier.run_once() == 2
+
+        assert [(method, chat_id) for method, chat_id, *_ in api.calls] == [
+            ("sendMessage", str(TELEGRAM_ID)),
+            ("sendMessage", str(TELEGRAM_ID)),
+        ]
+        assert "Confirmed" in api.texts()[0]
+        assert "Preparing" in api.texts()[1]
+        assert await events(session_factory) == []
+        assert notifier.delivered == 2
+
+    async def test_failed_send_is_retried_later(self, session, session_factory, order, api, bot):
+        service = OrderService(session)
+        await service.update_status(order.id, OrderStatus.CONFIRMED)
+        await service.update_status(order.id, OrderStatus.PREPARING)
+        api.errors.append(500)
+
+        notifier = OrderNotifier(bot, session_factory, retry_delay=30)
+        assert await notifier.run_once() == 2
+        assert api.calls == []
+
+        failed, held = await events(session_factory)
+        assert failed.attempts == 1
+        assert "Internal Server Error" in failed.last_error
+        assert failed.available_at > utcnow()
+        # The later status waits behind the failed one, without using an attempt.
+        assert held.attempts == 0
+        assert held.available_at == failed.available_at
+        assert await notifier.run_once() == 0
+
+    async def test_blocked_customer_is_given_up(self, session, session_factory, order, api, bot):
+        service = OrderService(session)
+        await service.update_status(order.id, OrderStatus.CONFIRMED)
+        await service.update_status(order.id, OrderStatus.PREPARING)
+        api.errors.append(403)
+
+        notifier = OrderNotifier(bot, session_factory)
+        await notifier.run_once()
+
+        (given_up,) = await events(session_factory)
+        assert given_up.status == OrderStatus.CONFIRMED
+        assert given_up.available_at is None
+        assert "blocked" in given_up.last_error
+        assert len(api.calls) == 1
+
+    async def test_background_delivery(self, session, session_factory, order, api, bot):
+        # The in-memory test database has one connection, so write before starting.
+        await OrderService(session).update_status(order.id, OrderStatus.DELIVERING)
+        notifier = start_order_notifier(
+            bot, session_factory, Settings(order_notifications_poll_interval=0.01)
+        )
+        for _ in range(200):
+            if api.calls:
+                break
+            await asyncio.sleep(0.01)
+        await notifier.stop()
+
+        assert "Delivering" in api.texts()[0]
+        assert await events(session_factory) == []
+
+    async def test_purges_old_given_up_events(self, session, session_factory, order, bot):
+        old = utcnow() - timedelta(days=8)
+        session.add_all([
+            OrderEvent(order_id=order.id, status=OrderStatus.CONFIRMED, created_at=old),
+            OrderEvent(order_id=order.id, status=OrderStatus.PREPARING),
+            OrderEvent(
+                order_id=order.id,
+                status=OrderStatus.DELIVERING,
+                created_at=old,
+                available_at=utcnow(),
+            ),
+        ])
+        await session.commit()
+
+        notifier = OrderNotifier(bot, session_factory, retention=7 * 86400)
+        assert await notifier.purge() == 1
+
+        # Recently given-up and still pending events are kept.
+        assert [e.status for e in await events(session_factory)] == [
+            OrderStatus.PREPARING,
+            OrderStatus.DELIVERING,
+        ]
+
+    def test_disabled_in_settings(self, bot, session_factory):
+        config = Settings(order_notifications=False)
+        assert start_order_notifier(bot, session_factory, config) is None
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.bot import create_bot
+from app.config import Settings
+from app.outbound import OutboundLimiter, Priority, outbound_priority
+
+
+@pytest.fixture
+async def make_bot(api):
+    bots = []
+
+    def make(limiter: OutboundLimiter) -> Bot:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(api.url))
+        session.middleware(limiter)
+        bot = Bot(token="123456:TEST", session=session)
+        bots.append(bot)
+        return bot
+
+    yield make
+    for bot in bots:
+        await bot.session.close()
+
+
+class TestOutboundLimiter:
+    async def test_chat_is_paced_in_order(self, api, make_bot):
+        bot = make_bot(OutboundLimiter(global_rate=1000, chat_rate=20, chat_burst=1))
+        await asyncio.gather(*(bot.send_message(1, str(i)) for i in range(4)))
+
+        assert api.texts() == ["0", "1", "2", "3"]
+        times = [sent for *_, sent in api.calls]
+        assert all(b - a >= 0.04 for a, b in zip(times, times[1:]))
+
+    async def test_chats_are_paced_independently(self, api, make_bot):
+        bot = make_bot(OutboundLimiter(global_rate=1000, chat_rate=1, chat_burst=1))
+        started = time.monotonic()
+        await asyncio.gather(*(bot.send_message(chat_id, "hi") for chat_id in range(1, 6)))
+        assert time.monotonic() - started < 0.5
+
+    async def test_interactive_goes_before_bulk(self, api, make_bot):
+        limiter = OutboundLimiter(global_rate=20, chat_rate=1000, chat_burst=1)
+        bot = make_bot(limiter)
+
+        async def bulk(chat_id: int) -> None:
+            with outbound_priority(Priority.BULK):
+                await bot.send_message(chat_id, "bulk")
+
+        bulk_sends = [asyncio.create_task(bulk(chat_id)) for chat_id in range(1, 31)]
+        await asyncio.sleep(0.01)
+        assert limiter.stats.bulk_queued > 0
+        await bot.send_message(999, "reply")
+        await asyncio.gather(*bulk_sends)
+
+        # The first 20 went out as the global burst; the reply beat the other 10.
+        assert api.texts().index("reply") == 20
+        assert limiter.stats.sent == 31
+        assert limiter.stats.bulk_queued == limiter.stats.interactive_queued == 0
+
+    async def test_retry_after_is_rescheduled(self, api, make_bot):
+        limiter = OutboundLimiter()
+        bot = make_bot(limiter)
+        api.errors.append(429)
+        started = time.monotonic()
+        message = await bot.send_message(1, "hi")
+
+        assert message.text == "hi"
+        assert time.monotonic() - started >= 1
+        assert limiter.stats.retried == 1
+        assert limiter.stats.sent == 1
+
+    async def test_retry_after_pauses_only_its_chat(self, api, make_bot):
+        limiter = OutboundLimiter()
+        bot = make_bot(limiter)
+        api.errors.append(429)
+        flooded = asyncio.create_task(bot.send_message(1, "a"))
+        while api.errors:
+            await asyncio.sleep(0.01)
+
+        started = time.monotonic()
+        await bot.send_message(2, "b")
+        assert time.monotonic() - started < 0.5
+        assert not flooded.done()
+        await flooded
+        assert api.texts() == ["b", "a"]
+
+    async def test_retry_after_without_chat_pauses_all_chats(self, api, make_bot):
+        limiter = OutboundLimiter()
+        bot = make_bot(limiter)
+        api.errors.append(429)
+        flooded = asyncio.create_task(bot.answer_callback_query("1"))
+        while api.errors:
+            await asyncio.sleep(0.01)
+
+        started = time.monotonic()
+        await bot.send_message(2, "b")
+        assert time.monotonic() - started >= 0.8
+        assert await flooded
+        assert limiter.stats.retried == 1
+
+    async def test_gives_up_after_max_retries(self, api, make_bot):
+        bot = make_bot(OutboundLimiter(max_retries=0))
+        api.errors.append(429)
+        with pytest.raises(TelegramRetryAfter):
+            await bot.send_message(1, "hi")
+
+    async def test_calls_without_chat_are_not_paced(self, api, make_bot):
+        limiter = OutboundLimiter(global_rate=1)
+        bot = make_bot(limiter)
+        started = time.monotonic()
+        for i in range(5):
+            await bot.answer_callback_query(str(i))
+        assert time.monotonic() - started < 0.5
+        assert limiter.stats.sent == 0
+
+
+def test_create_bot_installs_limiter():
+    bot = create_bot(Settings(bot_token="123456:TEST"))
+    assert any(isinstance(m, OutboundLimiter) for m in bot.session.middleware)
+    bot = create_bot(Settings(bot_token="123456:TEST", outbound_rate_limit=False))
+    assert not any(isinstance(m, OutboundLimiter) for m in bot.session.middleware)
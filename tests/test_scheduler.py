@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import Message, Update
+
+from app.bot import create_dispatcher
+from app.config import Settings
+from app.scheduler import ScheduledDispatcher, UpdateScheduler
+from tests.conftest import make_update
+
+
+@pytest.fixture
+def bot():
+    return Bot(token="123456:TEST")
+
+
+def recording_dispatcher(concurrency: int, delay: float = 0.01):
+    """A scheduled dispatcher whose handler logs start and end per update."""
+    dp = ScheduledDispatcher(scheduler=UpdateScheduler(concurrency))
+    events: list[tuple[str, int, str]] = []
+    running = 0
+    peak = [0]
+    router = Router()
+
+    @router.message()
+    async def record(message: Message) -> None:
+        nonlocal running
+        running += 1
+        peak[0] = max(peak[0], running)
+        events.append(("start", message.chat.id, message.text))
+        await asyncio.sleep(delay)
+        events.append(("end", message.chat.id, message.text))
+        running -= 1
+
+    dp.include_router(router)
+    return dp, events, peak
+
+
+async def feed_all(dp: Dispatcher, bot: Bot, updates: list[Update]) -> None:
+    # Like polling with handle_as_tasks: one task per update, in arrival order.
+    await asyncio.gather(*(dp.feed_update(bot, update) for update in updates))
+
+
+class TestUpdateScheduler:
+    async def test_same_chat_runs_sequentially_in_order(self, bot):
+        dp, events, peak = recording_dispatcher(concurrency=4)
+        await feed_all(dp, bot, [make_update(i, str(i), chat_id=1) for i in range(5)])
+
+        assert peak[0] == 1
+        assert [text for kind, _, text in events if kind == "start"] == list("01234")
+        for i in range(0, len(events), 2):
+            assert events[i][0] == "start" and events[i + 1][0] == "end"
+
+    async def test_different_chats_run_in_parallel(self, bot):
+        dp, _, peak = recording_dispatcher(concurrency=4)
+        await feed_all(dp, bot, [make_update(i, "hi", chat_id=i) for i in range(4)])
+        assert peak[0] == 4
+
+    async def test_concurrency_is_bounded(self, bot):
+        dp, _, peak = recording_dispatcher(concurrency=2)
+        await feed_all(dp, bot, [make_update(i, "hi", chat_id=i) for i in range(6)])
+
+        assert peak[0] == 2
+        stats = dp.scheduler.stats
+        assert stats.processed == 6
+        assert stats.queued == stats.running == 0
+        assert stats.peak_queued >= 4
+        assert stats.max_wait > 0
+        assert dp.scheduler._chats == {}
+
+    async def test_fsm_steps_see_previous_state(self, bot):
+        class Checkout(StatesGroup):
+            address = State()
+            phone = State()
+
+        dp = ScheduledDispatcher(scheduler=UpdateScheduler(4))
+        seen: list[str] = []
+        router = Router()
+
+        @router.message(F.text == "checkout")
+        async def start(message: Message, state: FSMContext) -> None:
+            await asyncio.sleep(0.01)
+            await state.set_state(Checkout.address)
+
+        @router.message(Checkout.address)
+        async def address(message: Message, state: FSMContext) -> None:
+            seen.append("address")
+            await state.set_state(Checkout.phone)
+
+        @router.message(Checkout.phone)
+        async def phone(message: Message, state: FSMContext) -> None:
+            seen.append("phone")
+            await state.clear()
+
+        dp.include_router(router)
+        await feed_all(
+            dp,
+            bot,
+            [
+                make_update(1, "checkout", chat_id=7),
+                make_update(2, "Main st", chat_id=7),
+                make_update(3, "+1", chat_id=7),
+            ],
+        )
+        assert seen == ["address", "phone"]
+
+    async def test_cancelled_waiter_releases_its_place(self):
+        scheduler = UpdateScheduler(1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot(1):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert scheduler.stats.queued == 1
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert scheduler.stats.queued == 0
+        release.set()
+        await holder
+
+        async with scheduler.slot(1):
+            pass
+        assert scheduler.stats.processed == 2
+        assert scheduler._chats == {}
+
+    def test_create_dispatcher_follows_settings(self):
+        dp = create_dispatcher(Settings(update_concurrency=3))
+        assert isinstance(dp, ScheduledDispatcher)
+        assert dp.scheduler.concurrency == 3
+        assert type(create_dispatcher(Settings(update_concurrency=0))) is Dispatcher
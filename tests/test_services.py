@@ -1,14 +1,25 @@
+import asyncio
+
 import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError, InvalidRequestError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
+from app.models.base import Base
+from app.models.cart import CartItem
 from app.models.category import Category
-from app.models.order import OrderStatus
+from app.models.order import Order, OrderStatus
 from app.models.product import Product
 from app.models.restaurant import Restaurant
 from app.models.user import User
-from app.services.cart import CartService
+from app.services.cart import CartOperation, CartProductError, CartService
+from app.services.catalog_cache import CatalogCache, catalog_cache
+from app.services.checkout import CheckoutService
+from app.services.loaders import MENU, loader_options
 from app.services.order import OrderService
 from app.services.restaurant import RestaurantService
 from app.services.user import UserService
+from database.writer import commit_unit_of_work, unit_of_work
 
 
 @pytest.fixture
@@ -105,6 +116,23 @@ class TestRestaurantService:
         assert len(active) == 1
         assert active[0].name == "Active One"
 
+    async def test_get_all_active_is_one_query(
+        self, session, assert_queries, sample_restaurant, sample_product
+    ):
+        session.expire_all()
+        with assert_queries(1):
+            active = await RestaurantService(session).get_all_active()
+
+        assert [r.id for r in active] == [sample_restaurant.id]
+        with pytest.raises(InvalidRequestError):
+            active[0].categories
+
+    async def test_get_product_loads_category(self, session, sample_category, sample_product):
+        product_id, restaurant_id = sample_product.id, sample_category.restaurant_id
+        session.expire_all()
+        product = await RestaurantService(session).get_product(product_id)
+        assert product.category.restaurant_id == restaurant_id
+
     async def test_get_by_id(self, session, sample_restaurant):
         service = RestaurantService(session)
         r = await service.get_by_id(sample_restaurant.id)
@@ -124,7 +152,7 @@ class TestRestaurantService:
 
     async def test_get_menu(self, session, sample_restaurant, sample_category, sample_product):
         restaurant_id = sample_restaurant.id
-        # Expire all to force fresh load with selectinload
+        # Expire all to force a fresh load through the menu profile
         session.expire_all()
         service = RestaurantService(session)
         menu = await service.get_menu(restaurant_id)
@@ -132,6 +160,150 @@ class TestRestaurantService:
         assert menu[0].name == "Pizza"
         assert len(menu[0].products) == 1
 
+    async def test_get_menu_views(
+        self, session, sample_restaurant, sample_category, sample_product
+    ):
+        service = RestaurantService(session)
+        empty = await service.create_category("Drinks", sample_restaurant.id)
+        menu = await service.get_menu_views(sample_restaurant.id)
+        assert [(c.id, c.name) for c in menu] == [
+            (sample_category.id, "Pizza"),
+            (empty.id, "Drinks"),
+        ]
+        assert [p.name for p in menu[0].products] == ["Margherita"]
+        assert menu[0].products[0].price_display == "8.99"
+        assert menu[1].products == []
+
+    async def test_catalog_screens_are_one_query_each(
+        self, session, assert_queries, sample_restaurant, sample_category, sample_product
+    ):
+        service = RestaurantService(session)
+        with assert_queries(1):
+            await service.get_menu_views(sample_restaurant.id)
+        with assert_queries(1):
+            await service.get_category_with_available_products(
+                sample_category.id, sample_restaurant.id
+            )
+        with assert_queries(1):
+            await service.get_product_detail(sample_product.id)
+
+    async def test_get_restaurant_views(self, session, sample_restaurant):
+        service = RestaurantService(session)
+        await service.create_restaurant("Closed")
+        closed = await service.create_restaurant("Hidden")
+        closed.is_active = False
+        await session.commit()
+        views = await service.get_restaurant_views()
+        assert [v.name for v in views] == [sample_restaurant.name, "Closed"]
+
+    async def test_get_active_page(self, session):
+        service = RestaurantService(session)
+        ids = [(await service.create_restaurant(f"R{i}")).id for i in range(5)]
+
+        first = await service.get_active_page(limit=2)
+        assert [r.id for r in first.items] == ids[:2]
+        assert (first.has_prev, first.has_next) == (False, True)
+
+        last = await service.get_active_page(after=ids[3], limit=2)
+        assert [r.id for r in last.items] == ids[4:]
+        assert (last.has_prev, last.has_next) == (True, False)
+
+        back = await service.get_active_page(before=ids[4], limit=2)
+        assert [r.id for r in back.items] == ids[2:4]
+        assert (back.has_prev, back.has_next) == (True, True)
+
+    async def test_get_categories_page(self, session, sample_restaurant, sample_category):
+        page = await RestaurantService(session).get_categories_page(sample_restaurant.id)
+        assert [c.name for c in page.items] == ["Pizza"]
+        assert not page.has_next
+
+    async def test_get_restaurant_header(self, session, sample_restaurant):
+        service = RestaurantService(session)
+        header = await service.get_restaurant_header(sample_restaurant.id)
+        assert (header.name, header.description) == ("Test Restaurant", "Desc")
+        assert await service.get_restaurant_header(9999) is None
+
+    async def test_get_restaurant_with_categories(
+        self, session, sample_restaurant, sample_category
+    ):
+        service = RestaurantService(session)
+        restaurant_id = sample_restaurant.id
+        more = [await service.create_category(f"C{i}", restaurant_id) for i in range(2)]
+        ids = [sample_category.id] + [c.id for c in more]
+
+        restaurant, page = await service.get_restaurant_with_categories(restaurant_id, limit=2)
+        assert (restaurant.name, restaurant.description) == ("Test Restaurant", "Desc")
+        assert [c.id for c in page.items] == ids[:2]
+        assert (page.has_prev, page.has_next) == (False, True)
+
+        _, page = await service.get_restaurant_with_categories(
+            restaurant_id, after=ids[1], limit=2
+        )
+        assert [c.id for c in page.items] == ids[2:]
+        assert (page.has_prev, page.has_next) == (True, False)
+
+        _, page = await service.get_restaurant_with_categories(
+            restaurant_id, before=ids[2], limit=1
+        )
+        assert [c.id for c in page.items] == ids[1:2]
+        assert (page.has_prev, page.has_next) == (True, True)
+
+        assert await service.get_restaurant_with_categories(9999) is None
+
+    async def test_get_restaurant_with_categories_empty(self, session, sample_restaurant):
+        found = await RestaurantService(session).get_restaurant_with_categories(
+            sample_restaurant.id
+        )
+        assert found is not None
+        assert found[1].items == []
+
+    async def test_get_category_with_available_products(
+        self, session, sample_restaurant, sample_category, sample_product
+    ):
+        service = RestaurantService(session)
+        hidden = await service.create_product("Hidden", 100, sample_category.id)
+        await service.set_product_availability(hidden.id, False)
+        extra = [
+            (await service.create_product(f"Extra {i}", 100, sample_category.id)).id
+            for i in range(2)
+        ]
+
+        category, page = await service.get_category_with_available_products(
+            sample_category.id, sample_restaurant.id, limit=2
+        )
+        assert category.name == "Pizza"
+        assert [p.id for p in page.items] == [sample_product.id, extra[0]]
+        assert page.items[0].price_display == "8.99"
+        assert (page.has_prev, page.has_next) == (False, True)
+
+        _, page = await service.get_category_with_available_products(
+            sample_category.id, sample_restaurant.id, after=extra[0], limit=2
+        )
+        assert [p.id for p in page.items] == [extra[1]]
+        assert (page.has_prev, page.has_next) == (True, False)
+
+        _, page = await service.get_category_with_available_products(
+            sample_category.id, sample_restaurant.id, before=extra[1], limit=1
+        )
+        assert [p.id for p in page.items] == [extra[0]]
+        assert (page.has_prev, page.has_next) == (True, True)
+
+    async def test_get_category_with_available_products_empty(
+        self, session, sample_restaurant, sample_category
+    ):
+        service = RestaurantService(session)
+        category, page = await service.get_category_with_available_products(
+            sample_category.id, sample_restaurant.id
+        )
+        assert category.id == sample_category.id
+        assert page.items == []
+
+    async def test_get_category_with_available_products_wrong_restaurant(
+        self, session, sample_category
+    ):
+        service = RestaurantService(session)
+        assert await service.get_category_with_available_products(sample_category.id, 9999) is None
+
     async def test_get_product(self, session, sample_product):
         service = RestaurantService(session)
         p = await service.get_product(sample_product.id)
@@ -143,6 +315,14 @@ class TestRestaurantService:
         p = await service.get_product(9999)
         assert p is None
 
+    async def test_get_product_detail(self, session, sample_category, sample_product):
+        service = RestaurantService(session)
+        detail = await service.get_product_detail(sample_product.id)
+        assert detail.name == "Margherita"
+        assert detail.category_id == sample_category.id
+        assert detail.restaurant_id == sample_category.restaurant_id
+        assert await service.get_product_detail(9999) is None
+
     async def test_create_product(self, session, sample_category):
         service = RestaurantService(session)
         p = await service.create_product(
@@ -151,6 +331,67 @@ class TestRestaurantService:
         assert p.id is not None
         assert p.price == 1099
 
+    async def test_set_product_availability(self, session, sample_product):
+        service = RestaurantService(session)
+        p = await service.set_product_availability(sample_product.id, False)
+        assert p is not None
+        assert p.is_available is False
+
+    async def test_set_product_availability_not_found(self, session):
+        service = RestaurantService(session)
+        assert await service.set_product_availability(9999, False) is None
+
+    async def test_writes_invalidate_catalog_cache(self, session, sample_category):
+        service = RestaurantService(session)
+        catalog_cache.set_menu(1, b"[]", catalog_cache.version)
+        product = await service.create_product(
+            name="Pepperoni", price=1099, category_id=sample_category.id
+        )
+        assert catalog_cache.get_menu(1) is None
+
+        catalog_cache.set_menu(1, b"[]", catalog_cache.version)
+        await service.set_product_availability(product.id, False)
+        assert catalog_cache.get_menu(1) is None
+
+
+# ---- CatalogCache ----
+
+
+class TestCatalogCache:
+    def test_set_and_get(self):
+        cache = CatalogCache()
+        cache.set_menu(1, b"[1]", cache.version)
+        assert cache.get_menu(1).body == b"[1]"
+        assert cache.get_menu(2) is None
+
+    def test_stale_version_not_stored(self):
+        cache = CatalogCache()
+        version = cache.version
+        cache.invalidate()
+        cache.set_menu(1, b"[1]", version)
+        assert cache.get_menu(1) is None
+
+    def test_bounded(self):
+        cache = CatalogCache(max_entries=2)
+        for restaurant_id in (1, 2, 3):
+            cache.set_menu(restaurant_id, b"[]", cache.version)
+        assert cache.get_menu(1) is None
+        assert cache.get_menu(3).body == b"[]"
+
+    def test_etag_follows_content(self):
+        cache = CatalogCache()
+        first = cache.set_menu(1, b"[1]", cache.version)
+        assert first.etag.startswith('"') and first.etag.endswith('"')
+        assert cache.set_menu(2, b"[1]", cache.version).etag == first.etag
+        assert cache.set_menu(3, b"[2]", cache.version).etag != first.etag
+
+    def test_invalidate_drops_restaurants(self):
+        cache = CatalogCache()
+        cache.set_restaurants(b"[]", cache.version)
+        assert cache.get_restaurants() is not None
+        cache.invalidate()
+        assert cache.get_restaurants() is None
+
 
 # ---- CartService ----
 
@@ -168,6 +409,62 @@ class TestCartService:
         item = await service.add_item(sample_user.id, sample_product.id, 2)
         assert item.quantity == 3
 
+    async def test_add_item_is_one_statement(
+        self, session, assert_queries, sample_user, sample_product
+    ):
+        user_id, product_id = sample_user.id, sample_product.id
+        service = CartService(session)
+        with assert_queries(1):
+            item = await service.add_item(user_id, product_id, 1)
+        with assert_queries(1):
+            item = await service.add_item(user_id, product_id, 2)
+        assert (item.product_id, item.quantity) == (product_id, 3)
+
+    async def test_add_item_rejects_unavailable_product(self, session, sample_user, sample_product):
+        user_id, product_id = sample_user.id, sample_product.id
+        await RestaurantService(session).set_product_availability(product_id, False)
+        service = CartService(session)
+        with pytest.raises(CartProductError) as excinfo:
+            await service.add_item(user_id, product_id, 1)
+        assert excinfo.value.unavailable == [product_id]
+        assert await service.get_items(user_id) == []
+
+    async def test_add_item_rejects_unknown_product(self, session, sample_user):
+        user_id = sample_user.id
+        service = CartService(session)
+        with pytest.raises(CartProductError) as excinfo:
+            await service.add_item(user_id, 9999, 1)
+        assert excinfo.value.missing == [9999]
+        assert await service.get_items(user_id) == []
+
+    async def test_concurrent_adds_single_row(self, tmp_path):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cart.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with factory() as session:
+            user = await UserService(session).get_or_create(telegram_id=1, first_name="A")
+            service = RestaurantService(session)
+            restaurant = await service.create_restaurant("R")
+            category = await service.create_category("C", restaurant.id)
+            product = await service.create_product("P", 100, category.id)
+
+        async def add_one():
+            async with factory() as session:
+                await CartService(session).add_item(user.id, product.id, 1)
+
+        await asyncio.gather(*(add_one() for _ in range(50)))
+
+        async with factory() as session:
+            rows = await session.execute(
+                select(func.count(), func.sum(CartItem.quantity)).where(
+                    CartItem.user_id == user.id
+                )
+            )
+            assert rows.one() == (1, 50)
+        await engine.dispose()
+
     async def test_get_items(self, session, sample_user, sample_product):
         service = CartService(session)
         await service.add_item(sample_user.id, sample_product.id, 2)
@@ -175,6 +472,16 @@ class TestCartService:
         assert len(items) == 1
         assert items[0].quantity == 2
 
+    async def test_get_lines(self, session, sample_user, sample_product):
+        service = CartService(session)
+        await service.add_item(sample_user.id, sample_product.id, 2)
+        lines = await service.get_lines(sample_user.id)
+        assert [(line.name, line.price, line.quantity) for line in lines] == [
+            ("Margherita", 899, 2)
+        ]
+        assert lines[0].subtotal == 899 * 2
+        assert lines[0].price_display == "8.99"
+
     async def test_get_items_empty(self, session, sample_user):
         service = CartService(session)
         items = await service.get_items(sample_user.id)
@@ -220,6 +527,122 @@ class TestCartService:
         items = await service.get_items(sample_user.id)
         assert len(items) == 0
 
+    async def test_apply_batch(self, session, sample_user, sample_category, sample_product):
+        other = await RestaurantService(session).create_product(
+            name="Water", price=99, category_id=sample_category.id
+        )
+        service = CartService(session)
+        items = await service.apply_batch(sample_user.id, [
+            CartOperation("add", product_id=sample_product.id),
+            CartOperation("add", product_id=sample_product.id, quantity=2),
+            CartOperation("add", product_id=other.id),
+            CartOperation("set", product_id=other.id, quantity=4),
+        ])
+        quantities = {item.product_id: item.quantity for item in items}
+        assert quantities == {sample_product.id: 3, other.id: 4}
+        assert [item.name for item in items] == ["Margherita", "Water"]
+
+    async def test_apply_batch_remove(self, session, sample_user, sample_product):
+        service = CartService(session)
+        item = await service.add_item(sample_user.id, sample_product.id, 1)
+        items = await service.apply_batch(sample_user.id, [
+            CartOperation("remove", item_id=item.id),
+        ])
+        assert items == []
+
+    async def test_apply_batch_add_then_remove_pending(
+        self, session, sample_user, sample_product
+    ):
+        service = CartService(session)
+        items = await service.apply_batch(sample_user.id, [
+            CartOperation("add", product_id=sample_product.id),
+            CartOperation("set", product_id=sample_product.id, quantity=0),
+        ])
+        assert items == []
+
+    async def test_apply_batch_ignores_other_users_items(
+        self, session, sample_user, sample_product
+    ):
+        other_user = await UserService(session).get_or_create(telegram_id=1, first_name="Eve")
+        service = CartService(session)
+        item = await service.add_item(other_user.id, sample_product.id, 1)
+        await service.apply_batch(sample_user.id, [CartOperation("remove", item_id=item.id)])
+        assert len(await service.get_items(other_user.id)) == 1
+
+    async def test_apply_batch_rejects_unknown_product(
+        self, session, sample_user, sample_product
+    ):
+        user_id = sample_user.id
+        service = CartService(session)
+        with pytest.raises(CartProductError) as excinfo:
+            await service.apply_batch(user_id, [
+                CartOperation("add", product_id=sample_product.id),
+                CartOperation("add", product_id=9999),
+            ])
+        assert (excinfo.value.missing, excinfo.value.unavailable) == ([9999], [])
+        assert await service.get_items(user_id) == []
+
+    async def test_apply_batch_rejects_unavailable_product(
+        self, session, sample_user, sample_product
+    ):
+        user_id, product_id = sample_user.id, sample_product.id
+        service = CartService(session)
+        item_id = (await service.add_item(user_id, product_id, 1)).id
+        await RestaurantService(session).set_product_availability(product_id, False)
+
+        with pytest.raises(CartProductError) as excinfo:
+            await service.apply_batch(user_id, [
+                CartOperation("set", product_id=product_id, quantity=3),
+            ])
+        assert (excinfo.value.missing, excinfo.value.unavailable) == ([], [product_id])
+
+        # Taking an unavailable product out of the cart still works.
+        items = await service.apply_batch(user_id, [CartOperation("remove", item_id=item_id)])
+        assert items == []
+
+    @pytest.mark.parametrize("op", ["add", "set"])
+    async def test_apply_batch_checks_product_of_unmatched_item(
+        self, session, sample_user, sample_product, op
+    ):
+        user_id, product_id = sample_user.id, sample_product.id
+        await RestaurantService(session).set_product_availability(product_id, False)
+        service = CartService(session)
+        for operation, missing, unavailable in (
+            (CartOperation(op, product_id=product_id, item_id=999), [], [product_id]),
+            (CartOperation(op, product_id=9999, item_id=999), [9999], []),
+        ):
+            with pytest.raises(CartProductError) as excinfo:
+                await service.apply_batch(user_id, [operation])
+            assert (excinfo.value.missing, excinfo.value.unavailable) == (missing, unavailable)
+        assert await service.get_items(user_id) == []
+
+    @pytest.mark.parametrize(
+        ("message", "calls"),
+        [
+            ("UNIQUE constraint failed: cart_items.user_id, cart_items.product_id", 2),
+            ('duplicate key value violates unique constraint "uq_cart_items_user_product"', 2),
+            ("FOREIGN KEY constraint failed", 1),
+        ],
+    )
+    async def test_apply_batch_retries_only_cart_line_conflicts(
+        self, session, sample_user, monkeypatch, message, calls
+    ):
+        attempts = []
+
+        async def apply(session, user_id, operations):
+            attempts.append(user_id)
+            if len(attempts) == 1:
+                raise IntegrityError("INSERT INTO cart_items", {}, Exception(message))
+            return []
+
+        monkeypatch.setattr(CartService, "_apply_batch", staticmethod(apply))
+        if calls == 1:
+            with pytest.raises(IntegrityError):
+                await CartService(session).apply_batch(sample_user.id, [])
+        else:
+            assert await CartService(session).apply_batch(sample_user.id, []) == []
+        assert len(attempts) == calls
+
     async def test_get_total(self, session, sample_user, sample_product):
         service = CartService(session)
         await service.add_item(sample_user.id, sample_product.id, 2)
@@ -290,6 +713,58 @@ class TestOrderService:
         orders = await service.get_user_orders(sample_user.id)
         assert len(orders) == 1
 
+    async def test_get_order_summaries_paginates(
+        self, session, sample_user, sample_restaurant, sample_product
+    ):
+        service = OrderService(session)
+        created = []
+        for _ in range(5):
+            items = await self._setup_cart(session, sample_user, sample_product)
+            order = await service.create_from_cart(
+                user_id=sample_user.id,
+                restaurant_id=sample_restaurant.id,
+                cart_items=items,
+                delivery_address="Addr",
+                phone="Phone",
+            )
+            created.append(order.id)
+
+        first, cursor = await service.get_order_summaries(sample_user.id, limit=2)
+        second, cursor2 = await service.get_order_summaries(
+            sample_user.id, limit=2, cursor=cursor
+        )
+        third, cursor3 = await service.get_order_summaries(
+            sample_user.id, limit=2, cursor=cursor2
+        )
+        seen = [o.id for o in first + second + third]
+        assert seen == sorted(created, reverse=True)
+        assert cursor3 is None
+        assert first[0].status == OrderStatus.PENDING
+        assert first[0].delivery_address == "Addr"
+
+    @pytest.mark.parametrize(
+        "cursor", ["bogus", "", "0", "-1", " 1", "+1", "1.5", "²", str(2**63), "9" * 23]
+    )
+    async def test_get_order_summaries_invalid_cursor(self, session, sample_user, cursor):
+        with pytest.raises(ValueError):
+            await OrderService(session).get_order_summaries(sample_user.id, cursor=cursor)
+
+    async def test_get_order_lines(
+        self, session, sample_user, sample_restaurant, sample_product
+    ):
+        items = await self._setup_cart(session, sample_user, sample_product)
+        service = OrderService(session)
+        order = await service.create_from_cart(
+            user_id=sample_user.id,
+            restaurant_id=sample_restaurant.id,
+            cart_items=items,
+            delivery_address="Addr",
+            phone="Phone",
+        )
+        lines = await service.get_order_lines([order.id, 9999])
+        assert [(line.name, line.quantity) for line in lines[order.id]] == [("Margherita", 2)]
+        assert lines[9999] == []
+
     async def test_get_active_orders(
         self, session, sample_user, sample_restaurant, sample_product
     ):
@@ -309,6 +784,45 @@ class TestOrderService:
         active = await service.get_active_orders(sample_user.id)
         assert len(active) == 0
 
+    async def test_get_active_summaries(
+        self, session, sample_user, sample_restaurant, sample_product
+    ):
+        items = await self._setup_cart(session, sample_user, sample_product)
+        service = OrderService(session)
+        order = await service.create_from_cart(
+            user_id=sample_user.id,
+            restaurant_id=sample_restaurant.id,
+            cart_items=items,
+            delivery_address="Addr",
+            phone="Phone",
+        )
+        assert [s.id for s in await service.get_active_summaries(sample_user.id)] == [order.id]
+
+        await service.update_status(order.id, OrderStatus.DELIVERED)
+        assert await service.get_active_summaries(sample_user.id) == []
+
+    async def test_get_order_detail(
+        self, session, assert_queries, sample_user, sample_restaurant, sample_product
+    ):
+        items = await self._setup_cart(session, sample_user, sample_product)
+        service = OrderService(session)
+        order = await service.create_from_cart(
+            user_id=sample_user.id,
+            restaurant_id=sample_restaurant.id,
+            cart_items=items,
+            delivery_address="Addr",
+            phone="Phone",
+            comment="Ring twice",
+        )
+        with assert_queries(2):
+            detail = await service.get_order_detail(order.id)
+        assert (detail.id, detail.phone, detail.comment) == (order.id, "Phone", "Ring twice")
+        assert detail.status_emoji == order.status_emoji
+        assert [(line.name, line.quantity, line.subtotal) for line in detail.lines] == [
+            ("Margherita", 2, 899 * 2)
+        ]
+        assert await service.get_order_detail(9999) is None
+
     async def test_update_status(
         self, session, sample_user, sample_restaurant, sample_product
     ):
@@ -387,5 +901,147 @@ class TestOrderService:
             delivery_address="Addr",
             phone="Phone",
         )
+        session.expire_all()
         pending = await service.get_all_pending()
         assert len(pending) == 1
+        assert pending[0].user.telegram_id == sample_user.telegram_id
+        assert [item.product.name for item in pending[0].items] == ["Margherita"]
+
+    async def test_summary_profile_does_not_load_items(
+        self, session, sample_user, sample_restaurant, sample_product
+    ):
+        await self._setup_cart(session, sample_user, sample_product)
+        user_id = sample_user.id
+        await CheckoutService(session).checkout(user_id, "Addr", "Phone")
+        session.expire_all()
+        orders = await OrderService(session).get_user_orders(user_id)
+        with pytest.raises(InvalidRequestError):
+            orders[0].items
+
+    def test_unknown_loader_profile(self):
+        with pytest.raises(ValueError):
+            loader_options(Order, MENU)
+
+
+# ---- CheckoutService ----
+
+
+class TestCheckoutService:
+    async def test_checkout(self, session, sample_user, sample_restaurant, sample_product):
+        await CartService(session).add_item(sample_user.id, sample_product.id, 2)
+
+        order = await CheckoutService(session).checkout(
+            user_id=sample_user.id,
+            delivery_address="1 Test St",
+            phone="+123",
+            comment="Ring twice",
+        )
+        assert order is not None
+        assert order.total == 899 * 2
+        assert order.restaurant_id == sample_restaurant.id
+        assert order.status == OrderStatus.PENDING
+        assert order.comment == "Ring twice"
+
+        fetched = await OrderService(session).get_by_id(order.id)
+        assert [(i.product_id, i.quantity, i.price) for i in fetched.items] == [
+            (sample_product.id, 2, 899)
+        ]
+        assert await CartService(session).get_items(sample_user.id) == []
+        user = await UserService(session).get_by_telegram_id(sample_user.telegram_id)
+        assert user.phone == "+123"
+        assert user.delivery_address == "1 Test St"
+
+    async def test_checkout_snapshots_price(self, session, sample_user, sample_product):
+        await CartService(session).add_item(sample_user.id, sample_product.id, 1)
+        order = await CheckoutService(session).checkout(sample_user.id, "Addr", "Phone")
+
+        sample_product.price = 1999
+        await session.commit()
+
+        fetched = await OrderService(session).get_by_id(order.id)
+        assert fetched.items[0].price == 899
+
+    async def test_checkout_empty_cart(self, session, sample_user):
+        order = await CheckoutService(session).checkout(sample_user.id, "Addr", "Phone")
+        assert order is None
+        user = await UserService(session).get_by_telegram_id(sample_user.telegram_id)
+        assert user.phone is None
+
+
+# ---- Unit of work ----
+
+
+class TestUnitOfWork:
+    async def test_checkout_commits_once(
+        self, engine, session_factory, sample_user, sample_product
+    ):
+        commits = []
+        event.listen(engine.sync_engine, "commit", lambda conn: commits.append(conn))
+        user_id, telegram_id = sample_user.id, sample_user.telegram_id
+        product_id = sample_product.id
+
+        async with unit_of_work(session_factory) as session:
+            await CartService(session).add_item(user_id, product_id, 2)
+            order = await CheckoutService(session).checkout(user_id, "Addr", "+1")
+            await UserService(session).update_contact(telegram_id, "+2", "Addr 2")
+
+        assert len(commits) == 1
+        async with session_factory() as session:
+            assert (await OrderService(session).get_order_detail(order.id)).total == 899 * 2
+            assert (await UserService(session).get_by_telegram_id(telegram_id)).phone == "+2"
+
+    async def test_error_rolls_back_every_write(self, session_factory, sample_user, sample_product):
+        user_id, product_id = sample_user.id, sample_product.id
+        with pytest.raises(RuntimeError):
+            async with unit_of_work(session_factory) as session:
+                await CartService(session).add_item(user_id, product_id, 1)
+                await OrderService(session).create_from_cart(
+                    user_id, 1, await CartService(session).get_items(user_id), "Addr", "+1"
+                )
+                raise RuntimeError("handler failed")
+
+        async with session_factory() as session:
+            assert await CartService(session).get_lines(user_id) == []
+            assert await session.scalar(select(func.count()).select_from(Order)) == 0
+
+    async def test_catalog_cache_invalidated_after_commit(self, session_factory, sample_category):
+        catalog_cache.set_menu(1, b"[]", catalog_cache.version)
+        async with unit_of_work(session_factory) as session:
+            await RestaurantService(session).create_product("Calzone", 999, sample_category.id)
+            assert catalog_cache.get_menu(1) is not None
+        assert catalog_cache.get_menu(1) is None
+
+        catalog_cache.set_menu(1, b"[]", catalog_cache.version)
+        with pytest.raises(RuntimeError):
+            async with unit_of_work(session_factory) as session:
+                await RestaurantService(session).create_product(
+                    "Stromboli", 999, sample_category.id
+                )
+                raise RuntimeError
+        assert catalog_cache.get_menu(1) is not None
+
+    async def test_commit_unit_of_work_commits_writes_so_far(
+        self, engine, session_factory, sample_category
+    ):
+        commits = []
+        event.listen(engine.sync_engine, "commit", lambda conn: commits.append(conn))
+        catalog_cache.set_menu(1, b"[]", catalog_cache.version)
+
+        await commit_unit_of_work()  # no unit of work: nothing to do
+        with pytest.raises(RuntimeError):
+            async with unit_of_work(session_factory) as session:
+                await commit_unit_of_work()  # nothing written yet
+                assert commits == []
+                await RestaurantService(session).create_product("Calzone", 999, sample_category.id)
+                await commit_unit_of_work()
+                assert len(commits) == 1
+                assert catalog_cache.get_menu(1) is None
+                await RestaurantService(session).create_product(
+                    "Stromboli", 999, sample_category.id
+                )
+                raise RuntimeError
+
+        async with session_factory() as session:
+            names = (await session.scalars(select(Product.name))).all()
+            assert "Calzone" in names
+            assert "Stromboli" not in names
@@ -1,12 +1,41 @@
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
 import pytest
 from aiohttp import web
 from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
+from app.models.base import Base
 from app.models.category import Category
 from app.models.product import Product
 from app.models.restaurant import Restaurant
 from app.models.user import User
-from app.webapp.routes import create_webapp_routes, validate_webapp_data
+from app.services.cart import CartService
+from app.services.checkout import CheckoutService
+from app.services.order import OrderService
+from app.services.restaurant import RestaurantService
+from app.webapp.auth import WebAppDataValidator
+from app.webapp.routes import setup_webapp, validate_webapp_data
+from database.instrumentation import instrument_query_counter
+
+
+def make_init_data(bot_token: str, telegram_id: int, auth_date: int | None = None) -> str:
+    """Build initData signed the way Telegram signs it."""
+    fields = {
+        "auth_date": str(auth_date if auth_date is not None else int(time.time())),
+        "query_id": "AAH-test",
+        "user": json.dumps({"id": telegram_id, "first_name": "TestUser"}),
+    }
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    fields["hash"] = hmac.new(
+        secret_key, data_check_string.encode(), hashlib.sha256
+    ).hexdigest()
+    return urlencode(fields)
 
 
 class TestValidateWebappData:
@@ -18,13 +47,64 @@ class TestValidateWebappData:
         result = validate_webapp_data("user=test&auth_date=123&hash=invalid", "token")
         assert result is None
 
+    def test_validate_valid(self):
+        result = validate_webapp_data(make_init_data("token", 42), "token")
+        assert result is not None
+        assert result["user"]["id"] == 42
+
+
+class TestWebAppDataValidator:
+    def test_valid_data_is_cached(self):
+        validator = WebAppDataValidator("token")
+        init_data = make_init_data("token", 42)
+        first = validator.validate(init_data)
+        assert first["user"]["id"] == 42
+        assert len(validator) == 1
+        assert validator.validate(init_data) is first
+
+    def test_wrong_token_rejected(self):
+        validator = WebAppDataValidator("other")
+        assert validator.validate(make_init_data("token", 42)) is None
+        assert len(validator) == 0
+
+    def test_tampered_data_with_cached_hash_rejected(self):
+        validator = WebAppDataValidator("token")
+        init_data = make_init_data("token", 42)
+        validator.validate(init_data)
+        tampered = init_data.replace("AAH-test", "AAH-evil")
+        assert validator.validate(tampered) is None
+        assert validator.validate(init_data) is not None
+
+    def test_stale_auth_date_rejected(self):
+        validator = WebAppDataValidator("token", max_age=60)
+        init_data = make_init_data("token", 42, auth_date=int(time.time()) - 120)
+        assert validator.validate(init_data) is None
+        assert len(validator) == 0
+
+    def test_cached_entry_expires_with_auth_date(self, monkeypatch):
+        validator = WebAppDataValidator("token", max_age=60)
+        now = time.time()
+        init_data = make_init_data("token", 42, auth_date=int(now))
+        assert validator.validate(init_data) is not None
+        monkeypatch.setattr(time, "time", lambda: now + 61)
+        assert validator.validate(init_data) is None
+        assert len(validator) == 0
+
+    def test_cache_is_bounded(self):
+        validator = WebAppDataValidator("token", cache_size=2)
+        first = make_init_data("token", 1)
+        validator.validate(first)
+        validator.validate(make_init_data("token", 2))
+        validator.validate(make_init_data("token", 3))
+        assert len(validator) == 2
+        assert first.rsplit("hash=", 1)[1] not in validator._cache
+
 
 @pytest.fixture
 async def webapp_client(session_factory):
     """Create aiohttp test client with webapp routes."""
     app = web.Application()
-    routes = create_webapp_routes(session_factory, "test_token")
-    app.router.add_routes(routes)
+    setup_webapp(app, session_factory, "test_token")
 
     server = TestServer(app)
     client = TestClient(server)
@@ -74,6 +154,42 @@ async def test_get_restaurants(webapp_client, seeded_db):
     assert data[0]["name"] == "Test Restaurant"
 
 
+async def test_route_query_budget(engine, session_factory, seeded_db, caplog):
+    instrument_query_counter(engine)
+    app = web.Application()
+    setup_webapp(app, session_factory, "test_token", query_budget=2)
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+
+    with caplog.at_level("DEBUG", logger="database.instrumentation"):
+        async with TestClient(TestServer(app)) as client:
+            assert (await client.get("/api/restaurants")).status == 200
+            assert (await client.get("/api/bootstrap", headers=headers)).status == 200
+
+    messages = [(r.levelname, r.getMessage()) for r in caplog.records]
+    assert any(m.startswith("GET /api/restaurants: 1 queries") for _, m in messages)
+    assert [m for level, m in messages if level == "WARNING"][0].startswith(
+        "Query budget of 2 exceeded by GET /api/bootstrap: 3 queries"
+    )
+
+
+async def test_catalog_and_history_read_from_read_factory(session_factory, seeded_db):
+    replica = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with replica.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    app = web.Application()
+    setup_webapp(app, session_factory, "test_token", async_sessionmaker(replica))
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+
+    async with TestClient(TestServer(app)) as client:
+        # The empty replica answers reads; the seeded primary answers the rest.
+        assert await (await client.get("/api/restaurants")).json() == []
+        rid = seeded_db["restaurant"].id
+        assert await (await client.get(f"/api/restaurants/{rid}/menu")).json() == []
+        assert (await client.get("/api/orders", headers=headers)).status == 404
+        assert (await client.get("/api/cart", headers=headers)).status == 200
+    await replica.dispose()
+
+
 async def test_get_restaurants_empty(webapp_client):
     resp = await webapp_client.get("/api/restaurants")
     assert resp.status == 200
@@ -92,6 +208,64 @@ async def test_get_menu(webapp_client, seeded_db):
     assert data[0]["products"][0]["name"] == "Burger"
 
 
+async def test_get_restaurants_not_modified(webapp_client, seeded_db):
+    resp = await webapp_client.get("/api/restaurants")
+    etag = resp.headers["ETag"]
+
+    resp = await webapp_client.get("/api/restaurants", headers={"If-None-Match": etag})
+    assert resp.status == 304
+    assert resp.headers["ETag"] == etag
+    assert await resp.read() == b""
+
+
+async def test_get_menu_not_modified(webapp_client, seeded_db):
+    rid = seeded_db["restaurant"].id
+    resp = await webapp_client.get(f"/api/restaurants/{rid}/menu")
+    etag = resp.headers["ETag"]
+
+    resp = await webapp_client.get(
+        f"/api/restaurants/{rid}/menu", headers={"If-None-Match": f'"other", {etag}'}
+    )
+    assert resp.status == 304
+
+
+async def test_get_menu_etag_changes_after_write(webapp_client, seeded_db, session):
+    rid = seeded_db["restaurant"].id
+    resp = await webapp_client.get(f"/api/restaurants/{rid}/menu")
+    etag = resp.headers["ETag"]
+
+    await RestaurantService(session).set_product_availability(seeded_db["product"].id, False)
+
+    resp = await webapp_client.get(
+        f"/api/restaurants/{rid}/menu", headers={"If-None-Match": etag}
+    )
+    assert resp.status == 200
+    assert resp.headers["ETag"] != etag
+
+
+async def test_get_menu_served_from_cache(webapp_client, seeded_db, session):
+    rid = seeded_db["restaurant"].id
+    await webapp_client.get(f"/api/restaurants/{rid}/menu")
+
+    seeded_db["product"].name = "Renamed"
+    await session.commit()
+
+    resp = await webapp_client.get(f"/api/restaurants/{rid}/menu")
+    data = await resp.json()
+    assert data[0]["products"][0]["name"] == "Burger"
+
+
+async def test_get_menu_cache_invalidated_by_availability(webapp_client, seeded_db, session):
+    rid = seeded_db["restaurant"].id
+    await webapp_client.get(f"/api/restaurants/{rid}/menu")
+
+    await RestaurantService(session).set_product_availability(seeded_db["product"].id, False)
+
+    resp = await webapp_client.get(f"/api/restaurants/{rid}/menu")
+    data = await resp.json()
+    assert data[0]["products"][0]["is_available"] is False
+
+
 async def test_add_to_cart_unauthorized(webapp_client, seeded_db):
     resp = await webapp_client.post(
         "/api/cart/add",
@@ -100,6 +274,181 @@ async def test_add_to_cart_unauthorized(webapp_client, seeded_db):
     assert resp.status == 401
 
 
+async def test_add_to_cart(webapp_client, seeded_db):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    product_id = seeded_db["product"].id
+    resp = await webapp_client.post(
+        "/api/cart/add", headers=headers, json={"product_id": product_id, "quantity": 2}
+    )
+    assert resp.status == 200
+    assert (await resp.json())["quantity"] == 2
+
+
+async def test_add_to_cart_unknown_product(webapp_client, seeded_db):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.post("/api/cart/add", headers=headers, json={"product_id": 9999})
+    assert resp.status == 404
+
+    resp = await webapp_client.post("/api/cart/add", headers=headers, json={"product_id": "1"})
+    assert resp.status == 400
+
+
+async def test_get_cart_authorized(webapp_client, seeded_db):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.get("/api/cart", headers=headers)
+    assert resp.status == 200
+    data = await resp.json()
+    assert data == {"items": [], "total": 0}
+
+
+async def test_bootstrap(webapp_client, seeded_db, session):
+    user = seeded_db["user"]
+    product = seeded_db["product"]
+    cart_service = CartService(session)
+    await cart_service.add_item(user.id, product.id, 2)
+    items = await cart_service.get_items(user.id)
+    await OrderService(session).create_from_cart(
+        user_id=user.id,
+        restaurant_id=seeded_db["restaurant"].id,
+        cart_items=items,
+        delivery_address="Addr",
+        phone="123",
+    )
+
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.get("/api/bootstrap", headers=headers)
+    assert resp.status == 200
+    data = await resp.json()
+    assert [r["name"] for r in data["restaurants"]] == ["Test Restaurant"]
+    assert data["cart"]["total"] == 2 * 999
+    assert data["cart"]["items"][0]["product_name"] == "Burger"
+    assert len(data["orders"]) == 1
+    assert data["orders"][0]["status"] == "pending"
+
+
+async def test_bootstrap_anonymous(webapp_client, seeded_db):
+    resp = await webapp_client.get("/api/bootstrap")
+    assert resp.status == 200
+    data = await resp.json()
+    assert len(data["restaurants"]) == 1
+    assert data["cart"] == {"items": [], "total": 0}
+    assert data["orders"] == []
+
+
+async def test_bootstrap_restaurants_revalidate(webapp_client, seeded_db):
+    data = await (await webapp_client.get("/api/bootstrap")).json()
+    resp = await webapp_client.get(
+        "/api/restaurants", headers={"If-None-Match": data["restaurants_etag"]}
+    )
+    assert resp.status == 304
+
+
+async def test_batch_cart(webapp_client, seeded_db):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    product_id = seeded_db["product"].id
+    resp = await webapp_client.post(
+        "/api/cart/batch",
+        headers=headers,
+        json={"operations": [
+            {"op": "add", "product_id": product_id, "quantity": 1},
+            {"op": "add", "product_id": product_id, "quantity": 1},
+            {"op": "add", "product_id": product_id, "quantity": 1},
+        ]},
+    )
+    assert resp.status == 200
+    data = await resp.json()
+    assert len(data["items"]) == 1
+    assert data["items"][0]["quantity"] == 3
+    assert data["total"] == 3 * 999
+
+    item_id = data["items"][0]["id"]
+    resp = await webapp_client.post(
+        "/api/cart/batch",
+        headers=headers,
+        json={"operations": [{"op": "remove", "item_id": item_id}]},
+    )
+    data = await resp.json()
+    assert data == {"items": [], "total": 0}
+
+
+async def test_batch_cart_invalid(webapp_client, seeded_db):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.post(
+        "/api/cart/batch",
+        headers=headers,
+        json={"operations": [{"op": "explode", "product_id": 1}]},
+    )
+    assert resp.status == 400
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        {"op": "add", "product_id": True},
+        {"op": "set", "item_id": 1, "quantity": False},
+        {"op": "remove", "item_id": True},
+    ],
+)
+async def test_batch_cart_rejects_bools(webapp_client, seeded_db, operation):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.post(
+        "/api/cart/batch", headers=headers, json={"operations": [operation]}
+    )
+    assert resp.status == 400
+
+
+async def test_batch_cart_unknown_product(webapp_client, seeded_db):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.post(
+        "/api/cart/batch",
+        headers=headers,
+        json={"operations": [{"op": "add", "product_id": 9999}]},
+    )
+    assert resp.status == 404
+
+
+async def test_batch_cart_checks_product_with_unmatched_item_id(
+    webapp_client, seeded_db, session
+):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.post(
+        "/api/cart/batch",
+        headers=headers,
+        json={"operations": [{"op": "add", "product_id": 9999, "item_id": 999}]},
+    )
+    assert resp.status == 404
+
+    product = seeded_db["product"]
+    await RestaurantService(session).set_product_availability(product.id, False)
+    resp = await webapp_client.post(
+        "/api/cart/batch",
+        headers=headers,
+        json={"operations": [{"op": "add", "product_id": product.id, "item_id": 999}]},
+    )
+    assert resp.status == 400
+    cart = await (await webapp_client.get("/api/cart", headers=headers)).json()
+    assert cart["items"] == []
+
+
+async def test_batch_cart_unavailable_product(webapp_client, seeded_db, session):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    product = seeded_db["product"]
+    await RestaurantService(session).set_product_availability(product.id, False)
+    resp = await webapp_client.post(
+        "/api/cart/batch",
+        headers=headers,
+        json={"operations": [{"op": "add", "product_id": product.id}]},
+    )
+    assert resp.status == 400
+    cart = await (await webapp_client.get("/api/cart", headers=headers)).json()
+    assert cart["items"] == []
+
+
+async def test_batch_cart_unauthorized(webapp_client):
+    resp = await webapp_client.post("/api/cart/batch", json={"operations": []})
+    assert resp.status == 401
+
+
 async def test_get_cart_unauthorized(webapp_client):
     resp = await webapp_client.get("/api/cart")
     assert resp.status == 401
@@ -113,6 +462,68 @@ async def test_create_order_unauthorized(webapp_client):
     assert resp.status == 401
 
 
+async def test_create_order(webapp_client, seeded_db, session):
+    await CartService(session).add_item(seeded_db["user"].id, seeded_db["product"].id, 2)
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.post(
+        "/api/orders",
+        headers=headers,
+        json={"address": "Test", "phone": "123"},
+    )
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["status"] == "pending"
+    assert data["total"] == 2 * 999
+
+    resp = await webapp_client.get("/api/cart", headers=headers)
+    assert (await resp.json())["items"] == []
+
+
+async def test_create_order_empty_cart(webapp_client, seeded_db):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.post(
+        "/api/orders",
+        headers=headers,
+        json={"address": "Test", "phone": "123"},
+    )
+    assert resp.status == 400
+
+
+async def test_get_orders_paginated(webapp_client, seeded_db, session, monkeypatch):
+    monkeypatch.setattr("app.webapp.routes.ORDERS_PAGE_SIZE", 1)
+    user = seeded_db["user"]
+    for _ in range(2):
+        await CartService(session).add_item(user.id, seeded_db["product"].id, 1)
+        await CheckoutService(session).checkout(user.id, "Addr", "123")
+
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.get("/api/orders", headers=headers)
+    assert resp.status == 200
+    page = await resp.json()
+    assert len(page["orders"]) == 1
+    assert page["orders"][0]["items"] == [{"name": "Burger", "quantity": 1, "price": 999}]
+    assert page["next_cursor"]
+
+    resp = await webapp_client.get(
+        "/api/orders", headers=headers, params={"cursor": page["next_cursor"]}
+    )
+    page2 = await resp.json()
+    assert len(page2["orders"]) == 1
+    assert page2["orders"][0]["id"] < page["orders"][0]["id"]
+    assert page2["next_cursor"] is None
+
+
+async def test_get_orders_invalid_cursor(webapp_client, seeded_db):
+    headers = {"X-Telegram-Init-Data": make_init_data("test_token", 12345)}
+    resp = await webapp_client.get("/api/orders", headers=headers, params={"cursor": "x"})
+    assert resp.status == 400
+
+    resp = await webapp_client.get(
+        "/api/orders", headers=headers, params={"cursor": "99999999999999999999999"}
+    )
+    assert resp.status == 400
+
+
 async def test_get_orders_unauthorized(webapp_client):
     resp = await webapp_client.get("/api/orders")
     assert resp.status == 401
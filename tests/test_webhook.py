@@ -0,0 +1,94 @@
+import asyncio
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+from pydantic import ValidationError
+
+from app.bot import setup_webhook, webhook_url
+from app.config import Settings
+from tests.conftest import make_update
+
+SECRET = "s3cret-token"
+
+
+def update_json(update_id: int, text: str) -> dict:
+    return make_update(update_id, text).model_dump(mode="json", by_alias=True, exclude_none=True)
+
+
+@pytest.fixture
+async def webhook():
+    """A webhook app whose handler records texts after a slow step."""
+    config = Settings(
+        bot_mode="webhook",
+        webhook_base_url="https://bot.example.com/",
+        webhook_secret=SECRET,
+    )
+    bot = Bot(token="123456:TEST")
+    bot.set_webhook = AsyncMock(return_value=True)
+    dp = Dispatcher()
+    received: list[str] = []
+    release = asyncio.Event()
+    router = Router()
+
+    @router.message()
+    async def record(message: Message) -> None:
+        await release.wait()
+        received.append(message.text)
+
+    dp.include_router(router)
+    app = web.Application()
+    setup_webhook(app, dp, bot, config)
+    async with TestClient(TestServer(app)) as client:
+        yield client, bot, received, release
+
+
+class TestWebhook:
+    def test_url_falls_back_to_webapp_base_url(self):
+        config = Settings(webapp_base_url="https://app.example.com/", webhook_path="/tg")
+        assert webhook_url(config) == "https://app.example.com/tg"
+
+    def test_rejects_unknown_mode(self):
+        with pytest.raises(ValidationError):
+            Settings(bot_mode="longpoll")
+
+    def test_requires_secret(self):
+        with pytest.raises(ValueError, match="BOT_WEBHOOK_SECRET"):
+            setup_webhook(web.Application(), Dispatcher(), Bot(token="123456:TEST"), Settings())
+
+    async def test_registers_webhook_on_startup(self, webhook):
+        _, bot, _, _ = webhook
+        bot.set_webhook.assert_awaited_once()
+        args, kwargs = bot.set_webhook.call_args
+        assert args == ("https://bot.example.com/webhook",)
+        assert kwargs["secret_token"] == SECRET
+        assert "message" in kwargs["allowed_updates"]
+
+    @pytest.mark.parametrize("headers", [{}, {"X-Telegram-Bot-Api-Secret-Token": "wrong"}])
+    async def test_rejects_bad_secret(self, webhook, headers):
+        client, _, received, release = webhook
+        resp = await client.post("/webhook", json=update_json(1, "hi"), headers=headers)
+        assert resp.status == 401
+        release.set()
+        await asyncio.sleep(0.05)
+        assert received == []
+
+    async def test_acknowledges_before_processing(self, webhook):
+        client, _, received, release = webhook
+        resp = await client.post(
+            "/webhook",
+            json=update_json(1, "hi"),
+            headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+        )
+        assert resp.status == 200
+        assert received == []
+
+        release.set()
+        for _ in range(100):
+            if received:
+                break
+            await asyncio.sleep(0.01)
+        assert received == ["hi"]